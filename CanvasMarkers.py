@@ -6,6 +6,8 @@ from PyQt4 import QtCore, QtGui
 from qgis.core import *
 from qgis.gui import *
 
+from geodesy import planarBearing
+
 
 
 class RoutePointMarker(QgsMapCanvasItem):
@@ -88,14 +90,8 @@ class PositionMarker(QgsMapCanvasItem):
           self.pos = QgsPoint(pos) # copy
           if save and cap == 0:
               # compute angle from positions
-              # this is a small distance, simply use pythagore
-              if (pos.x()-save.x()) == 0:
-                  self.angle = 90
-              else:
-                  self.angle = 90 - degrees(atan((pos.y()-save.y()) / (pos.x()-save.x()) ))
-              if (save.x() > pos.x()): # go west !
-                  self.angle = 360 - self.angle
-              #print self.angle
+              # this is a small distance, the canvas is a plane
+              self.angle = planarBearing(pos.x()-save.x(), pos.y()-save.y())
           else:
               self.angle = cap
               
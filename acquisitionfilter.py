@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+""" Acquisition filter: decides which of the fixes received are kept in the track
+    see class documentation below.
+"""
+
+
+from geodesy import TrackProjection
+
+
+
+def parseThreshold(text, name='threshold'):
+    """
+    Converts the text of a threshold field to a float. An empty field is 0 (stage disabled).
+    Raises ValueError with a message naming the field for text that is not a positive number.
+    """
+
+    text = unicode(text).strip().replace(',', '.')
+    if text == '':
+        return 0.0
+    try:
+        value = float(text)
+    except ValueError:
+        raise ValueError('The %s must be a number, not "%s"' % (name, text))
+    if value < 0.0 or value != value:
+        raise ValueError('The %s must be a positive number, not "%s"' % (name, text))
+    return value
+
+
+
+class FilterStage(object):
+    """One test of the acquisition filter
+
+    The thresholds are plain attributes set when the stage is built; check() only does
+    arithmetic on the two positions.
+
+    CLASS VARIABLES:
+    name = name of the stage, used in the statistics
+    accepted = number of fixes that passed this stage
+    rejected = number of fixes dropped by this stage
+    """
+
+    name = 'stage'
+
+    def __init__(self):
+
+        self.accepted = 0
+        self.rejected = 0
+
+
+    def check(self, aGPSPosition, lastPosition):
+        """Returns True if aGPSPosition passes the stage, lastPosition is the last kept fix or None"""
+
+        return True
+
+
+    def __repr__(self):
+
+        return '%s(accepted=%d, rejected=%d)' % (self.__class__.__name__, self.accepted, self.rejected)
+
+
+
+class QualityStage(FilterStage):
+    """Drops the fixes of poor quality: fixQuality below minFixQuality, or HDOP above maxHdop
+    (0 = no HDOP limit). Fixes reporting no HDOP (0.0) are not dropped by the HDOP limit."""
+
+    name = 'quality'
+
+    def __init__(self, maxHdop=0.0, minFixQuality=0):
+
+        FilterStage.__init__(self)
+        self.maxHdop = maxHdop
+        self.minFixQuality = minFixQuality
+
+
+    def check(self, aGPSPosition, lastPosition):
+
+        if aGPSPosition.fixQuality < self.minFixQuality:
+            return False
+        return not (self.maxHdop and aGPSPosition.hdop > self.maxHdop)
+
+
+
+class SpeedStage(FilterStage):
+    """Drops the fixes whose speed over ground (km/h) is below minSpeed (receiver standing still,
+    the position only wanders) or above maxSpeed (0 = no upper limit)"""
+
+    name = 'speed'
+
+    def __init__(self, minSpeed=0.0, maxSpeed=0.0):
+
+        FilterStage.__init__(self)
+        self.minSpeed = minSpeed
+        self.maxSpeed = maxSpeed
+
+
+    def check(self, aGPSPosition, lastPosition):
+
+        speed = aGPSPosition.speed
+        return speed >= self.minSpeed and not (self.maxSpeed and speed > self.maxSpeed)
+
+
+
+class TimeStage(FilterStage):
+    """Keeps a fix when at least minInterval seconds (may be a fraction, e.g. 0.2 for a
+    5-10 Hz receiver) have elapsed since the last kept fix. A fix whose time is not later than
+    the last kept fix is dropped."""
+
+    name = 'time'
+
+    def __init__(self, minInterval=0.0):
+
+        FilterStage.__init__(self)
+        self.minInterval = minInterval - 0.001 # tolerance for the rounding of fractional times
+
+
+    def check(self, aGPSPosition, lastPosition):
+
+        if lastPosition is None:
+            return True
+        interval = aGPSPosition.utcTime - lastPosition.utcTime
+        return interval > 0.0 and interval >= self.minInterval
+
+
+
+class DistanceStage(FilterStage):
+    """Keeps a fix when it is more than minDistance metres from the last kept fix, measured in
+    the local tangent plane of the track (see geodesy.TrackProjection)"""
+
+    name = 'distance'
+
+    def __init__(self, minDistance=0.0):
+
+        FilterStage.__init__(self)
+        self.minDistance = minDistance
+        self.minSquared = minDistance * minDistance # no square root per fix
+        self.projection = TrackProjection()
+
+
+    def check(self, aGPSPosition, lastPosition):
+
+        if lastPosition is None:
+            return True
+        return self.projection.squaredDistance(lastPosition, aGPSPosition) > self.minSquared
+
+
+
+class AcquisitionFilter(object):
+    """Chain of FilterStage objects run on every fix received
+
+    A fix is kept when it passes all of the stages, in order; the first stage that drops it
+    stops the chain. The chain only holds numbers and the last kept position, it has no Qt
+    dependency and can be used on a log or in a test as well as in the plugin. Build it with
+    compileFilter() whenever a threshold changes, never in the data path.
+
+    CLASS VARIABLES:
+    stages = list of FilterStage, cheapest first
+    lastPosition = last fix kept, None at the start of a track
+
+    METHODS:
+    accept = runs a fix through the chain, returns True if it is kept
+    reset = starts a new track (the next fix is compared to nothing)
+    statistics = list of (stage name, accepted, rejected)
+    """
+
+    def __init__(self, stages=None):
+
+        self.stages = list(stages or [])
+        self.lastPosition = None
+        self._checks = [(stage, stage.check) for stage in self.stages]
+
+
+    def accept(self, aGPSPosition):
+
+        lastPosition = self.lastPosition
+        for stage, check in self._checks:
+            if not check(aGPSPosition, lastPosition):
+                stage.rejected += 1
+                return False
+            stage.accepted += 1
+        self.lastPosition = aGPSPosition
+        return True
+
+
+    def reset(self):
+
+        self.lastPosition = None
+
+
+    def statistics(self):
+
+        return [(stage.name, stage.accepted, stage.rejected) for stage in self.stages]
+
+
+    def summary(self):
+
+        return ', '.join(['%s: %d kept/%d dropped' % item for item in self.statistics()]) or 'no filter'
+
+
+
+def compileFilter(minDistance=0.0, minInterval=0.0, maxHdop=0.0, minFixQuality=0, minSpeed=0.0, maxSpeed=0.0):
+    """
+    Returns an AcquisitionFilter running, in that order: quality (maxHdop, minFixQuality) and
+    speed (minSpeed, maxSpeed in km/h) when one of their thresholds is set, then time
+    (minInterval in seconds) and distance (minDistance in metres).
+    """
+
+    stages = []
+    if maxHdop or minFixQuality:
+        stages.append(QualityStage(maxHdop, minFixQuality))
+    if minSpeed or maxSpeed:
+        stages.append(SpeedStage(minSpeed, maxSpeed))
+    # time and distance always run: with 0 thresholds they drop repeated and older fixes and
+    # fixes at exactly the same place, as the original filter did
+    stages.append(TimeStage(minInterval))
+    stages.append(DistanceStage(minDistance))
+    return AcquisitionFilter(stages)
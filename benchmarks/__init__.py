@@ -0,0 +1,7 @@
+""" Benchmarks for the beeGPS acquisition pipeline.
+
+    Every module in this package can be run on its own from the plugin
+    folder, e.g.:  python -m benchmarks.serial_readline
+    benchmarks.suite runs all of them against the recorded baselines:
+        python -m benchmarks.suite
+"""
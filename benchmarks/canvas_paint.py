@@ -0,0 +1,127 @@
+""" Map canvas cost of the track rubber band and the position marker.
+
+    A QgsMapCanvas with the plugin's QgsRubberBand and CanvasMarkers
+    PositionMarker is rendered into a QImage (QGraphicsScene.render), so no
+    window is shown. Two measurements per track length (1k, 10k, 100k
+    points):
+
+    - milliseconds to paint one frame of the canvas items;
+    - microseconds per fix to add 1000 fixes the old way (addPoint with an
+      update and a marker move for every fix) and the way trackGps.setCoords
+      applies a PositionBatch of 50 fixes (one update and one marker move per
+      batch).
+
+    Needs the QGIS Python bindings and a display: run it with
+    QT_QPA_PLATFORM=offscreen (Qt 5) or under xvfb-run (Qt 4). From the
+    plugin folder:
+        python -m benchmarks.canvas_paint
+"""
+
+
+import os
+import sys
+import time
+
+from PyQt4.QtCore import QRectF
+from PyQt4.QtGui import QImage, QPainter, QColor
+from qgis.core import *
+from qgis.gui import *
+
+from CanvasMarkers import PositionMarker
+
+from benchmarks.suite import Unavailable
+
+
+def trackPoints(numPoints):
+
+    return [QgsPoint(-73.5 + i * 9e-6, 45.5 + i * 6e-6) for i in xrange(numPoints)]
+
+
+def paintCost(canvas, frames=20):
+    """Renders the canvas scene frames times, returns the milliseconds per frame"""
+
+    image = QImage(canvas.width(), canvas.height(), QImage.Format_ARGB32_Premultiplied)
+    target = QRectF(0, 0, canvas.width(), canvas.height())
+    start = time.time()
+    for i in xrange(frames):
+        image.fill(0)
+        painter = QPainter(image)
+        canvas.scene().render(painter, target, target)
+        painter.end()
+    return (time.time() - start) * 1000.0 / frames
+
+
+def addCost(canvas, rubberBand, marker, points, batchSize):
+    """Adds points batchSize at a time the way setCoords does, returns microseconds per point"""
+
+    start = time.time()
+    for first in xrange(0, len(points), batchSize):
+        batch = points[first:first + batchSize]
+        for point in batch[:-1]:
+            rubberBand.addPoint(point, False)
+        rubberBand.addPoint(batch[-1])
+        marker.newCoords(batch[-1], 45.0)
+    return (time.time() - start) * 1e6 / len(points)
+
+
+def measure(canvas, numPoints):
+    """Returns (ms/frame, us/fix added one at a time, us/fix added in batches) for a track of numPoints"""
+
+    rubberBand = QgsRubberBand(canvas)
+    rubberBand.setColor(QColor(255, 0, 0))
+    rubberBand.setWidth(3)
+    marker = PositionMarker(canvas)
+    marker.setHasPosition(True)
+    try:
+        for point in trackPoints(numPoints):
+            rubberBand.addPoint(point, False)
+        rubberBand.updatePosition()
+        frame = paintCost(canvas)
+        more = trackPoints(1000)
+        single = addCost(canvas, rubberBand, marker, more, 1)
+        batched = addCost(canvas, rubberBand, marker, more, 50)
+    finally:
+        rubberBand.reset()
+        canvas.scene().removeItem(rubberBand)
+        canvas.scene().removeItem(marker)
+    return frame, single, batched
+
+
+def startCanvas(argv):
+
+    QgsApplication.setPrefixPath(os.environ.get('QGIS_PREFIX_PATH', '/usr'), True)
+    application = QgsApplication(argv, True)
+    application.initQgis()
+    canvas = QgsMapCanvas()
+    canvas.resize(800, 600)
+    canvas.setExtent(QgsRectangle(-73.5, 45.5, -72.5, 46.2))
+    return application, canvas
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite)"""
+
+    if sys.platform.startswith('linux') and not (os.environ.get('DISPLAY') or os.environ.get('QT_QPA_PLATFORM')):
+        raise Unavailable("no display: set QT_QPA_PLATFORM=offscreen or run under xvfb-run")
+    application, canvas = startCanvas([])
+    try:
+        frame, single, batched = measure(canvas, 10000)
+    finally:
+        application.exitQgis()
+    return {'msPerFrame': frame, 'usPerFix': batched}
+
+
+def main(argv):
+
+    application, canvas = startCanvas(argv)
+    try:
+        print '%-8s %10s %14s %14s' % ('points', 'ms/frame', 'us/fix single', 'us/fix batch')
+        for numPoints in (1000, 10000, 100000):
+            frame, single, batched = measure(canvas, numPoints)
+            print '%-8d %10.2f %14.1f %14.1f' % (numPoints, frame, single, batched)
+    finally:
+        application.exitQgis()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
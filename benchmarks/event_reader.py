@@ -0,0 +1,120 @@
+""" Polling versus event driven reading of a serial port.
+
+    The two loops of ReadGpsd, without Qt: the polling loop calls
+    GPSConnection.getPosition (a read that waits up to the port timeout),
+    the event driven loop sleeps in select on GPSConnection.fileno() and a
+    wake up pipe and calls readPositions when the port is readable. Both
+    read a gpssimulator.GPSSimulator at 9600 baud, 1 Hz, for a few seconds;
+    then the receiver goes silent. For each loop are printed: loop wake ups
+    per fix, CPU while receiving and while silent, and the time between the
+    stop request and the end of the loop.
+
+    POSIX only. Run from the plugin folder:
+        python -m benchmarks.event_reader [seconds]
+"""
+
+
+import os
+import sys
+import time
+import select
+import threading
+
+from gpssimulator import GPSSimulator
+from gpsconnection import GPSConnection
+
+from benchmarks.suite import requirePty
+
+
+class Loop(threading.Thread):
+    """A reading loop in its own thread, counting its wake ups and fixes"""
+
+    def __init__(self, session, eventDriven):
+
+        threading.Thread.__init__(self)
+        self.session = session
+        self.eventDriven = eventDriven
+        self.running = True
+        self.wakeups = 0
+        self.fixes = 0
+        self.wakeRead, self.wakeWrite = os.pipe()
+
+
+    def run(self):
+
+        session = self.session
+        if self.eventDriven:
+            fileno = session.fileno()
+            while self.running:
+                ready = select.select([fileno, self.wakeRead], [], [])[0]
+                self.wakeups += 1
+                if self.wakeRead in ready:
+                    break
+                self.fixes += len([p for p in session.readPositions() if p.hasFix])
+        else:
+            while self.running:
+                self.wakeups += 1
+                if session.getPosition().hasFix:
+                    self.fixes += 1
+
+
+    def stop(self):
+
+        start = time.time()
+        self.running = False
+        os.write(self.wakeWrite, 'x')
+        self.join()
+        os.close(self.wakeRead)
+        os.close(self.wakeWrite)
+        return time.time() - start
+
+
+def cpu():
+
+    return sum(os.times()[:2])
+
+
+def measure(eventDriven, seconds):
+    """Returns (wake ups per fix, cpu % receiving, cpu % silent, stop seconds)"""
+
+    simulator = GPSSimulator(9600, 1.0, disconnects=[(seconds, seconds)])
+    simulator.start()
+    try:
+        session = GPSConnection()
+        session.try_connect_port_with_speed(simulator.device, 9600)
+        loop = Loop(session, eventDriven)
+        start, startCpu = time.time(), cpu()
+        loop.start()
+        time.sleep(seconds)
+        receiving = 100.0 * (cpu() - startCpu) / (time.time() - start)
+        wakeupsPerFix = loop.wakeups / float(max(loop.fixes, 1))
+        time.sleep(0.5) # the last epoch was read
+        start, startCpu = time.time(), cpu()
+        time.sleep(seconds / 2.0)
+        silent = 100.0 * (cpu() - startCpu) / (time.time() - start)
+        stopSeconds = loop.stop()
+        session.serialPort.close()
+        return wakeupsPerFix, receiving, silent, stopSeconds
+    finally:
+        simulator.stop()
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite)"""
+
+    requirePty()
+    wakeupsPerFix, receiving, silent, stopSeconds = measure(True, 5.0)
+    return {'wakeupsPerFix': wakeupsPerFix} # the stop time is too small to compare with a baseline
+
+
+def main(argv):
+
+    seconds = float(argv[1]) if len(argv) > 1 else 5.0
+    print '%-8s %12s %12s %12s %10s' % ('loop', 'wakeups/fix', 'cpu % recv', 'cpu % idle', 'stop s')
+    for label, eventDriven in (('polling', False), ('select', True)):
+        wakeupsPerFix, receiving, silent, stopSeconds = measure(eventDriven, seconds)
+        print '%-8s %12.1f %12.2f %12.2f %10.3f' % (label, wakeupsPerFix, receiving, silent, stopSeconds)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,108 @@
+""" CPU cost of each additional receiver read on the shared ingest loop.
+
+    N gpssimulator.py processes (115200 baud, 10 Hz, each on its own
+    pseudo-terminal) are read by one ingest.IngestLoop the way
+    receivers.IngestThread reads them: per receiver a PositionCoalescer,
+    a compiled acquisition filter and a TrackStore. The simulators run in
+    their own processes, so the CPU printed (os.times of this process) is
+    the ingest side only. For 1, 2, 4 and 8 receivers are printed the fixes
+    read, the CPU % per receiver and the number of receivers one core would
+    sustain at that cost. Drawing the tracks is measured by canvas_paint.
+
+    POSIX only. Run from the plugin folder:
+        python -m benchmarks.multi_receiver [seconds]
+"""
+
+
+import os
+import sys
+import time
+import subprocess
+
+from ingest import IngestLoop, SerialSource
+from acquisitionfilter import compileFilter
+from trackstore import TrackStore
+from positionbatch import PositionCoalescer
+
+from benchmarks.suite import requirePty
+
+
+BAUD_RATE = 115200
+RATE = 10.0
+
+
+def startSimulators(numReceivers):
+    """Starts numReceivers simulator processes, returns [(process, device)]"""
+
+    plugin = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    simulators = []
+    for i in range(numReceivers):
+        process = subprocess.Popen([sys.executable, '-u', os.path.join(plugin, 'gpssimulator.py'),
+                                    '--baud', str(BAUD_RATE), '--rate', str(RATE)], stdout=subprocess.PIPE)
+        line = process.stdout.readline() # "GPS simulator on /dev/pts/N"
+        simulators.append((process, line.split()[-1]))
+    return simulators
+
+
+def stopSimulators(simulators):
+
+    for process, device in simulators:
+        process.terminate()
+        process.wait()
+
+
+def measure(numReceivers, seconds):
+    """Returns (fixes read, cpu % per receiver) of numReceivers read for seconds"""
+
+    simulators = startSimulators(numReceivers)
+    loop = IngestLoop()
+    receivers = {}
+    counts = {'fixes': 0}
+
+    def positionsRead(source, positions):
+        coalescer, acquisitionFilter, trackStore = receivers[source]
+        for aGPSPosition in positions:
+            if aGPSPosition.hasFix:
+                counts['fixes'] += 1
+                coalescer.add(aGPSPosition)
+        batch = coalescer.due()
+        if batch is not None:
+            for aGPSPosition in batch:
+                if acquisitionFilter.accept(aGPSPosition):
+                    trackStore.append(aGPSPosition)
+
+    try:
+        loop.subscribe(positionsRead)
+        for process, device in simulators:
+            source = loop.addSource(SerialSource(device, BAUD_RATE))
+            receivers[source] = (PositionCoalescer(20.0), compileFilter(maxHdop=5.0, minFixQuality=1), TrackStore())
+        time.sleep(1.0 / RATE) # the simulators are sending
+        start, startCpu = time.time(), sum(os.times()[:2])
+        loop.callLater(seconds, loop.stop)
+        loop.run()
+        cpu = 100.0 * (sum(os.times()[:2]) - startCpu) / (time.time() - start)
+    finally:
+        loop.close()
+        stopSimulators(simulators)
+    return counts['fixes'], cpu / numReceivers
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite)"""
+
+    requirePty()
+    fixes, cpuPerReceiver = measure(4, 5.0)
+    return {'cpuPercentPerReceiver': cpuPerReceiver}
+
+
+def main(argv):
+
+    seconds = float(argv[1]) if len(argv) > 1 else 5.0
+    print '%-10s %8s %16s %20s' % ('receivers', 'fixes', 'cpu % / receiver', 'receivers per core')
+    for numReceivers in (1, 2, 4, 8):
+        fixes, cpuPerReceiver = measure(numReceivers, seconds)
+        print '%-10d %8d %16.2f %20d' % (numReceivers, fixes, cpuPerReceiver, 100.0 / max(cpuPerReceiver, 1e-3))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,51 @@
+""" NMEA stream parser throughput in sentences per second.
+
+    Feeds a recorded NMEA log (or a synthetic one when no file is given)
+    through NMEAStreamParser in chunks of different sizes.
+
+    Run from the plugin folder:  python -m benchmarks.nmea_parser [log.nmea]
+"""
+
+
+import sys
+import time
+
+from nmeaparser import NMEAStreamParser
+
+from benchmarks import nmeadata
+
+
+def run(data, chunkSize=4096):
+    """Parses data in chunks of chunkSize bytes, returns (sentences, epochs, seconds)"""
+
+    parser = NMEAStreamParser()
+    epochs = 0
+    start = time.time()
+    for i in xrange(0, len(data), chunkSize):
+        epochs += len(parser.feed(data[i:i+chunkSize]))
+    if parser.flush() is not None:
+        epochs += 1
+    return parser.sentenceCount, epochs, time.time() - start
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite)"""
+
+    sentences, epochs, elapsed = run(nmeadata.log(20000))
+    return {'sentencesPerSecond': sentences / max(elapsed, 1e-9)}
+
+
+def main(argv):
+
+    if len(argv) > 1:
+        data = open(argv[1], 'rb').read()
+    else:
+        data = nmeadata.log(20000)
+    print '%10s %10s %10s %12s' % ('chunk', 'sentences', 'epochs', 'sent/s')
+    for chunkSize in (64, 512, 4096, 65536):
+        sentences, epochs, elapsed = run(data, chunkSize)
+        print '%10d %10d %10d %12.0f' % (chunkSize, sentences, epochs, sentences / max(elapsed, 1e-9))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
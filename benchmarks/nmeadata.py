@@ -0,0 +1,55 @@
+""" Synthetic NMEA 0183 data used by the benchmarks. """
+
+
+import math
+import operator
+
+
+def checksum(body):
+    """Returns the two hex digit NMEA checksum of the text between '$' and '*'"""
+    
+    return '%02X' % reduce(operator.xor, map(ord, body), 0)
+
+
+def sentence(body):
+    """Frames a sentence body as '$body*hh\\r\\n'"""
+    
+    return '$%s*%s\r\n' % (body, checksum(body))
+
+
+def _nmeaAngle(value, degDigits):
+    
+    value = abs(value)
+    degrees = int(value)
+    minutes = (value - degrees) * 60.0
+    return '%0*d%07.4f' % (degDigits, degrees, minutes)
+
+
+def epoch(i, rate=1, lat0=45.5, lon0=-73.5, talker='GP'):
+    """Returns the sentences of epoch number i of a receiver moving north-east
+    at about 10 m/s and producing rate epochs per second"""
+    
+    t = i / float(rate)
+    hh, rem = divmod(int(t) % 86400, 3600)
+    mm, ss = divmod(rem, 60)
+    utc = '%02d%02d%02d.%02d' % (hh, mm, ss, int(round((t - int(t)) * 100)) % 100)
+    lat = lat0 + t * 0.00006
+    lon = lon0 + t * 0.00009
+    ns = 'N' if lat >= 0 else 'S'
+    ew = 'E' if lon >= 0 else 'W'
+    latStr = _nmeaAngle(lat, 2)
+    lonStr = _nmeaAngle(lon, 3)
+    
+    lines = [sentence('%sGGA,%s,%s,%s,%s,%s,1,08,0.9,%.1f,M,-34.0,M,,' %
+                      (talker, utc, latStr, ns, lonStr, ew, 100 + 5 * math.sin(t))),
+             sentence('%sRMC,%s,A,%s,%s,%s,%s,19.4,45.0,230394,003.1,W' %
+                      (talker, utc, latStr, ns, lonStr, ew)),
+             sentence('%sGSV,2,1,08,01,40,083,46,02,17,308,41,12,07,344,39,14,22,228,45' % talker),
+             sentence('%sGSV,2,2,08,15,55,120,42,17,33,045,40,22,12,190,38,24,65,275,47' % talker)]
+    return lines
+
+
+def log(numEpochs, rate=1, talker='GP'):
+    """Returns a recorded-log like string holding numEpochs epochs"""
+    
+    return ''.join([''.join(epoch(i, rate, talker=talker)) for i in xrange(numEpochs)])
@@ -0,0 +1,107 @@
+""" Memory per fix of the position records kept for a whole session.
+
+    Compares the original GPSPosition layout (per-instance __dict__, unsigned
+    latitude/longitude with 'N'/'S' and 'E'/'W' strings, a formatted date
+    string, a string fix quality and a per-fix list of satellite string tuples)
+    with the slotted nmeaparser.GPSPosition produced by the stream parser and
+    with the per-field arrays of trackstore.TrackStore.
+
+    Run from the plugin folder:  python -m benchmarks.position_memory
+"""
+
+
+import sys
+import time
+
+from nmeaparser import NMEAStreamParser
+from trackstore import TrackStore
+
+from benchmarks import nmeadata
+
+
+class LegacyGPSPosition(object):
+    """The original layout, as filled by the old GPSConnection.getPosition"""
+
+    def __init__(self):
+
+        self.satelliteData = []
+        self.hdop = 0.0
+        self.hasFix = False
+
+
+
+def legacyPosition(position):
+
+    legacy = LegacyGPSPosition()
+    legacy.hasFix = True
+    legacy.datumEPSG = position.datumEPSG
+    legacy.latitude = abs(position.latitude)
+    legacy.latitudeNS = position.latitudeNS
+    legacy.longitude = abs(position.longitude)
+    legacy.longitudeEW = position.longitudeEW
+    legacy.fixQuality = str(position.fixQuality)
+    legacy.numSatellites = position.numSatellites
+    legacy.hdop = position.hdop
+    atime = time.localtime(position.utcTime)
+    legacy.theDateTime = str(atime[0]) + "-" + str(atime[1]) + "-" + str(atime[2]) + " " +\
+        str(atime[3]) + ":" + str(atime[4]) + ":" + str(atime[5])
+    legacy.bearing = position.bearing
+    legacy.speed = position.speed
+    legacy.satelliteData = [tuple([str(field) for field in satellite[:4]]) for satellite in position.satellites]
+    return legacy
+
+
+def deepSize(objects):
+    """Bytes used by objects and everything they reference, each object counted once"""
+
+    seen = set()
+    stack = list(objects)
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or obj is None or obj is True or obj is False:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        elif hasattr(obj, '__slots__'):
+            stack.extend([getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name)])
+    return total
+
+
+def storeSize(positions):
+    """Bytes per fix of positions kept in a TrackStore"""
+
+    store = TrackStore()
+    for position in positions:
+        store.append(position)
+    store.lastPosition = None
+    return deepSize([store.tracks]) / float(len(store))
+
+
+def scenario(numFixes=100000):
+    """Metrics of the benchmark suite (see benchmarks.suite): a long session, about 3 h at 10 Hz"""
+
+    positions = NMEAStreamParser().feed(nmeadata.log(numFixes + 1, rate=10))
+    return {'bytesPerFix': storeSize(positions)}
+
+
+def main(numFixes=10000):
+
+    parser = NMEAStreamParser()
+    positions = parser.feed(nmeadata.log(numFixes + 1))
+    legacy = [legacyPosition(position) for position in positions]
+    print '%-28s %12s' % ('layout', 'bytes/fix')
+    print '%-28s %12.0f' % ('legacy (__dict__, strings)', deepSize(legacy) / float(len(legacy)))
+    print '%-28s %12.0f' % ('slotted GPSPosition', deepSize(positions) / float(len(positions)))
+    print '%-28s %12.0f' % ('TrackStore columns', storeSize(positions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+""" GIL contention between the reading thread and the GUI, and the reader process that removes it.
+
+    The main thread stands for QGIS rendering: it runs slices of pure
+    Python work (about a millisecond each) and times them. Meanwhile a replayed
+    log (4 sentences per epoch, 200 and 1000 epochs a second) is read:
+
+    - thread: in a thread of this process, the way the polling ReadGpsd
+      does it (GPSConnection.getPosition, acquisition filter, coalescer);
+    - process: by readerprocess.readerMain in a worker process, this
+      process only unpacking the fix records, the way ReadProcess does.
+
+    For each case are printed the mean and worst slice time, relative to
+    the slices timed with no reader at all (the slowdown), and the CPU this
+    process spends per fix while nothing else runs: the time the reader
+    holds the GIL of the QGIS interpreter. The slowdown only shows the gain
+    of the worker process on a machine with more than one core; on a single
+    core the worker takes the same CPU from rendering, out of the GIL.
+
+    Run from the plugin folder:
+        python -m benchmarks.process_reader [seconds]
+"""
+
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+import readerprocess
+from gpsconnection import GPSConnection
+from acquisitionfilter import compileFilter
+from positionbatch import PositionCoalescer
+
+from benchmarks import nmeadata
+
+
+THRESHOLDS = (0.0, 0.0, 5.0, 1, 0.0, 0.0) # compileFilter(maxHdop=5.0, minFixQuality=1)
+UI_RATE = 20.0
+
+
+def renderSlices(seconds, work=20000):
+    """Runs slices of Python work for seconds, returns (mean ms, worst ms) per slice"""
+
+    durations = []
+    end = time.time() + seconds
+    while time.time() < end:
+        start = time.time()
+        total = 0
+        for i in xrange(work):
+            total += i * i
+        durations.append(time.time() - start)
+    return 1000.0 * sum(durations) / len(durations), 1000.0 * max(durations)
+
+
+class ThreadReader(threading.Thread):
+    """The polling loop of ReadGpsd, without Qt"""
+
+    def __init__(self, fileName, speed):
+
+        threading.Thread.__init__(self)
+        self.session = GPSConnection()
+        self.session.connect_replay(fileName, speed)
+        self.running = True
+        self.fixes = 0
+
+
+    def run(self):
+
+        acquisitionFilter = compileFilter(*THRESHOLDS)
+        coalescer = PositionCoalescer(UI_RATE)
+        while self.running:
+            gpsPosition = self.session.getPosition()
+            if gpsPosition.hasFix and acquisitionFilter.accept(gpsPosition):
+                coalescer.add(gpsPosition)
+            batch = coalescer.due()
+            if batch is not None:
+                self.fixes += len(batch)
+        self.session.serialPort.close()
+
+
+    def stop(self):
+
+        self.running = False
+        self.join()
+        return self.fixes
+
+
+class ProcessReader(threading.Thread):
+    """The receiving side of ReadProcess, without Qt"""
+
+    def __init__(self, fileName, speed):
+
+        threading.Thread.__init__(self)
+        settings = {'replayFile': fileName, 'replaySpeed': speed, 'tryAllPorts': True, 'portNumber': 0,
+                    'portSpeed': 0, 'lastDevice': '', 'cache': [], 'thresholds': THRESHOLDS,
+                    'uiRate': UI_RATE, 'eventDriven': True, 'publishFile': ''}
+        self.process, self.commands, self.pipe = readerprocess.startReader(settings)
+        self.fixes = 0
+
+
+    def run(self):
+
+        while True:
+            try:
+                message = self.pipe.recv_bytes()
+            except EOFError:
+                break
+            if message[0] == readerprocess.FIXES:
+                self.fixes += len(readerprocess.unpackBatch(message)[0])
+
+
+    def stop(self):
+
+        self.commands.send_bytes(readerprocess.STOP)
+        self.join()
+        self.process.wait()
+        return self.fixes
+
+
+def measure(fileName, readerClass, speed, seconds):
+    """Returns (mean ms, worst ms, fixes read) of the render slices while readerClass reads"""
+
+    reader = readerClass(fileName, speed)
+    reader.start()
+    time.sleep(0.5) # connected and reading
+    mean, worst = renderSlices(seconds)
+    return mean, worst, reader.stop()
+
+
+def gilCost(fileName, readerClass, speed, seconds):
+    """Returns the microseconds of CPU per fix of this process (not of the worker) while readerClass reads"""
+
+    reader = readerClass(fileName, speed)
+    reader.start()
+    time.sleep(0.5)
+    startCpu, startFixes = sum(os.times()[:2]), reader.fixes
+    time.sleep(seconds)
+    cpu, fixes = sum(os.times()[:2]) - startCpu, reader.fixes - startFixes
+    reader.stop()
+    return 1e6 * cpu / max(fixes, 1)
+
+
+def withLog(numEpochs, function, *args):
+
+    handle, fileName = tempfile.mkstemp(suffix='.nmea')
+    try:
+        os.write(handle, nmeadata.log(numEpochs))
+        os.close(handle)
+        return function(fileName, *args)
+    finally:
+        os.remove(fileName)
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite): GUI process CPU per fix at 1000 fixes/s"""
+
+    return {'usGilPerFix': withLog(10000, gilCost, ProcessReader, 1000.0, 5.0)}
+
+
+def main(argv):
+
+    seconds = float(argv[1]) if len(argv) > 1 else 5.0
+
+    def run(fileName):
+        idle, idleWorst = renderSlices(seconds)
+        print '%-8s %-8s %8s %10s %10s %9s %12s' % ('reader', 'rate Hz', 'fixes', 'mean ms', 'worst ms',
+                                                     'slowdown', 'gil us/fix')
+        print '%-8s %-8s %8s %10.2f %10.2f %9.2f %12s' % ('none', '-', '-', idle, idleWorst, 1.0, '-')
+        for speed in (200.0, 1000.0):
+            for label, readerClass in (('thread', ThreadReader), ('process', ProcessReader)):
+                mean, worst, fixes = measure(fileName, readerClass, speed, seconds)
+                gil = gilCost(fileName, readerClass, speed, seconds)
+                print '%-8s %-8d %8d %10.2f %10.2f %9.2f %12.1f' % (label, speed, fixes, mean, worst,
+                                                                    mean / idle, gil)
+
+    withLog(int(1000 * (2 * seconds + 2)), run)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
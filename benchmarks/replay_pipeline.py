@@ -0,0 +1,100 @@
+""" Saturation point of the acquisition pipeline fed by a replayed NMEA log.
+
+    A synthetic 1 Hz log is replayed through nmeareplay.NMEAReplayPort at 1,
+    10, 100 and 1000 times real time (1 to 1000 fixes per second), then as
+    fast as possible, and each fix goes the way ReadGpsd and trackGps.setCoords
+    take it: GPSConnection.getPosition (read + stream parser), the compiled
+    acquisition filter and the TrackStore. For each rate the achieved fixes
+    per second, the largest lag of the reader behind the log and the CPU used
+    are printed; the pipeline is saturated when the achieved rate falls short
+    of the target or the lag keeps growing.
+
+    The map canvas and the SHAPE file export need a running QGIS and are not
+    part of this benchmark: load the plugin with the replayFile and
+    replaySpeed settings (trackGpsGPSSettings) for those.
+
+    Run from the plugin folder:
+        python -m benchmarks.replay_pipeline [seconds per rate]
+"""
+
+
+import os
+import sys
+import time
+import tempfile
+
+from gpsconnection import GPSConnection
+from acquisitionfilter import compileFilter
+from trackstore import TrackStore
+
+from benchmarks import nmeadata
+
+
+def run(fileName, speed, seconds):
+    """Replays fileName at speed for seconds, returns (fixes, wall s, cpu s, largest lag s)"""
+
+    session = GPSConnection()
+    session.connect_replay(fileName, speed)
+    port = session.serialPort
+    acquisitionFilter = compileFilter(maxHdop=5.0, minFixQuality=1)
+    trackStore = TrackStore()
+    fixes = 0
+    ended = False
+    maxLag = 0.0
+    startCpu = sum(os.times()[:2])
+    start = time.time()
+    end = start + seconds
+    lastFix = start
+    while time.time() < end:
+        lag = port.lag()
+        if lag > maxLag:
+            maxLag = lag
+        gpsPosition = session.getPosition()
+        if gpsPosition.hasFix:
+            fixes += 1
+            lastFix = time.time()
+            if acquisitionFilter.accept(gpsPosition):
+                trackStore.append(gpsPosition)
+        elif port.nextDue() is None and not port.inWaiting():
+            ended = True # end of the log, the last read waited for nothing
+            break
+    cpu = sum(os.times()[:2]) - startCpu
+    wall = (lastFix if ended and fixes else time.time()) - start
+    port.close()
+    return fixes, wall, cpu, maxLag
+
+
+def scenario(numEpochs=20000):
+    """Metrics of the benchmark suite (see benchmarks.suite): the unpaced pipeline"""
+
+    handle, fileName = tempfile.mkstemp(suffix='.nmea')
+    try:
+        os.write(handle, nmeadata.log(numEpochs))
+        os.close(handle)
+        fixes, wall, cpu, maxLag = run(fileName, 0, 60.0)
+    finally:
+        os.remove(fileName)
+    return {'fixesPerSecond': fixes / wall}
+
+
+def main(argv):
+
+    seconds = float(argv[1]) if len(argv) > 1 else 5.0
+    rates = (1, 10, 100, 1000)
+    numEpochs = int(max(rates) * seconds) + 10
+    handle, fileName = tempfile.mkstemp(suffix='.nmea')
+    try:
+        os.write(handle, nmeadata.log(numEpochs))
+        os.close(handle)
+        print '%-8s %10s %10s %8s %10s' % ('rate Hz', 'fixes', 'fixes/s', 'cpu %', 'max lag s')
+        for rate in rates:
+            fixes, wall, cpu, maxLag = run(fileName, float(rate), seconds)
+            print '%-8d %10d %10.1f %8.1f %10.3f' % (rate, fixes, fixes / wall, 100.0 * cpu / wall, maxLag)
+        fixes, wall, cpu, maxLag = run(fileName, 0, seconds * 10)
+        print '%-8s %10d %10.1f %8.1f %10s' % ('max', fixes, fixes / wall, 100.0 * cpu / wall, '-')
+    finally:
+        os.remove(fileName)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
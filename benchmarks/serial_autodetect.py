@@ -0,0 +1,227 @@
+""" Receiver search and serial read path against a simulated receiver.
+
+    gpssimulator.GPSSimulator stands in for the receiver on a pseudo-terminal,
+    so the real serialposix/termios code of GPSConnection runs without a
+    device. Three measurements:
+
+    - time for sweep_port to find the receiver through GPSConnection.baudRates
+      when it talks at 1200, 2400, 4800 and 9600 baud (the simulator sends
+      garbage while the port is set to another speed), and for a cached
+      connection (search_available_port -> connect_cached);
+    - fixes per second and corrupted sentences counted by the parser reading
+      115200 baud at 1, 10 and 50 Hz with 1% corrupted sentences and GPS +
+      GLONASS talkers (at 50 Hz the epochs no longer fit in the line and the
+      simulator drops some, like a receiver set too fast for its baud rate);
+    - time for getPosition to report the lost connection after the pty is
+      hung up.
+
+    check() asserts what the measurements rely on: the sweep finds the speed
+    the simulator talks at, the parser drops exactly the sentences the
+    simulator corrupted, and a hang up raises NoGPSConnected. The suite
+    scenario runs it first.
+
+    Linux/POSIX only. Run from the plugin folder:
+        python -m benchmarks.serial_autodetect [--check]
+"""
+
+
+import os
+import sys
+import time
+
+import serial
+
+from gpssimulator import GPSSimulator
+from gpsconnection import GPSConnection, NoGPSConnected
+from connectioncache import ConnectionFingerprint
+from nmeaparser import NMEAStreamParser
+
+from benchmarks.suite import requirePty
+
+
+def timeSweep(baudRate):
+    """Returns (speed found, seconds) for a receiver talking at baudRate"""
+
+    simulator = GPSSimulator(baudRate, rate=1.0)
+    simulator.start()
+    try:
+        session = GPSConnection()
+        start = time.time()
+        found = session.sweep_port(simulator.device, session.baudRates)
+        elapsed = time.time() - start
+        if found is None:
+            return None, elapsed
+        found[1].close()
+        return found[0], elapsed
+    finally:
+        simulator.stop()
+
+
+def timeCached(baudRate):
+    """Returns the seconds search_available_port takes when the receiver is in the cache"""
+
+    simulator = GPSSimulator(baudRate, rate=1.0)
+    simulator.start()
+    try:
+        session = GPSConnection()
+        session.cache.remember(ConnectionFingerprint(simulator.device, '', baudRate, ''))
+        session.search_available_port()
+        session.serialPort.close()
+        return session.timeToConnect
+    finally:
+        simulator.stop()
+
+
+def timeStaleCache(baudRate, silent=3):
+    """
+    Returns (seconds connect_cached takes, entries left in the cache) when the receiver is the
+    oldest cached entry, behind silent ports that never answer and a device that is gone
+    """
+
+    simulator = GPSSimulator(baudRate, rate=1.0)
+    simulator.start()
+    terminals = [os.openpty() for i in range(silent)]
+    try:
+        session = GPSConnection()
+        session.cache.remember(ConnectionFingerprint(simulator.device, '', baudRate, ''))
+        for master, slave in terminals:
+            session.cache.remember(ConnectionFingerprint(os.ttyname(slave), '', baudRate, ''))
+        session.cache.remember(ConnectionFingerprint('/dev/nonexistent-gps', '', baudRate, ''))
+        start = time.time()
+        connected = session.connect_cached()
+        elapsed = time.time() - start
+        if connected:
+            session.serialPort.close()
+        return elapsed, [entry.device for entry in session.cache.entries]
+    finally:
+        for master, slave in terminals:
+            os.close(master)
+            os.close(slave)
+        simulator.stop()
+
+
+def readRate(rate, seconds=5.0, baudRate=115200):
+    """
+    Returns (fixes per second, epochs dropped by the simulator, sentences corrupted by the
+    simulator, bad sentences parsed)
+    """
+
+    simulator = GPSSimulator(baudRate, rate, talkers=('GP', 'GL'), corruption=0.01, seed=1)
+    simulator.start()
+    try:
+        session = GPSConnection()
+        session.try_connect_port_with_speed(simulator.device, baudRate)
+        fixes = 0
+        start = time.time()
+        while time.time() - start < seconds:
+            if session.getPosition().hasFix:
+                fixes += 1
+        elapsed = time.time() - start
+        session.serialPort.close()
+        return fixes / elapsed, simulator.epochsDropped, simulator.sentencesCorrupted, session.parser.badCount
+    finally:
+        simulator.stop()
+
+
+def countCorruption(seconds=3.0, baudRate=115200):
+    """
+    Returns (sentences corrupted by the simulator, sentences dropped by the parser) with every
+    byte sent being parsed: the port is opened before the simulator starts and read until the
+    simulator falls silent after seconds.
+    """
+
+    simulator = GPSSimulator(baudRate, 10.0, talkers=('GP', 'GL'), corruption=0.05,
+                             disconnects=[(seconds, 3600.0)], seed=1)
+    port = serial.Serial(simulator.device, baudRate, timeout=.25)
+    parser = NMEAStreamParser()
+    parser.requireChecksum = True # the simulator always sends one, a cut may remove it
+    start = time.time()
+    simulator.start()
+    try:
+        while True:
+            data = port.read(max(port.inWaiting(), 1))
+            if data:
+                parser.feed(data)
+            elif time.time() > start + seconds:
+                break # a quarter of a second without a byte: the scripted silence
+        return simulator.sentencesCorrupted, parser.badCount
+    finally:
+        port.close()
+        simulator.stop()
+
+
+def timeHangup(after=1.5, timeout=10.0):
+    """Returns the seconds between the hang up of the pty and NoGPSConnected, None if it
+    was not raised within timeout seconds"""
+
+    simulator = GPSSimulator(9600, 1.0, disconnects=[(after, None)])
+    simulator.start()
+    try:
+        session = GPSConnection()
+        session.try_connect_port_with_speed(simulator.device, 9600)
+        deadline = time.time() + timeout
+        try:
+            while time.time() < deadline:
+                session.getPosition()
+        except NoGPSConnected:
+            # the simulator hangs up at the first epoch after after, not at after
+            return time.time() - simulator.hangupTime
+        session.serialPort.close()
+        return None
+    finally:
+        simulator.stop()
+
+
+def check():
+    """Raises AssertionError if the simulated receiver is not found, counted or lost as it should"""
+
+    for baudRate in (1200, 2400, 4800, 9600):
+        found, elapsed = timeSweep(baudRate)
+        assert found == baudRate, "sweep found %s for a receiver at %d baud" % (found, baudRate)
+    elapsed, devices = timeStaleCache(4800)
+    assert elapsed < GPSConnection().sniffWindow, "stale cache entries took %.2f s" % elapsed
+    assert '/dev/nonexistent-gps' not in devices, "the entry of a missing device was kept"
+    corrupted, bad = countCorruption()
+    assert corrupted > 0, "the simulator corrupted no sentence"
+    assert bad == corrupted, "%d sentences corrupted, %d dropped by the parser" % (corrupted, bad)
+    elapsed = timeHangup()
+    assert elapsed is not None, "no NoGPSConnected after the pty was hung up"
+    assert elapsed < 1.0, "hang up reported after %.2f s" % elapsed
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite), once check() passed"""
+
+    requirePty()
+    check()
+    return {'sweepSeconds': timeSweep(1200)[1], 'cachedSeconds': timeCached(4800)}
+
+
+def main(argv):
+
+    if '--check' in argv[1:]:
+        check()
+        print 'checks passed'
+        return
+
+    print '%-10s %10s %10s' % ('baud', 'found', 'seconds')
+    for baudRate in (1200, 2400, 4800, 9600):
+        found, elapsed = timeSweep(baudRate)
+        print '%-10d %10s %10.2f' % (baudRate, found, elapsed)
+    print '%-10s %10s %10.2f' % ('cached', 4800, timeCached(4800))
+    print '%-10s %10s %10.2f' % ('stale', 4800, timeStaleCache(4800)[0])
+    print
+    print '%-10s %10s %10s %10s %10s' % ('rate Hz', 'fixes/s', 'dropped', 'corrupted', 'bad')
+    for rate in (1, 10, 50):
+        fixesPerSecond, dropped, corrupted, bad = readRate(rate)
+        print '%-10d %10.1f %10d %10d %10d' % (rate, fixesPerSecond, dropped, corrupted, bad)
+    print
+    elapsed = timeHangup()
+    if elapsed is None:
+        print 'hang up not reported'
+    else:
+        print 'hang up reported after %.1f ms' % (elapsed * 1000.0)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
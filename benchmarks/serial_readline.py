@@ -0,0 +1,114 @@
+""" Syscalls per NMEA sentence read through the vendored serial package.
+
+    A pseudo-terminal pair stands in for the receiver: a writer thread pushes
+    a synthetic log into the master side while the real serialposix.Serial
+    reads the slave side, once with the old byte-at-a-time FileLike.readline
+    and once with the buffered SerialBase.readline. select.select, os.read and
+    the FIONREAD ioctl are counted while the lines are read.
+
+    POSIX only. Run from the plugin folder:  python -m benchmarks.serial_readline
+"""
+
+
+import os
+import select
+import fcntl
+import threading
+import time
+
+import serial
+from serial import serialposix
+from serial.serialutil import FileLike
+
+from benchmarks import nmeadata
+
+
+class SyscallCounter(object):
+    """Wraps the functions used by serialposix and counts the calls"""
+
+    names = (('select', select, 'select'), ('read', os, 'read'), ('ioctl', fcntl, 'ioctl'))
+
+    def __init__(self):
+
+        self.counts = dict([(name, 0) for name, module, attr in self.names])
+        self.saved = []
+
+
+    def _wrap(self, name, func):
+
+        def counted(*args):
+            self.counts[name] += 1
+            return func(*args)
+        return counted
+
+
+    def __enter__(self):
+
+        for name, module, attr in self.names:
+            func = getattr(module, attr)
+            self.saved.append((module, attr, func))
+            setattr(module, attr, self._wrap(name, func))
+        return self
+
+
+    def __exit__(self, *exc):
+
+        for module, attr, func in self.saved:
+            setattr(module, attr, func)
+        self.saved = []
+
+
+    def total(self):
+
+        return sum(self.counts.values())
+
+
+
+def _writer(fd, data, chunk=512):
+
+    for i in xrange(0, len(data), chunk):
+        os.write(fd, data[i:i+chunk])
+
+
+def run(numEpochs=500, buffered=True):
+    """Reads a synthetic log of numEpochs epochs from a pty and returns
+    (sentences, syscall counts dict, elapsed seconds)"""
+
+    data = nmeadata.log(numEpochs)
+    expected = data.count('\n')
+    master, slave = os.openpty()
+    port = serial.Serial(os.ttyname(slave), 115200, timeout=.25)
+    writer = threading.Thread(target=_writer, args=(master, data))
+
+    readline = port.readline if buffered else lambda: FileLike.readline(port)
+    sentences = 0
+    start = time.time()
+    writer.start()
+    with SyscallCounter() as counter:
+        while sentences < expected:
+            line = readline()
+            if not line:
+                break
+            sentences += 1
+    elapsed = time.time() - start
+    writer.join()
+    port.close()
+    os.close(master)
+    os.close(slave)
+    return sentences, dict(counter.counts), elapsed
+
+
+def main():
+
+    print '%-10s %10s %8s %8s %8s %14s %10s' % ('readline', 'sentences', 'select', 'read', 'ioctl',
+                                               'syscalls/sent', 'sent/s')
+    for label, buffered in (('byte', False), ('buffered', True)):
+        sentences, counts, elapsed = run(buffered=buffered)
+        total = sum(counts.values())
+        print '%-10s %10d %8d %8d %8d %14.2f %10.0f' % (label, sentences, counts['select'], counts['read'],
+                                                      counts['ioctl'], total / float(max(sentences, 1)),
+                                                      sentences / max(elapsed, 1e-9))
+
+
+if __name__ == '__main__':
+    main()
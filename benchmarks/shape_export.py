@@ -0,0 +1,131 @@
+""" Points SHAPE file export throughput at 10k, 100k and 1M fixes.
+
+    Compares the original makeShapeFiles loop (one QgsFeature() per fix,
+    nine setAttributes calls, one addFeature each) with
+    shapewriter.exportPoints (one attribute vector per feature, one shared
+    QgsFields, batched addFeatures). The fixes are synthetic columns in a
+    trackstore.TrackStore (10 Hz, 10000 fixes per track) written to a
+    temporary folder.
+
+    Needs the QGIS Python bindings; set QGIS_PREFIX_PATH if QGIS is not
+    installed in /usr. Run from the plugin folder:
+        python -m benchmarks.shape_export [max points]
+"""
+
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from array import array
+
+from PyQt4.QtCore import QVariant
+from qgis.core import *
+
+from nmeaparser import formatDateTime
+from shapewriter import pointFields, exportPoints
+from trackstore import TrackStore, TrackColumns
+
+
+def syntheticStore(numPoints, pointsPerTrack=10000):
+    """Returns a TrackStore of numPoints fixes of a receiver moving north-east at 10 Hz"""
+
+    store = TrackStore()
+    start = 1.3e9
+    for first in xrange(0, numPoints, pointsPerTrack):
+        track = TrackColumns()
+        n = min(pointsPerTrack, numPoints - first)
+        indexes = xrange(first, first + n)
+        columns = track.columns
+        columns['longitude'].extend(array('d', [-73.5 + i * 9e-6 for i in indexes]))
+        columns['latitude'].extend(array('d', [45.5 + i * 6e-6 for i in indexes]))
+        columns['utcTime'].extend(array('d', [start + i * 0.1 for i in indexes]))
+        columns['hdop'].extend(array('f', [0.9]) * n)
+        columns['speed'].extend(array('f', [36.0]) * n)
+        columns['bearing'].extend(array('f', [56.3]) * n)
+        columns['numSatellites'].extend(array('B', [9]) * n)
+        columns['fixQuality'].extend(array('B', [1]) * n)
+        track.closed = True
+        store.tracks.append(track)
+    return store
+
+
+def legacyExport(writer, trackStore):
+    """The feature loop of the original makeShapeFiles"""
+
+    for j, track in enumerate(trackStore.tracks):
+        for longitude, latitude, utcTime, hdop, speed, bearing, numSatellites, fixQuality in track.rows():
+            theFeature = QgsFeature()
+            theFeature.setGeometry(QgsGeometry.fromPoint(QgsPoint(longitude,latitude)))
+            theFeature.setAttributes([0, latitude])
+            theFeature.setAttributes([1, longitude])
+            theFeature.setAttributes([2, numSatellites])
+            theFeature.setAttributes([3, hdop])
+            theFeature.setAttributes([4, formatDateTime(utcTime)])
+            theFeature.setAttributes([5, fixQuality])
+            theFeature.setAttributes([6, bearing])
+            theFeature.setAttributes([7, speed])
+            theFeature.setAttributes([8, j+1])
+            writer.addFeature(theFeature)
+
+
+def run(folder, trackStore, export):
+    """Exports trackStore with export(writer, trackStore), returns the elapsed seconds"""
+
+    fileName = os.path.join(folder, 'points%d.shp' % len(trackStore))
+    crs = QgsCoordinateReferenceSystem()
+    crs.createFromOgcWmsCrs("EPSG:4326")
+    start = time.time()
+    writer = QgsVectorFileWriter(fileName, "CP1250", pointFields(), QGis.WKBPoint, crs)
+    export(writer, trackStore)
+    del writer # flush and close
+    elapsed = time.time() - start
+    for extension in ('.shp', '.shx', '.dbf', '.prj', '.cpg'):
+        if os.path.exists(fileName[:-4] + extension):
+            os.remove(fileName[:-4] + extension)
+    return elapsed
+
+
+def startQgis():
+
+    QgsApplication.setPrefixPath(os.environ.get('QGIS_PREFIX_PATH', '/usr'), True)
+    application = QgsApplication([], False)
+    application.initQgis()
+    return application
+
+
+def scenario(numPoints=100000):
+    """Metrics of the benchmark suite (see benchmarks.suite)"""
+
+    application = startQgis()
+    folder = tempfile.mkdtemp()
+    try:
+        elapsed = run(folder, syntheticStore(numPoints), exportPoints)
+    finally:
+        shutil.rmtree(folder)
+        application.exitQgis()
+    return {'pointsPerSecond': numPoints / max(elapsed, 1e-9)}
+
+
+def main(argv):
+
+    application = startQgis()
+    maxPoints = int(argv[1]) if len(argv) > 1 else 1000000
+    folder = tempfile.mkdtemp()
+    try:
+        print '%-10s %10s %10s %12s' % ('export', 'points', 'seconds', 'points/s')
+        for numPoints in (10000, 100000, 1000000):
+            if numPoints > maxPoints:
+                break
+            trackStore = syntheticStore(numPoints)
+            for label, export in (('legacy', legacyExport), ('bulk', exportPoints)):
+                elapsed = run(folder, trackStore, export)
+                print '%-10s %10d %10.2f %12.0f' % (label, numPoints, elapsed, numPoints / max(elapsed, 1e-9))
+    finally:
+        shutil.rmtree(folder)
+        application.exitQgis()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,109 @@
+""" Cost of publishing the fixes in the memory mapped fix file and of reading them back.
+
+    - microseconds per FixPublisher.publish of a one fix batch (what
+      trackGps.setCoords adds for a 1-10 Hz receiver);
+    - microseconds per FixReader.latest and FixReader.recent(10), idle and
+      while another process publishes 1000 fixes a second (reads started
+      again by the seqlock are counted).
+
+    Run from the plugin folder:
+        python -m benchmarks.shared_fix
+"""
+
+
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+
+from sharedfix import FixPublisher, FixReader
+from nmeaparser import GPSPosition
+
+
+def fix(i):
+
+    p = GPSPosition()
+    p.hasFix = True
+    p.longitude, p.latitude, p.utcTime = -73.5 + i * 1e-5, 45.5 + i * 1e-5, 1262304000.0 + i
+    p.hdop, p.numSatellites, p.fixQuality = 0.9, 8, 1
+    return p
+
+
+def publishCost(fileName, count=100000):
+    """Returns the microseconds per publish of a one fix batch"""
+
+    publisher = FixPublisher(fileName)
+    batches = [[fix(i)] for i in xrange(count)]
+    start = time.time()
+    for batch in batches:
+        publisher.publish(batch)
+    elapsed = time.time() - start
+    publisher.close()
+    return elapsed * 1e6 / count
+
+
+def publishing(fileName, rate, seconds):
+    """Publishes rate fixes a second for seconds (the writer process)"""
+
+    publisher = FixPublisher(fileName)
+    start = time.time()
+    i = 0
+    while time.time() - start < seconds:
+        publisher.publish([fix(i)])
+        i += 1
+        time.sleep(max(start + i / float(rate) - time.time(), 0.0))
+    publisher.close()
+
+
+def readCost(reader, read, count=100000):
+    """Returns (microseconds per read, reads started again per read)"""
+
+    retries = reader.retries
+    start = time.time()
+    for i in xrange(count):
+        read()
+    return (time.time() - start) * 1e6 / count, (reader.retries - retries) / float(count)
+
+
+def measure():
+    """Returns [(label, us per operation, retries per read)]"""
+
+    handle, fileName = tempfile.mkstemp(suffix='.map')
+    os.close(handle)
+    try:
+        results = [('publish', publishCost(fileName), 0.0)]
+        reader = FixReader(fileName)
+        results.append(('latest idle',) + readCost(reader, reader.latest))
+        results.append(('recent(10) idle',) + readCost(reader, lambda: reader.recent(10), 20000))
+        writer = multiprocessing.Process(target=publishing, args=(fileName, 1000.0, 60.0))
+        writer.start()
+        time.sleep(0.5)
+        try:
+            results.append(('latest busy',) + readCost(reader, reader.latest))
+            results.append(('recent(10) busy',) + readCost(reader, lambda: reader.recent(10), 20000))
+        finally:
+            writer.terminate()
+            writer.join()
+        reader.close()
+    finally:
+        os.remove(fileName)
+    return results
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite)"""
+
+    results = dict([(label, cost) for label, cost, retries in measure()])
+    return {'usPerPublish': results['publish'], 'usPerLatest': results['latest busy']}
+
+
+def main(argv):
+
+    print '%-16s %10s %14s' % ('operation', 'us', 'retries/read')
+    for label, cost, retries in measure():
+        print '%-16s %10.2f %14.4f' % (label, cost, retries)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
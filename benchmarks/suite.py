@@ -0,0 +1,211 @@
+""" All of the benchmarks as repeatable scenarios checked against recorded baselines.
+
+    Each scenario is the scenario() function of a benchmark module and
+    returns a dict of metrics. Metrics whose name ends in 'PerSecond' are
+    better when higher, all of the others (times, costs, sizes) when lower.
+    Every scenario runs in a fresh interpreter (QGIS cannot be started twice
+    in one process and memory figures must not depend on the scenarios run
+    before), repeat times; the best value of each metric is kept and compared
+    with benchmarks/baselines.json. A metric worse than its baseline by more
+    than the tolerance plus its spread (how much the runs of the scenario
+    differed, when the baseline was recorded or in this session, whichever is
+    larger) is a regression and makes the exit status 1, so the suite can
+    gate CI. With less than the default repeat the spread of the session is
+    not known and the gate sees more noise. A scenario whose dependencies are missing (ImportError,
+    e.g. the QGIS bindings, or Unavailable: no display, no pseudo-terminal)
+    exits with the UNAVAILABLE status and is reported as skipped. Any other
+    error, a failed check of the scenario (AssertionError, see
+    serial_autodetect.check) or a crash, is reported as failed and also makes
+    the exit status 1.
+
+    The baselines are machine dependent: record them again with --record on
+    the machine that runs the suite, with the default repeat or more, so that
+    the spread recorded with them covers the noise of that machine.
+
+    Run from the plugin folder:
+        python -m benchmarks.suite [--record] [--repeat N] [--tolerance F] [scenario ...]
+"""
+
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+
+# scenario name, module, what it measures
+SCENARIOS = [('parser', 'benchmarks.nmea_parser', 'NMEAStreamParser sentences/s on a 20000 epoch log'),
+             ('filter', 'benchmarks.time_filter', 'compiled acquisition filter cost per fix (setCoords)'),
+             ('paint', 'benchmarks.canvas_paint', 'rubber band + marker paint and batched update, 10k points'),
+             ('export', 'benchmarks.shape_export', 'points SHAPE file export, 100k fixes'),
+             ('portscan', 'benchmarks.serial_autodetect', 'baud sweep and cached connection to the pty simulator'),
+             ('reader', 'benchmarks.event_reader', 'select driven reading: wake ups per fix, stop latency'),
+             ('receivers', 'benchmarks.multi_receiver', 'CPU per receiver, 4 simulators at 10 Hz on one ingest loop'),
+             ('gil', 'benchmarks.process_reader', 'GUI process CPU per fix with the reader process, 1000 Hz replay'),
+             ('fixfile', 'benchmarks.shared_fix', 'publish and seqlock read of the memory mapped fix file'),
+             ('memory', 'benchmarks.position_memory', 'TrackStore bytes per fix over 100k fixes'),
+             ('length', 'benchmarks.track_length', 'segment lengths of a 100k fix track, NumPy or Python'),
+             ('pipeline', 'benchmarks.replay_pipeline', 'replay + parse + filter + store, unpaced')]
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+UNAVAILABLE = 3 # exit status of a scenario whose dependencies are missing
+
+
+
+class Unavailable(Exception):
+    """Raised by a scenario that cannot run on this machine (no display, no pseudo-terminal)"""
+
+
+
+class ScenarioFailed(Exception):
+    """A scenario raised anything but ImportError or Unavailable, or its interpreter died"""
+
+
+
+def requirePty():
+    """Raises Unavailable if no pseudo-terminal can be opened (the scenarios of the simulator)"""
+
+    try:
+        master, slave = os.openpty()
+    except (AttributeError, OSError), e:
+        raise Unavailable("no pseudo-terminal: %s" % e)
+    os.close(master)
+    os.close(slave)
+
+
+def higherIsBetter(metric):
+
+    return metric.endswith('PerSecond')
+
+
+def runScenario(module):
+    """Runs module.scenario() in a new interpreter, returns its metrics, or why it cannot run
+    on this machine; raises ScenarioFailed if it failed"""
+
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.suite', '--child', module],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out, err = process.communicate()
+    if process.returncode != 0:
+        lines = err.strip().splitlines()
+        message = lines[-1] if lines else 'exit status %d' % process.returncode
+        if process.returncode != UNAVAILABLE:
+            raise ScenarioFailed(message)
+        return message
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def best(runs):
+    """Returns the best value of each metric over a list of metric dicts"""
+
+    metrics = {}
+    for run in runs:
+        for metric, value in run.items():
+            if metric not in metrics:
+                metrics[metric] = value
+            elif higherIsBetter(metric):
+                metrics[metric] = max(metrics[metric], value)
+            else:
+                metrics[metric] = min(metrics[metric], value)
+    return metrics
+
+
+def spreads(runs):
+    """Returns how much each metric varied over a list of metric dicts, relative to its best value"""
+
+    result = {}
+    for metric, bestValue in best(runs).items():
+        values = [run[metric] for run in runs if metric in run]
+        result[metric] = (max(values) - min(values)) / float(bestValue) if bestValue else 0.0
+    return result
+
+
+def loadBaselines():
+    """Returns {scenario.metric: [best value, spread]}"""
+
+    if not os.path.exists(BASELINES):
+        return {}
+    return json.load(open(BASELINES))
+
+
+def saveBaselines(baselines):
+
+    out = open(BASELINES, 'w')
+    json.dump(baselines, out, indent=2, sort_keys=True, separators=(',', ': '))
+    out.write('\n')
+    out.close()
+
+
+def main(argv):
+
+    parser = argparse.ArgumentParser(description="Runs the benchmark scenarios against their baselines")
+    parser.add_argument('scenarios', nargs='*', help="scenarios to run (default: all)")
+    parser.add_argument('--record', action='store_true', help="save the results as the new baselines")
+    parser.add_argument('--repeat', type=int, default=5, help="runs of each scenario, the best is kept")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="relative change counted as a regression")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv[1:])
+
+    if args.child:
+        try:
+            __import__(args.child)
+            metrics = sys.modules[args.child].scenario()
+        except (ImportError, Unavailable), e:
+            print >> sys.stderr, e
+            return UNAVAILABLE
+        print json.dumps(metrics)
+        return 0
+
+    names = [name for name, module, description in SCENARIOS]
+    for name in args.scenarios:
+        if name not in names:
+            parser.error("unknown scenario %s (one of %s)" % (name, ', '.join(names)))
+    baselines = loadBaselines()
+    regressions = 0
+    failures = 0
+    print '%-28s %14s %14s %9s %9s' % ('metric', 'value', 'baseline', 'change', 'spread')
+    for name, module, description in SCENARIOS:
+        if args.scenarios and name not in args.scenarios:
+            continue
+        runs = []
+        try:
+            for i in range(max(args.repeat, 1)):
+                result = runScenario(module)
+                if not isinstance(result, dict):
+                    break
+                runs.append(result)
+        except ScenarioFailed, e:
+            print '%-28s FAILED: %s' % (name, e)
+            failures += 1
+            continue
+        if not runs:
+            print '%-28s skipped: %s' % (name, result)
+            continue
+        spread = spreads(runs)
+        for metric, value in sorted(best(runs).items()):
+            key = name + '.' + metric
+            if key not in baselines:
+                print '%-28s %14.4g %14s %9s %8.1f%%' % (key, value, '-', '-', spread[metric] * 100.0)
+            else:
+                baseline, recordedSpread = baselines[key]
+                noise = max(recordedSpread, spread[metric]) # noisier metrics and sessions get more room
+                change = (value - baseline) / float(baseline) if baseline else 0.0
+                worse = -change if higherIsBetter(metric) else change
+                flag = ''
+                if worse > args.tolerance + noise:
+                    flag = '  REGRESSION'
+                    regressions += 1
+                print '%-28s %14.4g %14.4g %+8.1f%% %8.1f%%%s' % (key, value, baseline, change * 100.0,
+                                                                 noise * 100.0, flag)
+            if args.record:
+                baselines[key] = [float('%.4g' % value), float('%.3g' % spread[metric])]
+    if args.record:
+        saveBaselines(baselines)
+        print 'baselines saved to', BASELINES
+    return 1 if failures or regressions and not args.record else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
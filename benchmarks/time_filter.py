@@ -0,0 +1,83 @@
+""" Per-fix cost of the time threshold of the acquisition filter.
+
+    The original trackGps.timeIntervals formatted the date of both positions,
+    parsed the strings back with time.strptime, converted them with
+    time.mktime and datetime.fromtimestamp and compared timedelta.seconds.
+    The numeric filter (acquisitionfilter.TimeStage) subtracts the utcTime of
+    the two positions. Both are run over the fixes of a 10 Hz synthetic log
+    with a 0.2 s threshold; the string version can only resolve whole seconds,
+    so it keeps fewer fixes. The whole compiled acquisition filter (quality,
+    speed, time and distance stages) is timed on the same fixes.
+
+    Run from the plugin folder:  python -m benchmarks.time_filter
+"""
+
+
+import time
+import datetime
+
+from nmeaparser import NMEAStreamParser
+from acquisitionfilter import TimeStage, compileFilter
+
+from benchmarks import nmeadata
+
+
+FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def stringFilter(aGPSPosition, lastPosition, intervalli):
+
+    struct_A = time.strptime(aGPSPosition.theDateTime, FORMAT)
+    struct_B = time.strptime(lastPosition.theDateTime, FORMAT)
+    confrontoA = datetime.datetime.fromtimestamp(time.mktime(struct_A))
+    confrontoB = datetime.datetime.fromtimestamp(time.mktime(struct_B))
+    return (confrontoA - confrontoB).seconds > intervalli
+
+
+def run(positions, timeFilter, intervalli=0.2):
+    """Filters positions, returns (accepted fixes, microseconds per fix)"""
+
+    lastPosition = positions[0]
+    accepted = 1
+    start = time.time()
+    for aGPSPosition in positions[1:]:
+        if timeFilter(aGPSPosition, lastPosition, intervalli):
+            lastPosition = aGPSPosition
+            accepted += 1
+    elapsed = time.time() - start
+    return accepted, elapsed * 1e6 / max(len(positions) - 1, 1)
+
+
+def chainCost(positions):
+    """Runs the compiled acquisition filter over positions, returns (filter, accepted, us/fix)"""
+
+    acquisitionFilter = compileFilter(minDistance=1.0, minInterval=0.2, maxHdop=5.0, minFixQuality=1, maxSpeed=200.0)
+    start = time.time()
+    accepted = len([aGPSPosition for aGPSPosition in positions if acquisitionFilter.accept(aGPSPosition)])
+    elapsed = time.time() - start
+    return acquisitionFilter, accepted, elapsed * 1e6 / len(positions)
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite)"""
+
+    positions = NMEAStreamParser().feed(nmeadata.log(20001, rate=10))
+    return {'usPerFix': chainCost(positions)[2]}
+
+
+def main(numFixes=20000):
+
+    positions = NMEAStreamParser().feed(nmeadata.log(numFixes + 1, rate=10))
+    print '%-10s %10s %10s %10s' % ('filter', 'fixes', 'accepted', 'us/fix')
+    numericFilter = lambda aGPSPosition, lastPosition, intervalli: timeStage.check(aGPSPosition, lastPosition)
+    timeStage = TimeStage(0.2) # built once, as the plugin does when the threshold is edited
+    for label, timeFilter in (('string', stringFilter), ('numeric', numericFilter)):
+        accepted, perFix = run(positions, timeFilter)
+        print '%-10s %10d %10d %10.2f' % (label, len(positions), accepted, perFix)
+    acquisitionFilter, accepted, perFix = chainCost(positions)
+    print '%-10s %10d %10d %10.2f' % ('chain', len(positions), accepted, perFix)
+    print acquisitionFilter.summary()
+
+
+if __name__ == '__main__':
+    main()
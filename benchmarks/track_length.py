@@ -0,0 +1,102 @@
+""" Segment lengths of a track, with and without NumPy.
+
+    geodesy.segmentLengths measures each segment in the tangent plane at its
+    mid latitude, with NumPy arrays when NumPy is installed and with a Python
+    loop otherwise. Both are timed on a synthetic track (a 1 Hz walk changing
+    heading every fix, one segment crossing the antimeridian) and printed in
+    nanoseconds per segment.
+
+    check() asserts that both ways give the same lengths, and that a 0.001
+    degree step north at 45 degrees is 111.13 m, so that track lengths do not
+    depend on NumPy being installed. The suite scenario runs it first.
+
+    Run from the plugin folder:
+        python -m benchmarks.track_length [--check]
+"""
+
+
+import sys
+import math
+import time
+
+import geodesy
+
+
+def track(numFixes):
+    """Returns (latitudes, longitudes) of numFixes fixes, the last one across the antimeridian"""
+
+    latitudes = []
+    longitudes = []
+    for i in xrange(numFixes - 1):
+        latitudes.append(45.5 + 0.0001 * math.sin(i * 0.1) + i * 1e-6)
+        longitudes.append(-73.5 + 0.0001 * math.cos(i * 0.07) + i * 1e-6)
+    latitudes.append(-16.5)
+    longitudes.append(-179.9999)
+    latitudes[-2], longitudes[-2] = -16.5, 179.9999
+    return latitudes, longitudes
+
+
+def pythonLengths(latitudes, longitudes):
+    """geodesy.segmentLengths without NumPy"""
+
+    numpy = geodesy.numpy
+    geodesy.numpy = None
+    try:
+        return geodesy.segmentLengths(latitudes, longitudes)
+    finally:
+        geodesy.numpy = numpy
+
+
+def cost(function, latitudes, longitudes, repeat=5):
+    """Returns the best nanoseconds per segment of function over repeat runs"""
+
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        function(latitudes, longitudes)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e9 / (len(latitudes) - 1)
+
+
+def check():
+    """Raises AssertionError if the lengths depend on NumPy being installed"""
+
+    latitudes, longitudes = track(1000)
+    lengths = pythonLengths(latitudes, longitudes)
+    assert len(lengths) == len(latitudes) - 1, "%d lengths for %d fixes" % (len(lengths), len(latitudes))
+    assert abs(lengths[-1] - 21.3) < 0.1, "antimeridian segment of %.2f m" % lengths[-1]
+    step = pythonLengths([45.0, 45.001], [-73.0, -73.0])[0]
+    assert abs(step - 111.13) < 0.01, "0.001 degree north at 45 degrees: %.2f m" % step
+    if geodesy.numpy is not None:
+        vectorized = geodesy.segmentLengths(latitudes, longitudes)
+        worst = max([abs(a - b) / max(b, 1e-3) for a, b in zip(vectorized, lengths)])
+        assert worst < 1e-9, "NumPy and Python segment lengths differ by %.2g" % worst
+
+
+def scenario():
+    """Metrics of the benchmark suite (see benchmarks.suite), once check() passed"""
+
+    check()
+    latitudes, longitudes = track(100000)
+    function = geodesy.segmentLengths if geodesy.numpy is not None else pythonLengths
+    return {'nsPerSegment': cost(function, latitudes, longitudes)}
+
+
+def main(argv):
+
+    if '--check' in argv[1:]:
+        check()
+        print 'checks passed'
+        return
+    latitudes, longitudes = track(100000)
+    print '%-10s %14s' % ('lengths', 'ns / segment')
+    print '%-10s %14.1f' % ('python', cost(pythonLengths, latitudes, longitudes))
+    if geodesy.numpy is not None:
+        print '%-10s %14.1f' % ('numpy', cost(geodesy.segmentLengths, latitudes, longitudes))
+    else:
+        print '%-10s %14s' % ('numpy', 'not installed')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
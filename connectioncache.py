@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+""" Cache of the last successful GPS connections
+    see class documentation below.
+"""
+
+
+import os
+
+
+def talker(address):
+    """The talker of a sentence address: 'GP' of 'GPRMC', 'GN' of 'GNGGA', 'PGRM' of the
+    proprietary 'PGRME'. The first sentence read depends on where in the epoch the port was
+    opened, its talker does not: it tells which constellations the receiver is set to output."""
+
+    if address.startswith('P'):
+        return address[:4]
+    return address[:2]
+
+
+
+class ConnectionFingerprint(object):
+    """One successful connection
+
+    CLASS VARIABLES:
+    device = device name that was opened (e.g. /dev/ttyUSB0 or COM3)
+    byId = stable /dev/serial/by-id name of the device, '' if there is none
+    baudRate = speed the receiver was found at
+    signature = address of the first sentence received (e.g. 'GPRMC'), identifies the
+                receiver's output configuration (see sameReceiver)
+    """
+
+    def __init__(self, device, byId='', baudRate=4800, signature=''):
+
+        self.device = device
+        self.byId = byId
+        self.baudRate = int(baudRate)
+        self.signature = signature
+
+
+    def openName(self):
+        """Returns the name to open: the by-id name survives re-plugging in another USB port"""
+
+        if self.byId and os.path.exists(self.byId):
+            return self.byId
+        return self.device
+
+
+    def sameDevice(self, other):
+
+        if self.byId and other.byId:
+            return self.byId == other.byId
+        return self.device == other.device
+
+
+    def sameReceiver(self, signature):
+        """True if signature, read on the cached port, can come from the cached receiver: same
+        talker (see talker). Entries cached without a signature accept any."""
+
+        return not self.signature or talker(signature) == talker(self.signature)
+
+
+    def toString(self):
+
+        return '|'.join([self.device, self.byId, str(self.baudRate), self.signature])
+
+
+    def fromString(cls, text):
+
+        device, byId, baudRate, signature = text.split('|')
+        return cls(device, byId, baudRate, signature)
+
+    fromString = classmethod(fromString)
+
+
+    def __repr__(self):
+
+        return 'ConnectionFingerprint(%r)' % self.toString()
+
+
+
+class ConnectionCache(object):
+    """Most recently used first list of the last successful connections, tried before a full
+    port search so that reconnecting to a known receiver takes about one epoch.
+
+    The cache has no storage of its own: toStrings/fromStrings convert it to and from a list
+    of strings that the plugin keeps in QSettings.
+
+    CLASS VARIABLES:
+    maxEntries = number of connections remembered
+    entries = list of ConnectionFingerprint, most recent first
+    """
+
+    def __init__(self, maxEntries=5):
+
+        self.maxEntries = maxEntries
+        self.entries = []
+
+
+    def remember(self, fingerprint):
+        """Moves (or adds) the connection to the front of the cache"""
+
+        self.entries = [entry for entry in self.entries if not entry.sameDevice(fingerprint)]
+        self.entries.insert(0, fingerprint)
+        del self.entries[self.maxEntries:]
+
+
+    def forget(self, fingerprint):
+
+        self.entries = [entry for entry in self.entries if not entry.sameDevice(fingerprint)]
+
+
+    def toStrings(self):
+
+        return [entry.toString() for entry in self.entries]
+
+
+    def fromStrings(self, texts):
+        """Loads the cache from a list of strings, silently skipping malformed ones"""
+
+        self.entries = []
+        for text in texts or []:
+            try:
+                self.entries.append(ConnectionFingerprint.fromString(str(text)))
+            except ValueError:
+                pass
+        del self.entries[self.maxEntries:]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+""" Thread writing the SHAPE files of a session without blocking QGIS
+    see class documentation below.
+"""
+
+
+from PyQt4.QtCore import QThread, SIGNAL
+
+from shapewriter import exportPoints, exportLines
+
+
+
+class ShapeExportWorker(QThread):
+    """Writes a snapshot of the tracks to SHAPE files in its own thread
+
+    The SHAPE files are created by the caller, on the GUI thread, so that errors can be reported
+    there; the worker only adds the features and closes the files. It works from a
+    TrackStore.snapshot(), which the plugin never modifies, so recording or erasing the tracks
+    while the export runs is safe.
+
+    SIGNALS:
+    exportProgress(int, int) = items written so far, total items (points + lines)
+    exportFinished(PyQt_PyObject) = (points written, lines written, cancelled)
+
+    CLASS VARIABLES:
+    trackStore = the snapshot being written
+    cancelled = set by cancel(), the export stops after the current batch
+
+    METHODS:
+    cancel = asks the export to stop, the files keep what was written
+    """
+
+    batchSize = 5000 # points written between two progress reports (and cancel checks)
+
+    def __init__(self, trackStore, pointsFile=None, linesFile=None, parent=None):
+
+        QThread.__init__(self, parent)
+        self.trackStore = trackStore
+        self.pointsFile = pointsFile
+        self.linesFile = linesFile
+        self.cancelled = False
+        self.total = (len(trackStore) if pointsFile is not None else 0) + \
+                     (len(trackStore.tracks) if linesFile is not None else 0)
+        self.pointsWritten = 0
+        self.linesWritten = 0
+
+
+    def cancel(self):
+
+        self.cancelled = True
+
+
+    def reportPoints(self, written):
+
+        self.emit(SIGNAL("exportProgress(int, int)"), written, self.total)
+        return not self.cancelled
+
+
+    def reportLines(self, done):
+
+        self.emit(SIGNAL("exportProgress(int, int)"), self.pointsWritten + done, self.total)
+        return not self.cancelled
+
+
+    def run(self):
+
+        try:
+            if self.pointsFile is not None and not self.cancelled:
+                self.pointsWritten = exportPoints(self.pointsFile, self.trackStore, self.batchSize, self.reportPoints)
+            if self.linesFile is not None and not self.cancelled:
+                self.linesWritten = exportLines(self.linesFile, self.trackStore, self.reportLines)
+        finally:
+            # the last references to the writers: the files are flushed and closed in this thread
+            self.pointsFile = None
+            self.linesFile = None
+        self.emit(SIGNAL("exportFinished(PyQt_PyObject)"), (self.pointsWritten, self.linesWritten, self.cancelled))
@@ -6,9 +6,41 @@
 """
 
 
+import re
 import time
+import threading
 import serial
 
+import portdiscovery
+from connectioncache import ConnectionCache, ConnectionFingerprint
+from nmeaparser import GPSPosition, NMEAStreamParser
+from nmeareplay import NMEAReplayPort
+
+
+# start of a NMEA sentence: '$', talker (any constellation) + sentence type, first comma
+NMEA_FRAME = re.compile(r'\$[A-Z]{2}[A-Z]{3},')
+# bytes expected from a receiver talking NMEA at the right speed
+NMEA_CHARACTERS = ''.join([chr(c) for c in range(32, 127)]) + '\r\n'
+
+
+def sniffNMEA(data):
+    """
+    Looks at the raw bytes read from a port and decides whether they are NMEA at the right
+    speed, without waiting for complete lines. Returns True if sentence framing was found,
+    False if the bytes are garbage (a wrong baud rate shows up as non printable characters)
+    or text without any sentence start, None if more bytes are needed to decide.
+    """
+    
+    if NMEA_FRAME.search(data):
+        return True
+    if len(data) < 16:
+        return None
+    if len(data.translate(None, NMEA_CHARACTERS)) * 8 > len(data):
+        return False # more than 1 byte in 8 is not printable ASCII
+    if len(data) >= 256:
+        return False # plenty of text but no '$' framing
+    return None
+
 
 class NoGPSConnected(Exception):
     
@@ -23,41 +55,6 @@ class NoGPSConnected(Exception):
     
     
 
-class GPSPosition(object):
-    """GPS Position Class
-    
-    Bob.Bruce@pobox.com - www.hwps.ca
-    
-    CLASS VARIABLES:
-    datumEPSG = EPSG number of the datum (changed if a datum message is detected)
-    datumSet = indicates that a proprietary message stating the datum was found
-    hasFix = indicator of whether a fix was found
-    latitude = latitude (float)
-    latitudeNS = latitude N or S of equator
-    longitude = longitude (float)
-    longitudeEW = longitude E or W of PM
-    numSatellites = number of satellites used for fix
-    hdop = Horizontal Dilution Of Precision
-    theDateTime = date & time of position
-    fixQuality = 0 = fix not available
-               = 1 = GPS fix
-               = 2 = Differential GPS fix (i.e. WAAS correction)
-    bearing = Track made good, degrees true
-    speed = Speed over ground (km/hr)
-    satelliteData = info on the satellites used for the position,
-                  = a list of tuples as follows:
-                  (satellite number, elevation in degrees, azimuth in degrees to true, SNR in dB)
-    
-    """
-    
-    def __init__(self):
-        
-        self.satelliteData = [] # this will be converted to a list of tuples
-        self.hdop = 0.0 # accuracy isn't always provided in the message - this is default
-        self.hasFix = False
-
-
-
 class GPSConnection(object):
     """GPS Connection Class - finds and connects an NMEA 0183 input source
     from a SERIAL PORT.
@@ -109,48 +106,222 @@ class GPSConnection(object):
         self.datums = {'NAD83': 4269, 'WGS 84': 4326}
         self.datumEPSG = 4326
         
+        # incremental NMEA parser and the epochs it completed that were not yet returned
+        self.parser = NMEAStreamParser(self.datumEPSG)
+        self.epochs = []
+        # one parser per port name, so that sentence/corruption counts are kept per port
+        self.parsers = {}
+        
         self.baudRates = [1200, 2400, 4800, 9600, 14400, 28800, 36400, 56700]
 
         self.port = 0
         self.portName = ''
         self.port_maxval = 18
+        
+        # device that connected last time, ranked first among the discovered devices
+        self.lastDevice = ''
+        # devices found by the last search (portdiscovery.CandidatePort objects)
+        self.candidates = []
+        # last successful connections, tried before searching (the plugin loads/saves it)
+        self.cache = ConnectionCache()
+        self.byId = '' # stable name of the connected device, if any
+        self.signature = '' # address of the first sentence received on connecting
+        
+        # probe all the candidate ports at the same time instead of one after the other
+        self.probeConcurrently = True
+        # seconds to listen at each speed: a little more than one epoch of a 1 Hz receiver
+        self.sniffWindow = 1.2
+        # seconds spent finding the receiver by the last search/connect call
+        self.timeToConnect = None
                 
         
     def search_available_port(self):
         """
-        Method cycles through port numbers from 0 to 18 and baud rates shown below to attempt
-        a connection. If a connection to a serial port was made then self.connected is set to
-        True otherwise it is false.
+        Method first tries the connections in self.cache (see connect_cached), then cycles
+        through the serial devices that exist on this machine (see portdiscovery.candidatePorts) and the baud rates shown below to attempt a connection.
+        Where the devices cannot be listed, port numbers from 0 to 18 are tried instead.
+        If a connection to a serial port was made then self.connected is set to True
+        otherwise it is false.
+        
+        When self.probeConcurrently is True all of the ports are probed at the same time
+        (see search_ports_concurrently), otherwise one after the other.
         
         These class variables are set:
             self.connected = indicator whether a connection to a port was successful
             self.port = the port # that is connected
             self.serialPort = the serial.Serial object that is the connected port
             self.portName = the name of the connected serial port (i.e. COM1)            
+            self.timeToConnect = seconds spent searching
         """
     
-
-        while(not self.connected and self.port < self.port_maxval):
-            for self.baudRate in self.baudRates:
-                self.try_connect_port_with_speed(self.port,self.baudRate)
-                if self.connected: # are connected, stop trying baud rates to connect on
-                    print 'Got GPS on port ' + str(self.port) + ' ' + self.serialPort.portstr
-                    break
-            else:
-                if self.port >= self.port_maxval:
+        startTime = time.time()
+        if self.connect_cached():
+            self.timeToConnect = time.time() - startTime
+            self.portName = self.serialPort.portstr
+            return
+        
+        self.candidates = portdiscovery.candidatePorts(self.lastDevice)
+        if self.candidates is None:
+            self.candidates = []
+            ports = range(self.port, self.port_maxval)
+        else:
+            ports = [candidate.device for candidate in self.candidates]
+            
+        if self.probeConcurrently:
+            self.search_ports_concurrently(ports)
+        else:
+            for port in ports:
+                found = self.sweep_port(port, self.baudRates)
+                if found is not None: # are connected, stop trying ports
+                    self.port = port
+                    self.baudRate, self.serialPort, self.signature = found
+                    self.connected = True
                     break
-                else:
-                    self.port += 1
-                    
-            if self.connected:
-                break # got connected, break out of while loop
+        self.timeToConnect = time.time() - startTime
         
         if self.connected: 
+            print 'Got GPS on port ' + str(self.port) + ' ' + self.serialPort.portstr +\
+                ' in %.2f s' % self.timeToConnect
             self.portName = self.serialPort.portstr
+            self.byId = ''
+            for candidate in self.candidates:
+                if candidate.device == self.port:
+                    self.byId = candidate.byId
+            self.remember_connection()
         else: 
             raise NoGPSConnected("Could not find a GPS Serial Connection sending NMEA messages!")
         
         
+    def connect_cached(self):
+        """
+        Probes the cached connections at the same time, one thread per entry, each one at its
+        cached speed only (see probe_concurrently), so stale entries cost one sniff window in
+        total rather than one each. The first entry that answers with its cached signature wins.
+        Entries whose port cannot be opened any more, or whose first sentence does not match the
+        cached signature (another receiver on that port, or the same one set up differently),
+        are forgotten and left to the port search. Returns True if one of them was connected.
+        
+        These class variables are set on success:
+            self.connected, self.port, self.baudRate, self.serialPort, self.byId, self.signature
+        """
+        
+        stale = []
+        
+        def probe(entry, cancelled):
+            aPort = self.open_port(entry.openName(), entry.baudRate)
+            if aPort is None:
+                stale.append(entry) # unplugged, renamed or taken by another program
+                return None
+            found = self.sweep_port(entry.openName(), [entry.baudRate], cancelled, aPort)
+            if found is not None and not entry.sameReceiver(found[2]):
+                found[1].close()
+                stale.append(entry)
+                return None
+            return found and (entry,) + found
+        
+        winner = self.probe_concurrently([lambda cancelled, entry=entry: probe(entry, cancelled)
+                                          for entry in self.cache.entries])
+        for entry in list(stale): # probes still running when a winner was found are not waited for
+            self.cache.forget(entry)
+        if winner is None:
+            return False
+        entry, self.baudRate, self.serialPort, self.signature = winner
+        self.port = entry.openName()
+        self.byId = entry.byId
+        self.connected = True
+        self.remember_connection()
+        return True
+        
+        
+    def remember_connection(self):
+        """
+        Puts the current connection at the front of self.cache and selects the parser of the
+        port, which keeps the sentence and corruption counts of that port across reconnections.
+        """
+        
+        portName = self.serialPort.portstr
+        if portName not in self.parsers:
+            self.parsers[portName] = NMEAStreamParser(self.datumEPSG)
+        self.parser = self.parsers[portName]
+        self.cache.remember(ConnectionFingerprint(self.serialPort.portstr, self.byId, self.baudRate,
+                                                  self.signature))
+        
+        
+    def search_ports_concurrently(self, ports):
+        """
+        Probes every port in ports at the same time, one thread per port, each thread
+        sweeping through self.baudRates on a single open port (see sweep_port and
+        probe_concurrently). The first port that yields a NMEA message wins.
+        
+        These class variables are set on success:
+            self.connected, self.port, self.baudRate, self.serialPort
+        """
+        
+        winner = self.probe_concurrently([lambda cancelled, port=port: self.probe_port(port, cancelled)
+                                          for port in ports])
+        if winner is not None:
+            self.port, self.baudRate, self.serialPort, self.signature = winner
+            self.connected = True
+        
+        
+    def probe_port(self, port, cancelled):
+        """ Sweeps port through self.baudRates, returns (port,) + the result of sweep_port or None """
+        
+        found = self.sweep_port(port, self.baudRates, cancelled)
+        return found and (port,) + found
+        
+        
+    def probe_concurrently(self, probes):
+        """
+        Runs every probe in its own thread. A probe is called with a threading.Event that is
+        set once another probe has won, and returns None or a tuple whose third item is the
+        open serial.Serial object it found. The first probe that returns a tuple wins: the
+        other probes are cancelled and close their ports on their own, so this method returns
+        as soon as there is a winner (or when every probe has failed).
+        
+        Returns the tuple of the winner or None.
+        """
+        
+        probes = list(probes)
+        if not probes:
+            return None
+        lock = threading.Lock()
+        cancelled = threading.Event() # set when a winner is found
+        finished = threading.Event() # set when there is a winner or all probes are done
+        winner = []
+        remaining = [len(probes)]
+        
+        def run(probe):
+            try:
+                found = probe(cancelled)
+                if found is not None:
+                    lock.acquire()
+                    try:
+                        if not winner:
+                            winner.append(found)
+                            cancelled.set()
+                            return
+                    finally:
+                        lock.release()
+                    found[2].close() # another probe won meanwhile
+            finally:
+                lock.acquire()
+                remaining[0] -= 1
+                if remaining[0] == 0 or winner:
+                    finished.set()
+                lock.release()
+        
+        for probe in probes:
+            aThread = threading.Thread(target=run, args=(probe,))
+            aThread.daemon = True
+            aThread.start()
+        finished.wait()
+        
+        if winner:
+            return winner[0]
+        return None
+        
+        
     def connectPortBySettings(self, portNumber, portSpeed):
         """
         Attempts to connect a specified port at a specified speed. If a connection was made then
@@ -171,14 +342,46 @@ class GPSConnection(object):
         self.portName = ''
         self.baudRate = self.baudRates[portSpeed]
 
+        startTime = time.time()
         self.try_connect_port_with_speed(self.port, self.baudRate)
+        self.timeToConnect = time.time() - startTime
         if self.connected: 
             self.portName = self.serialPort.portstr
+            self.remember_connection()
         else: 
             raise NoGPSConnected("Could not find a GPS Serial Connection sending NMEA messages on port: COM" +
                                    str(self.port+1) + " at speed " + str(self.baudRate) + "!")
         
         
+    def connect_replay(self, fileName, speed=1.0, loop=False):
+        """
+        Connects a recorded NMEA log (nmeareplay.NMEAReplayPort) instead of a serial port, so that
+        the whole pipeline can be driven without a receiver. speed is the replay speed factor
+        (1.0 = real time, 0 = as fast as possible).
+
+        These class variables are set:
+            self.connected = True
+            self.serialPort = the NMEAReplayPort
+            self.portName = 'replay:' + fileName
+        """
+
+        startTime = time.time()
+        try:
+            self.serialPort = NMEAReplayPort(fileName, speed, loop)
+        except IOError, e:
+            raise NoGPSConnected("Could not open the NMEA log " + fileName + ": " + str(e))
+        self.timeToConnect = time.time() - startTime
+        self.port = None # not a numbered port: nothing to save in the options
+        self.portName = self.serialPort.portstr
+        self.baudRate = 0
+        self.byId = ''
+        self.signature = ''
+        self.parser = NMEAStreamParser(self.datumEPSG)
+        self.epochs = []
+        self.readErrorCount = 0
+        self.connected = True
+
+
     def try_connect_port_with_speed(self, port, baudRate):
         """
         Method uses input port number and baud rate to attempt a connection. If a connection
@@ -190,26 +393,93 @@ class GPSConnection(object):
             self.serialPort = the serial.Serial object that is the connected port
             self.portName = the name of the connected serial port (i.e. COM1)            
         """
-        try:
-            self.serialPort = serial.Serial(port, baudRate, timeout= .25, parity=serial.PARITY_NONE)
-            self.serialPort.open()
+        
+        found = self.sweep_port(port, [baudRate])
+        if found is not None:
+            self.baudRate, self.serialPort, self.signature = found
+            self.connected = True
             
-            for i in range(10): # look for a NMEA message string from the serial port
-                aline = self.serialPort.readline()
-                if aline[:3] == '$GP':
-                    self.connected = True
-                    break # got a NMEA message stop reading messages
-            else: # didn't get a NMEA message try next baud rate
-                self.serialPort.close()
-                del(self.serialPort)
-                
+            
+    def open_port(self, port, baudRate):
+        """
+        Opens port at baudRate with the short timeout used while sniffing.
+        Returns the open serial.Serial object, or None if the port could not be opened.
+        """
+        
+        try:
+            return serial.Serial(port, baudRate, timeout= .05, parity=serial.PARITY_NONE)
         except serial.serialutil.SerialException, e:
-            # print 'Failed to connect on port ' + str(self.port) + ' at rate: '\
-            #    + str(self.baudRate) + ' ',e
-            pass # leave exception alone, move on to next baud rate
+            return None # leave exception alone, move on to next port
+        except: 
+            return None # some other exception in connecting
         
+        
+    def sweep_port(self, port, baudRates, cancelled=None, aPort=None):
+        """
+        Opens the port once and steps through baudRates changing the speed of the open port
+        in place (a termios/DCB reconfiguration instead of a close and reopen, which can reset
+        USB-serial adapters). The input is flushed after each change and the bytes that arrive
+        are sniffed (see sniffNMEA) until they can be classified. A port that stays silent for
+        a whole self.sniffWindow is abandoned without trying the other speeds.
+        
+        Returns (baudRate, open serial.Serial object, address of the first sentence) if NMEA
+        messages were found, otherwise the port is closed and None is returned.
+        
+        Input Parameters:
+        port = the port number or device name
+        baudRates = the speeds to try, in order
+        cancelled = optional threading.Event, checked between reads to abandon the probe
+        aPort = optional serial.Serial object already opened on port (see open_port)
+        """
+        
+        if aPort is None:
+            aPort = self.open_port(port, baudRates[0])
+        if aPort is None:
+            return None
+        
+        try:
+            for baudRate in baudRates:
+                if cancelled is not None and cancelled.isSet():
+                    break
+                if aPort.baudrate != baudRate:
+                    aPort.baudrate = baudRate
+                aPort.flushInput()
+                verdict = self.sniff_port(aPort, cancelled)
+                if verdict:
+                    aPort.timeout = .25
+                    return baudRate, aPort, verdict
+                if verdict is None:
+                    break # nothing at all was received, other speeds won't help
         except: 
-            pass # some other exception in connecting
+            pass # port went away while probing
+        aPort.close()
+        return None
+    
+    
+    def sniff_port(self, aPort, cancelled=None):
+        """
+        Reads whatever arrives on the open port for at most self.sniffWindow seconds and
+        returns as soon as sniffNMEA can classify it: the address of the first sentence
+        (e.g. 'GPRMC') for NMEA, False for garbage or unframed text, None if nothing was
+        received at all.
+        """
+        
+        data = ''
+        deadline = time.time() + self.sniffWindow
+        while time.time() < deadline:
+            if cancelled is not None and cancelled.isSet():
+                return False
+            chunk = aPort.read(max(aPort.inWaiting(), 1))
+            if chunk:
+                data += chunk
+                verdict = sniffNMEA(data)
+                if verdict:
+                    return NMEA_FRAME.search(data).group()[1:-1]
+                if verdict is not None:
+                    return verdict
+        if data:
+            return False
+        return None
 
 
     def getPosition(self):
@@ -217,112 +487,79 @@ class GPSConnection(object):
         Gets all of the data available from the GPS messages including the position and
         its quality, the satellites that are available and the course and speed.
         
-        Returns current position from GGA GPS message in the format: 'dd.ddddddd,N,ddd.ddddddd,W'
-        where N and W will indicate N or S of equator, W or E of prime meridian. The rest of the
-        information can be obtained via the class variables.
-        
-        stores class variables as follows:
-            self.hasFix = True or False = got an actual position
-            self.latitude = latitude (float)
-            self.latitudeNS = latitude N or S of equator
-            self.longitude = longitude (float)
-            self.longitudeEW = longitude E or W of PM
-            self.numSatellites = number of satellites used for fix
-            self.hdop = measure of horizontal accuracy
-            self.theDateTime = date & time of position
-            self.fixQuality = 0 = fix not available
-                            = 1 = GPS fix
-                            = 2 = Differential GPS fix
-            self.bearing = Track made good, degrees true
-            self.speed = Speed over ground (km/hr)
-            self.satelliteData = info on the satellites used for the position,
-                               = a list of tuples as follows:
-                               (satellite number, elevation in degrees, azimuth in degrees to true, SNR in dB)
-        """
-        
-        self.hasFix = False
-        hasBearing = False
-        hasSatellites = False
-        numSatellites = 0
+        The bytes waiting on the serial port are pushed through self.parser, which keeps
+        its state between calls; completed epochs are queued in self.epochs so that none
+        is lost when one read completes several of them. Returns the oldest completed
+        epoch as a GPSPosition, or an empty GPSPosition (hasFix False) if no epoch was
+        completed before the read timeout.
         
-        thePosition = GPSPosition()
+        the returned GPSPosition holds (see nmeaparser.GPSPosition):
+            hasFix = True or False = got an actual position
+            latitude = latitude (float, negative south of the equator)
+            longitude = longitude (float, negative west of the PM)
+            utcTime = UTC time of the position (seconds since 1970)
+            numSatellites = number of satellites used for fix
+            hdop = measure of horizontal accuracy
+            fixQuality = 0 = fix not available
+                       = 1 = GPS fix
+                       = 2 = Differential GPS fix
+            bearing = Track made good, degrees true
+            speed = Speed over ground (km/hr)
+            satellites = info on the satellites in view, a tuple of tuples as follows:
+                         (satellite number, elevation in degrees, azimuth in degrees to true, SNR in dB,
+                          constellation talker)
+        """
         
-        aline = ''
-        theIndex = 0
-        iSat = 0
-        for i in range(20): # look at 20 lines to acquire all of the data
-            try:
-                aline = self.serialPort.readline()
-            except Exception:
-                self.readErrorCount += 1
-                if self.readErrorCount > self.readErrorLimit:
-                    self.connected = False
-                    self.serialPort.close()
-                    raise NoGPSConnected("Lost connection to GPS!")
-                
-            if aline[:6] == '$GPGGA':
-                try:
-                    parts = aline.split(',')
-                    if parts[2] == '' or parts[4] == '': break # latitude or longitude is blank
-                    thePosition.hasFix = True
-                    thePosition.datumEPSG = self.datumEPSG
-                    thePosition.latitude = float(parts[2][:2]) + float(parts[2][2:])/60.0
-                    thePosition.latitudeNS = parts[3]
-                    thePosition.longitude = float(parts[4][:3]) + float(parts[4][3:])/60.0
-                    thePosition.longitudeEW = parts[5]
-                    thePosition.fixQuality = parts[6]
-                    thePosition.numSatellites = int(parts[7])
-                    if parts[8] != '': 
-                        thePosition.hdop = float(parts[8])
-                    atime = time.localtime()
-                    thePosition.theDateTime = str(atime[0]) + "-" + str(atime[1]) + "-" + str(atime[2]) + " " +\
-                        str(atime[3]) + ":" + str(atime[4]) + ":" + str(atime[5])
-                    #thePosition.timeUTC = parts[1][:2] + ':' + parts[1][2:4] + ':' + parts[1][4:]
-                    if hasBearing and hasSatellites: 
-                        break
-                except Exception, e:
-                    pass # $GPGGA message was corrupted, ignore and carry on
-                
-            elif aline[:6] == '$GPRMC':
-                try:
-                    # 1 Knot = 1.852 Kilometers per Hour from: http://www.calculateme.com/Speed/Knots/ToKilometersperHour.htm
-                    parts = aline.split(',')
-                    thePosition.bearing = float(parts[8])
-                    thePosition.speed = float(parts[7]) * 1.852
-                    hasBearing = True
-                    if self.hasFix and hasSatellites: 
-                        break
-                except Exception, e:
-                    thePosition.bearing = 0.0
-                    thePosition.speed = 0.0
-                    # $GPRMC message was corrupted, ignore and carry on
-                    
-            elif aline[:6] == '$GPGSV': # process Satellites in view message
-                try:
-                    parts = aline.split(',')
-                    numSatInMess = (len(parts) - 4)/4
-                    for iSat in range(numSatInMess):
-                        theIndex = 4 * iSat
-                        if iSat == numSatInMess - 1: # special processing for last satellite in message - remove checksum
-                            thePosition.satelliteData.append((parts[theIndex+4], parts[theIndex+5], parts[theIndex+6],\
-                                                   parts[theIndex+7].split('*')[0]))
-                        else:
-                            thePosition.satelliteData.append((parts[theIndex+4], parts[theIndex+5], parts[theIndex+6],\
-                                                   parts[theIndex+7]))
-                    if parts[1] == parts[2]: 
-                        hasSatellites = True # have processed last satellite message
-                    if thePosition.hasFix and hasBearing and hasSatellites: break
-                except Exception, e:
-                    pass # $GPGSV message was corrupted, ignore and carry on
-                
-            elif aline[:6] == '$PGRMM' and not self.datumSet: # process GARMIN proprietary message containing datum
-                try:
-                    self.datumSet = True
-                    parts = aline.split(',')
-                    thedatum = parts[1].split('*')[0]
-                    default = 4326
-                    self.datumEPSG = self.datums.get(thedatum,default)
-                except Exception, e:
-                    pass # $GPGSV message was corrupted, ignore and carry on
-                
-        return thePosition
+        if not self.epochs:
+            self.readChunk()
+        if self.epochs:
+            return self.epochs.pop(0)
+        return GPSPosition()
+
+
+    def readChunk(self):
+        """
+        Reads the bytes waiting on the port (waiting for the first one at most the port timeout,
+        not at all once select reported the port readable) and feeds them to self.parser; the
+        epochs they complete are queued in self.epochs. Raises NoGPSConnected after
+        self.readErrorLimit read errors.
+        """
+
+        try:
+            data = self.serialPort.read(max(self.serialPort.inWaiting(), 1))
+        except Exception:
+            data = ''
+            self.readErrorCount += 1
+            if self.readErrorCount > self.readErrorLimit:
+                self.connected = False
+                self.serialPort.close()
+                raise NoGPSConnected("Lost connection to GPS!")
+        if data:
+            self.epochs.extend(self.parser.feed(data))
+            self.datumSet = self.parser.datumSet
+            self.datumEPSG = self.parser.datumEPSG
+
+
+    def readPositions(self):
+        """
+        For event driven reading: call when select (or a QSocketNotifier) reports fileno()
+        readable. Reads the chunk that arrived and returns the positions it completed, oldest
+        first, without waiting for more.
+        """
+
+        self.readChunk()
+        epochs = self.epochs
+        self.epochs = []
+        return epochs
+
+
+    def fileno(self):
+        """Returns the file descriptor to wait on for input, None if the port has none (Windows, replay)"""
+
+        fileno = getattr(self.serialPort, 'fileno', None)
+        if fileno is None:
+            return None
+        try:
+            return fileno()
+        except Exception:
+            return None
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+
+""" GPS receiver simulator on a pseudo-terminal (POSIX only)
+    see class documentation below.
+"""
+
+
+import os
+import sys
+import tty
+import math
+import time
+import fcntl
+import errno
+import random
+import termios
+import argparse
+import threading
+
+from nmeaparser import nmeaChecksum
+
+
+# sentence types the simulator can emit
+SENTENCE_TYPES = ('GGA', 'RMC', 'GSA', 'GSV', 'GLL', 'VTG', 'ZDA')
+# satellites in view of each constellation: (prn, elevation, azimuth, snr)
+SKY = {'GP': [(1, 40, 83, 46), (2, 17, 308, 41), (12, 7, 344, 39), (14, 22, 228, 45),
+              (15, 55, 120, 42), (17, 33, 45, 40), (22, 12, 190, 38), (24, 65, 275, 47)],
+       'GL': [(65, 35, 60, 40), (66, 70, 310, 44), (72, 20, 150, 36), (81, 48, 220, 42)],
+       'GA': [(301, 52, 100, 43), (305, 25, 270, 39), (309, 61, 15, 45)],
+       'GB': [(201, 44, 130, 41), (206, 30, 240, 38)]}
+
+
+
+def frame(body):
+    """Returns body framed as a NMEA sentence: '$body*hh\\r\\n'"""
+
+    return '$%s*%02X\r\n' % (body, nmeaChecksum(body))
+
+
+def _nmeaAngle(value, degreeDigits):
+
+    value = abs(value)
+    degrees = int(value)
+    return '%0*d%07.4f' % (degreeDigits, degrees, (value - degrees) * 60.0)
+
+
+
+class GPSSimulator(threading.Thread):
+    """Synthetic NMEA receiver behind a pseudo-terminal
+
+    Creates a pty pair and writes the sentences of a receiver moving north-east at about 10 m/s
+    into the master side; self.device (the slave side, e.g. /dev/pts/5) opens with serial.Serial
+    like a real port, so GPSConnection's search, sweep and read paths run their real termios
+    code against it. Nothing is written before start().
+
+    The bytes are paced like a serial line at baudRate (10 bits per byte, 0 = unpaced): a
+    sentence is written when its last byte would have arrived. Epochs that do not fit in the
+    line are dropped, as receivers do when their output is set too slow. When emulateFraming is
+    True the speed the reader set on the port is compared with baudRate and, if they differ,
+    the bytes are replaced by garbage, which is what a UART receives at the wrong speed.
+
+    With probability corruption a sentence is damaged, either one of its characters is changed
+    (bad checksum) or it is cut short (lost bytes). disconnects is a script of (seconds after
+    start, seconds down) during which the receiver sends nothing; a duration of None hangs up
+    the pty for good, which readers see as an I/O error. The script is checked when an epoch
+    is due, so a hang up happens at the first epoch after its time (see hangupTime).
+
+    CLASS VARIABLES:
+    device = name of the slave side of the pty, to open as a serial port
+    baudRate = simulated line speed (0 = as fast as the pty takes the bytes)
+    rate = epochs per second
+    sentences = sentence types written each epoch, in order (see SENTENCE_TYPES)
+    talkers = constellations, e.g. ('GP', 'GL'); with more than one the position sentences
+              use the 'GN' talker and each constellation sends its own GSV and GSA
+    corruption = probability that a sentence is damaged
+    disconnects = list of (seconds after start, seconds down or None to hang up)
+    epochsSent, epochsDropped, sentencesSent, sentencesCorrupted, bytesSent, bytesLost =
+              counts since start (bytesLost were written with no reader to take them)
+    hangupTime = time the scripted hang up closed the pty, None before
+
+    METHODS:
+    epoch = returns the sentences of an epoch
+    stop = stops writing and closes the pty
+    """
+
+    def __init__(self, baudRate=4800, rate=1.0, sentences=('GGA', 'RMC', 'GSA', 'GSV'), talkers=('GP',),
+                 corruption=0.0, disconnects=(), emulateFraming=True, seed=None):
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+        for sentenceType in sentences:
+            if sentenceType not in SENTENCE_TYPES:
+                raise ValueError("Unknown sentence type: " + sentenceType)
+        self.baudRate = baudRate
+        self.rate = float(rate)
+        self.sentences = tuple(sentences)
+        self.talkers = tuple(talkers)
+        self.corruption = corruption
+        self.disconnects = sorted(disconnects)
+        self.emulateFraming = emulateFraming
+        self.random = random.Random(seed)
+        self.epochsSent = 0
+        self.epochsDropped = 0
+        self.sentencesSent = 0
+        self.sentencesCorrupted = 0
+        self.bytesSent = 0
+        self.bytesLost = 0
+
+        self.master, self._slave = os.openpty()
+        self.device = os.ttyname(self._slave)
+        # the simulator keeps the slave side open, so the pty survives readers closing it;
+        # raw and without echo, as serial.Serial configures it
+        tty.setraw(self._slave)
+        # a pty nobody reads fills up: drop the bytes instead of blocking, like a UART
+        fcntl.fcntl(self.master, fcntl.F_SETFL, fcntl.fcntl(self.master, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self._speed = getattr(termios, 'B%d' % baudRate, None) if baudRate else None
+        self._stopped = threading.Event()
+        self._closed = False
+        self.startTime = None
+        self.hangupTime = None
+
+
+    def epoch(self, i):
+        """Returns the list of sentences of epoch number i"""
+
+        t = i / self.rate
+        utcTime = 1262304000 + t # 2010-01-01
+        hh, mm, ss = time.gmtime(utcTime)[3:6]
+        utc = '%02d%02d%02d.%02d' % (hh, mm, ss, int(round((utcTime - int(utcTime)) * 100)) % 100)
+        date = time.strftime('%d%m%y', time.gmtime(utcTime))
+        lat = 45.5 + t * 0.00006
+        lon = -73.5 + t * 0.00009
+        latitude = '%s,%s' % (_nmeaAngle(lat, 2), 'N' if lat >= 0 else 'S')
+        longitude = '%s,%s' % (_nmeaAngle(lon, 3), 'E' if lon >= 0 else 'W')
+        talker = self.talkers[0] if len(self.talkers) == 1 else 'GN'
+        numSatellites = sum([len(SKY.get(aTalker, ())) for aTalker in self.talkers])
+
+        lines = []
+        for sentenceType in self.sentences:
+            if sentenceType == 'GGA':
+                lines.append(frame('%sGGA,%s,%s,%s,1,%02d,0.9,%.1f,M,-34.0,M,,' %
+                                   (talker, utc, latitude, longitude, min(numSatellites, 99),
+                                    100 + 5 * math.sin(t))))
+            elif sentenceType == 'RMC':
+                lines.append(frame('%sRMC,%s,A,%s,%s,19.4,45.0,%s,014.8,W' % (talker, utc, latitude, longitude, date)))
+            elif sentenceType == 'GLL':
+                lines.append(frame('%sGLL,%s,%s,%s,A' % (talker, latitude, longitude, utc)))
+            elif sentenceType == 'VTG':
+                lines.append(frame('%sVTG,45.0,T,59.8,M,19.4,N,35.9,K' % talker))
+            elif sentenceType == 'ZDA':
+                lines.append(frame('%sZDA,%s,%s,%s,20%s,00,00' % (talker, utc, date[0:2], date[2:4], date[4:6])))
+            elif sentenceType == 'GSA':
+                for aTalker in self.talkers:
+                    prns = [str(prn) for prn, elevation, azimuth, snr in SKY.get(aTalker, ())][:12]
+                    lines.append(frame('%sGSA,A,3,%s,1.8,0.9,1.5' % (talker, ','.join(prns + [''] * (12 - len(prns))))))
+            elif sentenceType == 'GSV':
+                for aTalker in self.talkers:
+                    sky = SKY.get(aTalker, ())
+                    count = (len(sky) + 3) // 4
+                    for n in range(count):
+                        satellites = ','.join(['%02d,%02d,%03d,%02d' % satellite for satellite in sky[n * 4:n * 4 + 4]])
+                        lines.append(frame('%sGSV,%d,%d,%02d,%s' % (aTalker, count, n + 1, len(sky), satellites)))
+        return lines
+
+
+    def corrupt(self, sentence):
+
+        self.sentencesCorrupted += 1
+        position = self.random.randrange(1, len(sentence) - 5)
+        if self.random.random() < 0.5:
+            return sentence[:position] + chr((ord(sentence[position]) + 1) & 0x7F) + sentence[position + 1:]
+        return sentence[:position] + sentence[self.random.randrange(position + 1, len(sentence)):]
+
+
+    def readerSpeed(self):
+        """Returns the termios speed the reader set on the slave side, None if it cannot be read"""
+
+        try:
+            return termios.tcgetattr(self.master)[4]
+        except termios.error:
+            return None
+
+
+    def write(self, data):
+
+        if self.emulateFraming and self._speed is not None:
+            speed = self.readerSpeed()
+            if speed is not None and speed != self._speed:
+                data = ''.join([chr(self.random.randrange(128, 256)) for c in data])
+        try:
+            written = os.write(self.master, data)
+        except OSError, e:
+            if e.errno not in (errno.EAGAIN, errno.EIO): # EIO: no reader has the slave side open
+                raise
+            written = 0
+        self.bytesSent += written
+        self.bytesLost += len(data) - written
+
+
+    def down(self, now):
+        """Returns the end of the scripted disconnect covering now (None = hang up), 0 if none"""
+
+        for at, duration in self.disconnects:
+            if now >= self.startTime + at:
+                if duration is None:
+                    return None
+                if now < self.startTime + at + duration:
+                    return self.startTime + at + duration
+        return 0
+
+
+    def run(self):
+
+        self.startTime = time.time()
+        bytesPerSecond = self.baudRate / 10.0
+        lineFree = self.startTime # time the simulated line has sent everything queued so far
+        i = 0
+        while not self._stopped.isSet():
+            due = self.startTime + i / self.rate
+            wait = due - time.time()
+            if wait > 0 and self._stopped.wait(wait):
+                break
+            now = time.time()
+            downUntil = self.down(now)
+            if downUntil is None:
+                self.hangupTime = now
+                break # hang up, run closes the pty
+            if downUntil:
+                i = int(math.ceil((downUntil - self.startTime) * self.rate))
+                continue
+            if now - due >= 1.0 / self.rate:
+                self.epochsDropped += 1 # the line was busy with older epochs for a whole epoch
+                i += 1
+                continue
+            for sentence in self.epoch(i):
+                if self.corruption and self.random.random() < self.corruption:
+                    sentence = self.corrupt(sentence)
+                if bytesPerSecond:
+                    lineFree = max(lineFree, now) + len(sentence) / bytesPerSecond
+                    wait = lineFree - time.time()
+                    if wait > 0 and self._stopped.wait(wait):
+                        break
+                self.write(sentence)
+                self.sentencesSent += 1
+            self.epochsSent += 1
+            i += 1
+        self.close()
+
+
+    def stop(self):
+
+        self._stopped.set()
+        if self.isAlive():
+            self.join()
+        else:
+            self.close()
+
+
+    def close(self):
+
+        if not self._closed:
+            self._closed = True
+            os.close(self.master)
+            os.close(self._slave)
+
+
+
+def main(argv):
+
+    parser = argparse.ArgumentParser(description="Simulates a NMEA GPS receiver on a pseudo-terminal")
+    parser.add_argument('--baud', type=int, default=4800, help="line speed, 0 = unpaced")
+    parser.add_argument('--rate', type=float, default=1.0, help="epochs per second")
+    parser.add_argument('--sentences', default='GGA,RMC,GSA,GSV', help="sentence types, comma separated")
+    parser.add_argument('--talkers', default='GP', help="constellations, comma separated (GP, GL, GA, GB)")
+    parser.add_argument('--corruption', type=float, default=0.0, help="probability of a damaged sentence")
+    parser.add_argument('--disconnect', action='append', default=[], metavar='AT:SECONDS',
+                        help="silence after AT seconds for SECONDS (no SECONDS = hang up), repeatable")
+    args = parser.parse_args(argv[1:])
+    disconnects = []
+    for item in args.disconnect:
+        at, sep, duration = item.partition(':')
+        disconnects.append((float(at), float(duration) if duration else None))
+
+    simulator = GPSSimulator(args.baud, args.rate, args.sentences.split(','), args.talkers.split(','),
+                             args.corruption, disconnects)
+    print 'GPS simulator on', simulator.device
+    simulator.start()
+    try:
+        while simulator.isAlive():
+            simulator.join(1.0)
+    except KeyboardInterrupt:
+        pass
+    simulator.stop()
+    print '%d epochs (%d dropped), %d sentences (%d corrupted), %d bytes (%d lost)' % \
+        (simulator.epochsSent, simulator.epochsDropped, simulator.sentencesSent, simulator.sentencesCorrupted,
+         simulator.bytesSent, simulator.bytesLost)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -82,6 +82,13 @@ class GPSTrackerOptions(QDialog, gpsTrackingOptionsDlg):
         # GPS Track Line Width
         self.sbxTrackWidth.setValue(self.trackerObject.trackLineWidth)
         self.cbxSaveGPSTrack.setChecked(self.trackerObject.saveInSHAPEFile)
+        self.cbxStreamGPSTrack.setChecked(self.trackerObject.streamToSHAPEFile)
+        self.cbxStreamGPSTrack.setEnabled(self.trackerObject.saveInSHAPEFile)
+        
+        # GeoPackage recording all of the sessions ('' = not recorded)
+        self.databaseFile = self.trackerObject.databaseFile
+        self.cbxRecordDatabase.setChecked(len(self.databaseFile) > 0)
+        self.cbxRecordDatabase.setToolTip(self.databaseFile)
 
         # load the combo box for the marker type
         self.cbxMarkerType.setIconSize(QSize(29,29))
@@ -102,6 +109,8 @@ class GPSTrackerOptions(QDialog, gpsTrackingOptionsDlg):
         QObject.connect(self.rbtTryAll, SIGNAL("clicked()"), self.setConnectionSettings)
         QObject.connect(self.rbtSetConnection, SIGNAL("clicked()"), self.setConnectionSettings)
         QObject.connect(self.cbxPortSpeed, SIGNAL("currentIndexChanged(int)"), self.getComboBoxChange)
+        QObject.connect(self.cbxSaveGPSTrack, SIGNAL("toggled(bool)"), self.cbxStreamGPSTrack.setEnabled)
+        QObject.connect(self.cbxRecordDatabase, SIGNAL("clicked(bool)"), self.getDatabaseFile)
 
 
     def colorClicked(self):
@@ -138,6 +147,25 @@ class GPSTrackerOptions(QDialog, gpsTrackingOptionsDlg):
             self.cbxPortSpeed.setCurrentIndex(self.trackerObject.serialPortSpeed)
 
 
+    def getDatabaseFile(self, checked):
+        """Asks for the GeoPackage file when recording is turned on, an existing track GeoPackage is
+           appended to"""
+        
+        if checked:
+            fileName = QFileDialog.getSaveFileName(self, "GeoPackage to record the GPS sessions in",
+                                                   self.databaseFile, "GeoPackage (*.gpkg)",
+                                                   options=QFileDialog.DontConfirmOverwrite)
+            if not fileName:
+                self.cbxRecordDatabase.setChecked(False)
+                return
+            if not fileName.lower().endswith('.gpkg'):
+                fileName += '.gpkg'
+            self.databaseFile = fileName
+        else:
+            self.databaseFile = ''
+        self.cbxRecordDatabase.setToolTip(self.databaseFile)
+
+
     def getComboBoxChange(self,theIndex):
         
         if self.sender() == self.cbxPortSpeed:
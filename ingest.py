@@ -0,0 +1,580 @@
+#!/usr/bin/env python
+
+""" NMEA ingest core: one select loop reading many receivers, without Qt
+    see class documentation below.
+"""
+
+
+import os
+import sys
+import time
+import heapq
+import errno
+import socket
+import select
+import argparse
+import threading
+
+import serial
+
+from gpsconnection import NoGPSConnected
+from nmeaparser import NMEAStreamParser
+from nmeareplay import NMEAReplayPort
+
+
+
+class IngestLoop(object):
+    """Reads NMEA sources with non-blocking reads in one select loop and publishes their positions
+
+    Sources (serial ports, TCP sockets, replayed logs) are added with addSource; each one has its
+    own stream parser. Every epoch a source completes is published to the subscribers, which are
+    called in the loop's thread as subscriber(source, positions) with the list of GPSPosition
+    objects read at once (fixes and epochs without a fix alike). A source that is lost is
+    removed and reported to the lost callbacks as lost(source, reason).
+
+    run() loops until stop(); runOnce() waits for one round of events, for callers that have
+    their own loop. A stop() made while run() is not looping is kept: the next run() returns at
+    once (clear stopRequested to start again regardless). The loop sleeps in select until a source is readable, a timer is due or
+    another thread calls stop() or callFromThread(), so it uses no CPU while the receivers are
+    silent. Subscribers and timers must return quickly: they run between reads.
+
+    CLASS VARIABLES:
+    sources = the sources being read
+    running = True while run() loops
+    stopRequested = True from stop() to the end of the next (or current) run()
+
+    METHODS:
+    addSource, removeSource = start and stop reading a source
+    subscribe, unsubscribe = add and remove a subscriber (and its lost callback)
+    callLater = calls a function after a delay, in the loop's thread; returns a timer to cancel
+    callFromThread = calls a function in the loop's thread as soon as possible (thread safe)
+    run, runOnce, stop = the loop itself
+    close = closes every source and the loop
+    """
+
+    def __init__(self):
+
+        self.sources = []
+        self.subscribers = []
+        self.lostCallbacks = []
+        self.running = False
+        self.stopRequested = False
+        self._timers = [] # heap of [time, sequence, function, args], function None when cancelled
+        self._sequence = 0
+        self._calls = [] # functions from other threads
+        self._callsLock = threading.Lock()
+        self._wakeRead, self._wakeWrite = os.pipe()
+
+
+    def addSource(self, source):
+
+        source.start(self) # may raise, the source is not added then
+        self.sources.append(source)
+        return source
+
+
+    def removeSource(self, source):
+
+        if source in self.sources:
+            self.sources.remove(source)
+        source.close()
+
+
+    def subscribe(self, subscriber, lost=None):
+
+        self.subscribers.append(subscriber)
+        if lost is not None:
+            self.lostCallbacks.append(lost)
+
+
+    def unsubscribe(self, subscriber, lost=None):
+
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        if lost in self.lostCallbacks:
+            self.lostCallbacks.remove(lost)
+
+
+    def publish(self, source, positions):
+
+        for subscriber in self.subscribers:
+            subscriber(source, positions)
+
+
+    def sourceLost(self, source, reason):
+
+        self.removeSource(source)
+        for lost in self.lostCallbacks:
+            lost(source, reason)
+
+
+    def callLater(self, delay, function, *args):
+
+        self._sequence += 1
+        timer = [time.time() + delay, self._sequence, function, args]
+        heapq.heappush(self._timers, timer)
+        return timer
+
+
+    def cancel(self, timer):
+
+        if timer is not None:
+            timer[2] = None
+
+
+    def callFromThread(self, function, *args):
+
+        self._callsLock.acquire()
+        self._calls.append((function, args))
+        self._callsLock.release()
+        os.write(self._wakeWrite, 'x')
+
+
+    def runOnce(self, timeout=None):
+        """Waits for one round of events (at most timeout seconds, None = until there is one) and handles them"""
+
+        timers = self._timers
+        while timers and timers[0][2] is None:
+            heapq.heappop(timers)
+        if timers:
+            untilTimer = max(timers[0][0] - time.time(), 0.0)
+            timeout = untilTimer if timeout is None else min(timeout, untilTimer)
+        readers = {self._wakeRead: None}
+        writers = {}
+        for source in self.sources:
+            fileno = source.fileno()
+            if fileno is not None:
+                if source.connecting:
+                    writers[fileno] = source
+                else:
+                    readers[fileno] = source
+        try:
+            readable, writable = select.select(readers.keys(), writers.keys(), [], timeout)[:2]
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                return
+            raise
+
+        for fileno in writable:
+            writers[fileno].onWritable()
+        for fileno in readable:
+            source = readers[fileno]
+            if source is None:
+                self.runCalls()
+            elif source in self.sources: # not removed by an earlier callback of this round
+                source.onReadable()
+
+        now = time.time()
+        while timers and timers[0][0] <= now:
+            when, sequence, function, args = heapq.heappop(timers)
+            if function is not None:
+                function(*args)
+
+
+    def runCalls(self):
+
+        os.read(self._wakeRead, 4096)
+        self._callsLock.acquire()
+        calls = self._calls
+        self._calls = []
+        self._callsLock.release()
+        for function, args in calls:
+            function(*args)
+
+
+    def run(self):
+
+        self.running = True
+        try:
+            while not self.stopRequested:
+                self.runOnce()
+        finally:
+            self.running = False
+            self.stopRequested = False # this stop is consumed
+
+
+    def stop(self):
+        """Makes run() return after the current round, or the next run() at once; can be called from any thread"""
+
+        self.stopRequested = True
+        os.write(self._wakeWrite, 'x')
+
+
+    def close(self):
+
+        for source in list(self.sources):
+            self.removeSource(source)
+        os.close(self._wakeRead)
+        os.close(self._wakeWrite)
+
+
+
+class NMEASource(object):
+    """Base class of the sources of an IngestLoop
+
+    Subclasses open their input in start(), return its file descriptor from fileno() (None for
+    sources driven by timers) and pass the bytes they read to feed(), which parses them and
+    publishes the positions. A source that cannot go on calls lost().
+
+    CLASS VARIABLES:
+    name = name of the source, e.g. the device or host:port
+    parser = the NMEAStreamParser of the source
+    loop = the IngestLoop reading the source, None before start()
+    connecting = True while the source waits for its connection to be writable (TCP)
+    bytesRead = bytes read so far
+    positionsRead = positions published so far
+    """
+
+    connecting = False
+
+    def __init__(self, name, datumEPSG=4326):
+
+        self.name = name
+        self.parser = NMEAStreamParser(datumEPSG)
+        self.loop = None
+        self.bytesRead = 0
+        self.positionsRead = 0
+
+
+    def __repr__(self):
+
+        return '%s(%r)' % (self.__class__.__name__, self.name)
+
+
+    def start(self, loop):
+
+        self.loop = loop
+
+
+    def fileno(self):
+
+        return None
+
+
+    def onReadable(self):
+
+        pass
+
+
+    def onWritable(self):
+
+        pass
+
+
+    def feed(self, data):
+
+        self.bytesRead += len(data)
+        positions = self.parser.feed(data)
+        if positions:
+            self.positionsRead += len(positions)
+            self.loop.publish(self, positions)
+
+
+    def lost(self, reason):
+
+        self.loop.sourceLost(self, reason)
+
+
+    def close(self):
+
+        pass
+
+
+
+class SerialSource(NMEASource):
+    """A serial port opened at a known speed (see GPSConnection for searching the receiver)"""
+
+    def __init__(self, port, baudRate=4800, datumEPSG=4326):
+
+        NMEASource.__init__(self, str(port), datumEPSG)
+        self.port = port
+        self.baudRate = baudRate
+        self.serialPort = None
+
+
+    def start(self, loop):
+
+        NMEASource.start(self, loop)
+        self.serialPort = serial.Serial(self.port, self.baudRate, timeout=0)
+        self.name = self.serialPort.portstr
+
+
+    def fileno(self):
+
+        return self.serialPort.fileno() if self.serialPort is not None else None
+
+
+    def onReadable(self):
+
+        try:
+            data = self.serialPort.read(max(self.serialPort.inWaiting(), 1))
+        except Exception, e:
+            self.lost(str(e))
+            return
+        if not data:
+            self.lost("no data from a readable port") # unplugged
+            return
+        self.feed(data)
+
+
+    def close(self):
+
+        if self.serialPort is not None:
+            self.serialPort.close()
+            self.serialPort = None
+
+
+
+class ConnectionSource(NMEASource):
+    """A GPSConnection that is already connected (after its port search), read without blocking"""
+
+    def __init__(self, session):
+
+        NMEASource.__init__(self, session.portName, session.datumEPSG)
+        self.session = session
+        self.parser = session.parser
+
+
+    def fileno(self):
+
+        return self.session.fileno()
+
+
+    def onReadable(self):
+
+        try:
+            positions = self.session.readPositions()
+        except NoGPSConnected, e:
+            self.lost(str(e))
+            return
+        if positions:
+            self.positionsRead += len(positions)
+            self.loop.publish(self, positions)
+
+
+
+class TCPSource(NMEASource):
+    """A NMEA stream served over TCP (a network receiver, ser2net, gpsd's raw port 2947 ...)
+
+    The connection is made without blocking the loop; when it fails or is closed by the server
+    it is tried again after reconnectDelay seconds (None = the source is lost instead).
+    """
+
+    def __init__(self, host, port, reconnectDelay=5.0, datumEPSG=4326):
+
+        NMEASource.__init__(self, '%s:%d' % (host, port), datumEPSG)
+        self.address = (host, port)
+        self.reconnectDelay = reconnectDelay
+        self.socket = None
+        self.connecting = False
+        self.connections = 0
+        self._retry = None
+
+
+    def start(self, loop):
+
+        NMEASource.start(self, loop)
+        self.connect()
+
+
+    def connect(self):
+
+        self._retry = None
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setblocking(False)
+        result = self.socket.connect_ex(self.address)
+        if result in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.connecting = True # done when the socket is writable
+        else:
+            self.disconnected(os.strerror(result))
+
+
+    def fileno(self):
+
+        return self.socket.fileno() if self.socket is not None else None
+
+
+    def onWritable(self):
+
+        result = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if result:
+            self.disconnected(os.strerror(result))
+            return
+        self.connecting = False
+        self.connections += 1
+
+
+    def onReadable(self):
+
+        try:
+            data = self.socket.recv(65536)
+        except socket.error, e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self.disconnected(str(e))
+            return
+        if not data:
+            self.disconnected("connection closed by the server")
+            return
+        self.feed(data)
+
+
+    def disconnected(self, reason):
+
+        self.closeSocket()
+        if self.reconnectDelay is None:
+            self.lost(reason)
+        else:
+            self._retry = self.loop.callLater(self.reconnectDelay, self.connect)
+
+
+    def closeSocket(self):
+
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        self.connecting = False
+
+
+    def close(self):
+
+        if self.loop is not None:
+            self.loop.cancel(self._retry)
+        self.closeSocket()
+
+
+
+class ReplaySource(NMEASource):
+    """A recorded NMEA log (see nmeareplay.NMEAReplayPort) released by the loop's timers
+
+    Paced logs are read when their next epoch is due; unpaced ones (speed 0) chunkSize bytes
+    at a time, so that they do not hold up the other sources. The source is lost at the end
+    of a log that does not loop.
+    """
+
+    def __init__(self, fileName, speed=1.0, loop=False, chunkSize=65536, datumEPSG=4326):
+
+        NMEASource.__init__(self, 'replay:' + fileName, datumEPSG)
+        self.replayPort = NMEAReplayPort(fileName, speed, loop, timeout=0)
+        self.chunkSize = chunkSize
+        self._timer = None
+
+
+    def start(self, loop):
+
+        NMEASource.start(self, loop)
+        self.replayPort.open()
+        self._timer = loop.callLater(0, self.release)
+
+
+    def release(self):
+
+        port = self.replayPort
+        waiting = port.inWaiting()
+        if waiting:
+            self.feed(port.read(min(waiting, self.chunkSize)))
+        if port.inWaiting():
+            self._timer = self.loop.callLater(0, self.release)
+            return
+        due = port.nextDue()
+        if due is None:
+            position = self.parser.flush() # the last epoch of the log
+            if position is not None:
+                self.positionsRead += 1
+                self.loop.publish(self, [position])
+            self._timer = None
+            self.lost("end of the log")
+        else:
+            self._timer = self.loop.callLater(max(due - time.time(), 0.0), self.release)
+
+
+    def close(self):
+
+        if self.loop is not None:
+            self.loop.cancel(self._timer)
+        self.replayPort.close()
+
+
+
+def parseSource(text, reconnectDelay=5.0):
+    """Returns the source described by a command line argument:
+    serial:DEVICE[:BAUD], tcp:HOST:PORT or replay:FILE[:SPEED]"""
+
+    kind, sep, rest = text.partition(':')
+    if kind == 'serial':
+        device, sep, baudRate = rest.rpartition(':')
+        if not device or not baudRate.isdigit():
+            device, baudRate = rest, '4800'
+        return SerialSource(device, int(baudRate))
+    if kind == 'tcp':
+        host, sep, port = rest.rpartition(':')
+        return TCPSource(host, int(port), reconnectDelay)
+    if kind == 'replay':
+        fileName, sep, speed = rest.rpartition(':')
+        try:
+            return ReplaySource(fileName, float(speed))
+        except ValueError:
+            return ReplaySource(rest)
+    raise ValueError("Unknown source %s: use serial:DEVICE[:BAUD], tcp:HOST:PORT or replay:FILE[:SPEED]" % text)
+
+
+
+def main(argv):
+    """Headless recorder: reads every source given and records the fixes in a GeoPackage"""
+
+    from acquisitionfilter import compileFilter
+    from trackdatabase import TrackDatabase
+    from trackstore import TrackStore
+
+    parser = argparse.ArgumentParser(description="Records NMEA receivers in a GeoPackage, without QGIS")
+    parser.add_argument('database', help="GeoPackage file (created if it does not exist)")
+    parser.add_argument('sources', nargs='+', help="serial:DEVICE[:BAUD], tcp:HOST:PORT or replay:FILE[:SPEED]")
+    parser.add_argument('--min-distance', type=float, default=0.0, help="metres between recorded fixes")
+    parser.add_argument('--min-interval', type=float, default=0.0, help="seconds between recorded fixes")
+    parser.add_argument('--max-hdop', type=float, default=0.0, help="worst HDOP recorded, 0 = any")
+    args = parser.parse_args(argv[1:])
+
+    database = TrackDatabase(args.database)
+    loop = IngestLoop()
+    sessions = {} # source -> (session id, acquisition filter, TrackStore)
+
+    def record(source, positions):
+        sessionId, acquisitionFilter, trackStore = sessions[source]
+        for aGPSPosition in positions:
+            if aGPSPosition.hasFix and acquisitionFilter.accept(aGPSPosition):
+                trackStore.append(aGPSPosition)
+                database.addFix(aGPSPosition, len(trackStore.tracks), sessionId)
+
+    def finishTrack(source):
+        # writes the line of the track of source, the way trackGps.finishStreamedTrack does
+        sessionId, acquisitionFilter, trackStore = sessions[source]
+        if trackStore.currentLength() > 0:
+            database.finishTrack(trackStore.tracks[-1], len(trackStore.tracks), sessionId)
+        trackStore.startTrack()
+        acquisitionFilter.reset()
+
+    def lost(source, reason):
+        print '%s lost: %s (%d positions)' % (source.name, reason, source.positionsRead)
+        finishTrack(source)
+        if not loop.sources:
+            loop.stop()
+
+    loop.subscribe(record, lost)
+    for text in args.sources:
+        source = parseSource(text)
+        sessions[source] = (database.startSession(source.name),
+                            compileFilter(args.min_distance, args.min_interval, args.max_hdop), TrackStore())
+        loop.addSource(source)
+        print 'recording', source.name
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+    for source in sessions:
+        finishTrack(source)
+    loop.close()
+    database.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+
+""" Incremental NMEA 0183 stream parser
+    see class documentation below.
+"""
+
+
+import time
+import struct
+import calendar
+import operator
+
+
+# the checksum is the XOR of the characters between '$' and '*'. The characters are XORed
+# 8 at a time as big-endian 64 bit words (one struct.unpack and one C level reduce per
+# sentence, no Python loop over the characters) and the 8 bytes of the result are folded.
+_WORD_FORMATS = dict([(n, '>%dQ' % n) for n in range(1, 129)])
+_HEX = ['%02X' % i for i in range(256)]
+
+
+def formatDateTime(utcTime):
+    """Returns the local 'YYYY-MM-DD hh:mm:ss' string of a UTC timestamp"""
+
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(utcTime))
+
+
+def nmeaChecksum(body):
+    """Returns the NMEA checksum (int) of the text between '$' and '*'"""
+
+    padded = body + '\0' * (-len(body) % 8)
+    words = len(padded) >> 3
+    if words == 0:
+        return 0
+    word = reduce(operator.xor, struct.unpack(_WORD_FORMATS.get(words) or '>%dQ' % words, padded))
+    word ^= word >> 32
+    word ^= word >> 16
+    word ^= word >> 8
+    return int(word & 0xFF)
+
+
+
+class GPSPosition(object):
+    """GPS Position Class
+
+    Bob.Bruce@pobox.com - www.hwps.ca
+
+    A fixed layout (__slots__, no per-instance __dict__) record of numbers, since every
+    accepted fix is kept in memory for the whole session.
+
+    CLASS VARIABLES:
+    datumEPSG = EPSG number of the datum (changed if a datum message is detected)
+    hasFix = indicator of whether a fix was found
+    latitude = latitude (float, degrees, negative south of the equator)
+    longitude = longitude (float, degrees, negative west of the PM)
+    utcTime = UTC time of the position (float, seconds since 1970-01-01)
+    numSatellites = number of satellites used for fix
+    hdop = Horizontal Dilution Of Precision
+    fixQuality = 0 = fix not available
+               = 1 = GPS fix
+               = 2 = Differential GPS fix (i.e. WAAS correction)
+    bearing = Track made good, degrees true
+    speed = Speed over ground (km/hr)
+    satellites = info on the satellites in view of all the constellations (shared by all the
+                 positions computed while the receiver reported the same satellite table),
+               = a tuple of tuples as follows:
+               (satellite number, elevation in degrees, azimuth in degrees to true, SNR in dB,
+                talker of the constellation: GP = GPS, GL = GLONASS, GA = Galileo, GB/BD = BeiDou, ...)
+
+    derived, read only:
+    latitudeNS = latitude N or S of equator
+    longitudeEW = longitude E or W of PM
+    theDateTime = local date & time of position ('YYYY-MM-DD hh:mm:ss')
+    satelliteData = same as satellites
+    """
+
+    __slots__ = ('datumEPSG', 'hasFix', 'latitude', 'longitude', 'utcTime', 'numSatellites',
+                 'hdop', 'fixQuality', 'bearing', 'speed', 'satellites')
+
+    def __init__(self):
+
+        self.datumEPSG = 4326
+        self.hasFix = False
+        self.latitude = 0.0
+        self.longitude = 0.0
+        self.utcTime = 0.0
+        self.numSatellites = 0
+        self.hdop = 0.0 # accuracy isn't always provided in the message - this is default
+        self.fixQuality = 0
+        self.bearing = 0.0 # course and speed come from the RMC message, which may be missing
+        self.speed = 0.0
+        self.satellites = ()
+
+
+    def getLatitudeNS(self):
+
+        return 'S' if self.latitude < 0.0 else 'N'
+
+    latitudeNS = property(getLatitudeNS)
+
+
+    def getLongitudeEW(self):
+
+        return 'W' if self.longitude < 0.0 else 'E'
+
+    longitudeEW = property(getLongitudeEW)
+
+
+    def getDateTime(self):
+
+        return formatDateTime(self.utcTime)
+
+    theDateTime = property(getDateTime)
+
+
+    def getSatelliteData(self):
+
+        return self.satellites
+
+    satelliteData = property(getSatelliteData)
+
+
+
+class NMEAStreamParser(object):
+    """Push-style NMEA 0183 parser - bytes go in with feed(), completed epochs
+    (GPSPosition objects) come out.
+
+    An epoch is complete when a sentence carrying a UTC time field (GGA, RMC)
+    reports a time different from the epoch being built, so the number of
+    sentences per epoch does not matter. Partial lines and the epoch under
+    construction are kept between calls, so nothing is dropped or read twice
+    when data arrives in arbitrary chunks.
+
+    Sentences are dispatched through self.handlers, a dictionary keyed on the
+    sentence type without its talker (e.g. 'GGA' for $GPGGA, $GNGGA, $GLGGA, ...)
+    or on the whole address for proprietary 'P' sentences (e.g. 'PGRMM'); each
+    handler receives the list of fields with the checksum removed. The GSV data
+    of all of the constellations goes into one satellite table per epoch.
+
+    The '*hh' checksum is verified before a sentence is dispatched; sentences
+    that fail it are dropped and counted in self.badSentences. Sentences without
+    a checksum are accepted unless self.requireChecksum is True.
+
+    CLASS VARIABLES:
+    datumEPSG = EPSG number of the datum (changed if a datum message is detected)
+    datumSet = indicates that a proprietary message stating the datum was found
+    sentenceCount = number of complete lines fed to the parser
+    badCount = number of lines dropped as corrupted
+    badSentences = sentence address -> number of corrupted sentences ('?' when the
+                   line does not even start with '$')
+    requireChecksum = drop sentences that carry no checksum
+    handlers = sentence type (or proprietary address) -> handler method
+
+    METHODS:
+    feed = parses a chunk of bytes, returns the list of epochs it completed
+    flush = completes and returns the epoch under construction (or None)
+    corruptionRate = fraction of the lines received that were corrupted
+    """
+
+    # currently only NAD83 and WGS84 LL datums are supported
+    datums = {'NAD83': 4269, 'WGS 84': 4326}
+
+    def __init__(self, datumEPSG=4326):
+
+        self.datumEPSG = datumEPSG
+        self.datumSet = False
+        self.sentenceCount = 0
+        self.badCount = 0
+        self.badSentences = {}
+        self.requireChecksum = False
+
+        self.handlers = {'GGA': self.parseGGA,
+                         'RMC': self.parseRMC,
+                         'GSV': self.parseGSV,
+                         'PGRMM': self.parsePGRMM}
+
+        self._pending = '' # incomplete line left over from the last feed
+        self._completed = []
+        self._epochTime = None
+        self._position = self.newPosition()
+        self._dayStart = None # UTC timestamp of 00:00 of the current date (RMC date field)
+        self._secondsOfDay = 0.0 # time field of the current epoch in seconds
+        self._gsvBuilding = {} # talker -> satellites of the GSV cycle being received
+        self._gsvComplete = {} # talker -> satellites of the last complete GSV cycle
+        self._gsvChanged = False
+        self.satellites = () # last complete satellite table, shared by the positions
+
+
+    def newPosition(self):
+
+        thePosition = GPSPosition()
+        thePosition.datumEPSG = self.datumEPSG
+        return thePosition
+
+
+    def feed(self, data):
+        """
+        Parses a chunk of raw bytes from the receiver. Returns the list of the
+        epochs (GPSPosition objects) completed by this chunk, possibly empty.
+        """
+
+        lines = (self._pending + data).split('\n')
+        self._pending = lines.pop()
+        handlers = self.handlers
+        for aline in lines:
+            if aline[:1] != '$':
+                if aline.strip():
+                    self.sentenceCount += 1
+                    self.badSentence('?') # noise or a line cut by a reconnection
+                continue
+            self.sentenceCount += 1
+            star = aline.rfind('*')
+            if star < 0:
+                if self.requireChecksum:
+                    self.badSentence(aline[1:aline.find(',')])
+                    continue
+                body = aline[1:].rstrip('\r')
+            else:
+                body = aline[1:star]
+                checksum = _HEX[nmeaChecksum(body)]
+                if aline[star+1:star+3] != checksum and aline[star+1:star+3].upper() != checksum:
+                    self.badSentence(body[:body.find(',')])
+                    continue
+            parts = body.split(',')
+            if body[:1] == 'P':
+                handler = handlers.get(parts[0]) # proprietary, the address has no talker
+            else:
+                handler = handlers.get(parts[0][2:])
+            if handler is not None:
+                try:
+                    handler(parts)
+                except (ValueError, IndexError):
+                    pass # message was corrupted, ignore and carry on
+
+        completed = self._completed
+        self._completed = []
+        return completed
+
+
+    def badSentence(self, address):
+
+        self.badCount += 1
+        self.badSentences[address] = self.badSentences.get(address, 0) + 1
+
+
+    def corruptionRate(self):
+
+        if self.sentenceCount == 0:
+            return 0.0
+        return self.badCount / float(self.sentenceCount)
+
+
+    def flush(self):
+        """
+        Completes the epoch under construction and returns it, or None if no
+        sentence was received for it.
+        """
+
+        if self._epochTime is None:
+            return None
+        thePosition = self.completePosition()
+        self._epochTime = None
+        self._position = self.newPosition()
+        return thePosition
+
+
+    def completePosition(self):
+        """Attaches the satellite table to the position being built and returns it"""
+
+        if self._gsvChanged:
+            self._gsvChanged = False
+            satellites = []
+            for talker in sorted(self._gsvComplete):
+                satellites.extend(self._gsvComplete[talker])
+            satellites = tuple(satellites)
+            if satellites != self.satellites: # else keep sharing the same table
+                self.satellites = satellites
+        self._position.satellites = self.satellites
+        return self._position
+
+
+    def epochFor(self, utc):
+        """
+        Returns the position being built for the epoch with time utc. A
+        different time completes the current epoch and starts a new one.
+        """
+
+        if utc and utc != self._epochTime:
+            if self._epochTime is not None:
+                self._completed.append(self.completePosition())
+                self._position = self.newPosition()
+            self._epochTime = utc
+            secondsOfDay = int(utc[0:2]) * 3600 + int(utc[2:4]) * 60 + float(utc[4:])
+            if self._dayStart is None:
+                self._dayStart = calendar.timegm(time.gmtime()[:3] + (0, 0, 0))
+            elif secondsOfDay < self._secondsOfDay - 43200:
+                self._dayStart += 86400 # midnight passed before a RMC date could tell
+            self._secondsOfDay = secondsOfDay
+            self._position.utcTime = self._dayStart + secondsOfDay
+        return self._position
+
+
+    def parseGGA(self, parts):
+
+        thePosition = self.epochFor(parts[1])
+        if parts[2] == '' or parts[4] == '':
+            return # latitude or longitude is blank
+        latitude = float(parts[2][:2]) + float(parts[2][2:])/60.0
+        longitude = float(parts[4][:3]) + float(parts[4][3:])/60.0
+        thePosition.latitude = -latitude if parts[3] == 'S' else latitude
+        thePosition.longitude = -longitude if parts[5] == 'W' else longitude
+        thePosition.fixQuality = int(parts[6])
+        thePosition.numSatellites = int(parts[7])
+        if parts[8] != '':
+            thePosition.hdop = float(parts[8])
+        thePosition.datumEPSG = self.datumEPSG
+        thePosition.hasFix = True
+
+
+    def parseRMC(self, parts):
+
+        # 1 Knot = 1.852 Kilometers per Hour from: http://www.calculateme.com/Speed/Knots/ToKilometersperHour.htm
+        thePosition = self.epochFor(parts[1])
+        date = parts[9]
+        if len(date) == 6 and self._epochTime == parts[1]:
+            year = int(date[4:6])
+            year += 2000 if year < 80 else 1900 # GPS time starts in 1980
+            dayStart = calendar.timegm((year, int(date[2:4]), int(date[0:2]), 0, 0, 0))
+            if dayStart != self._dayStart:
+                self._dayStart = dayStart
+                thePosition.utcTime = dayStart + self._secondsOfDay
+        if parts[7] != '':
+            thePosition.speed = float(parts[7]) * 1.852
+        if parts[8] != '':
+            thePosition.bearing = float(parts[8])
+
+
+    def parseGSV(self, parts):
+
+        # a GSV cycle is messages 1..n of the same talker, the table of a constellation is
+        # replaced when its last message arrives.
+        # NMEA 4.10 adds a signal id after the last satellite, it never forms a full group of 4
+        talker = parts[0][:2]
+        if parts[2] == '1':
+            self._gsvBuilding[talker] = []
+        satelliteData = self._gsvBuilding.get(talker)
+        if satelliteData is None:
+            return # joined in the middle of a cycle
+        for theIndex in range(4, len(parts) - 3, 4):
+            satelliteData.append(tuple(parts[theIndex:theIndex+4]) + (talker,))
+        if parts[1] == parts[2]:
+            self._gsvComplete[talker] = satelliteData
+            del self._gsvBuilding[talker]
+            self._gsvChanged = True
+
+
+    def parsePGRMM(self, parts):
+        # GARMIN proprietary message containing datum
+
+        if not self.datumSet:
+            self.datumSet = True
+            self.datumEPSG = self.datums.get(parts[1], self.datumEPSG)
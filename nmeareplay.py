@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+""" Replay of a recorded NMEA log in place of a serial port
+    see class documentation below.
+"""
+
+
+import time
+
+
+# sentence types whose field 1 is the UTC time of the epoch
+TIMED_SENTENCES = ('GGA', 'RMC', 'GLL', 'GNS', 'ZDA')
+
+
+
+def splitEpochs(data):
+    """
+    Splits NMEA data into epochs: returns a list of (seconds since the first epoch, bytes). An
+    epoch starts with the first sentence carrying a UTC time different from the previous one;
+    times are unwrapped across midnight. Data before the first timed sentence belongs to the
+    first epoch.
+    """
+
+    epochs = []
+    chunk = []
+    epochTime = None
+    offset = 0.0
+    lastSeconds = None
+    for line in data.splitlines(True):
+        if line[:1] == '$' and line[3:6] in TIMED_SENTENCES:
+            fields = line.split(',', 2)
+            utc = fields[1] if len(fields) > 1 else ''
+            if len(utc) >= 6 and utc != epochTime:
+                try:
+                    seconds = int(utc[0:2]) * 3600 + int(utc[2:4]) * 60 + float(utc[4:])
+                except ValueError:
+                    seconds = None
+                if seconds is not None:
+                    if lastSeconds is not None:
+                        delta = seconds - lastSeconds
+                        if delta < -43200:
+                            delta += 86400 # crossed midnight
+                        if chunk:
+                            epochs.append((offset, ''.join(chunk)))
+                            chunk = []
+                        offset += max(delta, 0.0)
+                    lastSeconds = seconds
+                    epochTime = utc
+        chunk.append(line)
+    if chunk:
+        epochs.append((offset, ''.join(chunk)))
+    return epochs
+
+
+
+class NMEAReplayPort(object):
+    """A recorded NMEA log that reads like a serial.Serial
+
+    Implements the part of the serial.Serial interface that GPSConnection uses (read,
+    inWaiting, readline, flushInput, open, close, isOpen, portstr, baudrate, timeout), so it
+    can be set as GPSConnection.serialPort (see GPSConnection.connect_replay) and drive the
+    whole pipeline without a receiver.
+
+    The epochs of the log are released at the times they were recorded divided by speed:
+    speed = 1.0 replays in real time, 10.0 ten times faster (a 1 Hz log then arrives at 10 Hz),
+    and speed = 0 (or None) makes all of the log available at once (as fast as the reader can
+    go). Like a serial port with a timeout, read() waits at most timeout seconds for data.
+
+    CLASS VARIABLES:
+    fileName = name of the log
+    speed = replay speed factor, 0 = as fast as possible
+    loop = start again at the beginning of the log when it ends
+    timeout = longest wait (s) of a read
+    epochs = list of (seconds from the start of the log, bytes)
+    epochsReleased = number of epochs made available so far (all loops)
+    """
+
+    def __init__(self, fileName=None, speed=1.0, loop=False, timeout=.25, data=None):
+
+        if data is None:
+            data = open(fileName, 'rb').read()
+        self.fileName = fileName or '<replay>'
+        self.portstr = 'replay:' + self.fileName
+        self.baudrate = 0
+        self.timeout = timeout
+        self.speed = speed or 0
+        self.loop = loop
+        self.epochs = splitEpochs(data)
+        self.duration = self.epochs[-1][0] + 1.0 if self.epochs else 0.0 # one more epoch before looping
+        self.epochsReleased = 0
+        self._buffer = ''
+        self._isOpen = False
+        self.open()
+
+
+    def open(self):
+
+        self._isOpen = True
+        self._next = 0 # index of the next epoch to release
+        self._lapStart = time.time() # time.time() of the start of the log in this lap
+        self._oldestDue = None # time the oldest epoch in the read buffer was due
+
+
+    def isOpen(self):
+
+        return self._isOpen
+
+
+    def close(self):
+
+        self._isOpen = False
+        self._buffer = ''
+
+
+    def release(self):
+        """Moves the epochs that are due into the read buffer"""
+
+        epochs = self.epochs
+        if not epochs:
+            return
+        if not self.speed:
+            # as fast as possible: the rest of the log (or one more lap) is available at once
+            if self._next < len(epochs) or (self.loop and not self._buffer):
+                self._buffer += ''.join([chunk for offset, chunk in epochs[self._next:] or epochs])
+                self.epochsReleased += len(epochs) - self._next if self._next < len(epochs) else len(epochs)
+                self._next = len(epochs)
+            return
+        now = time.time()
+        while True:
+            if self._next >= len(epochs):
+                if not self.loop:
+                    return
+                self._next = 0
+                self._lapStart += self.duration / self.speed
+            due = self._lapStart + epochs[self._next][0] / self.speed
+            if due > now:
+                return
+            if not self._buffer:
+                self._oldestDue = due
+            self._buffer += epochs[self._next][1]
+            self._next += 1
+            self.epochsReleased += 1
+
+
+    def nextDue(self):
+        """Returns the time.time() at which the next epoch is due, None at the end of the log"""
+
+        if not self.speed or not self.epochs:
+            return None
+        if self._next >= len(self.epochs):
+            if not self.loop:
+                return None
+            return self._lapStart + (self.duration + self.epochs[0][0]) / self.speed
+        return self._lapStart + self.epochs[self._next][0] / self.speed
+
+
+    def lag(self):
+        """Seconds the oldest unread data has been waiting (0 when the reader keeps up)"""
+
+        if not self._buffer or self._oldestDue is None:
+            return 0.0
+        return max(time.time() - self._oldestDue, 0.0)
+
+
+    def inWaiting(self):
+
+        if not self._isOpen:
+            raise ValueError("Attempting to use a port that is not open")
+        self.release()
+        return len(self._buffer)
+
+
+    def read(self, size=1):
+
+        if not self._isOpen:
+            raise ValueError("Attempting to use a port that is not open")
+        self.release()
+        if not self._buffer:
+            # wait for the next epoch like a serial port, but no longer than the timeout
+            due = self.nextDue()
+            wait = self.timeout if due is None else min(due - time.time(), self.timeout)
+            if wait > 0:
+                time.sleep(wait)
+            self.release()
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        if self._buffer:
+            self._oldestDue = time.time() if self._oldestDue is None else self._oldestDue
+        else:
+            self._oldestDue = None
+        return data
+
+
+    def readline(self, size=None, eol='\n'):
+
+        line = ''
+        while not line.endswith(eol):
+            data = self.read(1)
+            if not data:
+                break
+            line += data
+        return line
+
+
+    def flushInput(self):
+
+        self.release()
+        self._buffer = ''
+        self._oldestDue = None
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+""" Serial device discovery for the GPS connection search
+    see function documentation below.
+"""
+
+
+import os
+import re
+import sys
+import glob
+
+
+# USB vendor/product ids of the USB-serial bridges and receivers usually found in GPS units,
+# a product id of None matches every product of the vendor
+GPS_USB_IDS = [('1546', None),   # u-blox
+               ('091e', None),   # Garmin
+               ('067b', '2303'), # Prolific PL2303 (BU-353 and most GPS mice)
+               ('10c4', 'ea60'), # Silicon Labs CP210x
+               ('0403', '6001'), # FTDI FT232
+               ('0403', '6015'), # FTDI FT-X
+               ('1a86', '7523')] # WCH CH340
+
+
+
+class CandidatePort(object):
+    """A serial device that may have a GPS receiver attached
+
+    CLASS VARIABLES:
+    device = device name to open (e.g. /dev/ttyUSB0 or COM3)
+    byId = stable /dev/serial/by-id name of the device, '' if there is none
+    vid = USB vendor id (4 hex digits) or '' if unknown
+    pid = USB product id (4 hex digits) or ''
+    usb = True if the device is a USB-serial (or USB CDC) device
+    rank = 0 = known GPS USB vendor/product
+         = 1 = the device that connected last time
+         = 2 = other USB-serial device
+         = 3 = anything else (on-board UART, Bluetooth, ...)
+    """
+
+    def __init__(self, device, byId='', vid='', pid='', usb=False):
+
+        self.device = device
+        self.byId = byId
+        self.vid = vid
+        self.pid = pid
+        self.usb = usb or bool(vid)
+        self.rank = 3
+
+
+    def __repr__(self):
+
+        return 'CandidatePort(%r, byId=%r, vid=%r, pid=%r, rank=%d)' % (self.device, self.byId, self.vid,
+                                                                       self.pid, self.rank)
+
+
+
+def _readSysfs(path):
+
+    try:
+        return open(path).read().strip()
+    except (IOError, OSError):
+        return ''
+
+
+def _usbIds(sysDevice):
+    """Walks up from a tty's sysfs device directory to the USB device holding idVendor/idProduct"""
+
+    path = os.path.realpath(sysDevice)
+    for i in range(4):
+        vid = _readSysfs(os.path.join(path, 'idVendor'))
+        if vid:
+            return vid.lower(), _readSysfs(os.path.join(path, 'idProduct')).lower()
+        path = os.path.dirname(path)
+    return '', ''
+
+
+def _linuxCandidates():
+
+    byIds = {}
+    for link in glob.glob('/dev/serial/by-id/*'):
+        byIds[os.path.realpath(link)] = link
+
+    candidates = []
+    for device in sorted(glob.glob('/dev/ttyUSB*') + glob.glob('/dev/ttyACM*') +
+                         glob.glob('/dev/rfcomm*') + glob.glob('/dev/ttyS*')):
+        name = os.path.basename(device)
+        sysDevice = '/sys/class/tty/%s/device' % name
+        if not os.path.exists(sysDevice):
+            continue # no hardware behind the device node
+        if name.startswith('ttyS'):
+            # the kernel creates ttyS0..ttyS31 whether or not there is a UART behind them,
+            # the placeholders are the ones left on the 'platform' bus
+            if os.path.basename(os.path.realpath(os.path.join(sysDevice, 'subsystem'))) == 'platform':
+                continue
+        vid, pid = _usbIds(sysDevice)
+        candidates.append(CandidatePort(device, byIds.get(device, ''), vid, pid))
+    return candidates
+
+
+def _windowsCandidates():
+
+    import _winreg
+    candidates = []
+    try:
+        key = _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE, 'HARDWARE\\DEVICEMAP\\SERIALCOMM')
+    except WindowsError:
+        return candidates
+    i = 0
+    while True:
+        try:
+            name, value, valueType = _winreg.EnumValue(key, i)
+        except WindowsError:
+            break
+        # on-board UARTs register as \Device\Serialx, USB-serial drivers as \Device\VCPx,
+        # \Device\ProlificSerialx, \Device\Silabserx, \Device\USBSERxxx, ...
+        candidates.append(CandidatePort(str(value), usb=not re.match(r'\\Device\\Serial\d+$', name)))
+        i += 1
+    return candidates
+
+
+def candidatePorts(lastDevice=None):
+    """
+    Lists the serial devices that really exist on this machine, ranked so that the most likely
+    GPS receivers come first: known GPS USB vendor/product ids, then the device that connected
+    last time (lastDevice, a device or by-id name), then the other USB-serial devices, then the
+    rest. Returns a list of CandidatePort objects, or None when the platform cannot be enumerated
+    and the caller has to fall back to numbered ports.
+    """
+
+    if sys.platform.lower()[:5] == 'linux':
+        candidates = _linuxCandidates()
+    elif os.name == 'nt':
+        candidates = _windowsCandidates()
+    else:
+        return None
+
+    lastReal = lastDevice and os.path.realpath(lastDevice)
+    if lastDevice and os.path.exists(lastDevice) and \
+            lastReal not in [os.path.realpath(candidate.device) for candidate in candidates]:
+        candidates.append(CandidatePort(lastDevice)) # e.g. a device node that is not a real tty
+    for candidate in candidates:
+        if (candidate.vid, candidate.pid) in GPS_USB_IDS or (candidate.vid, None) in GPS_USB_IDS:
+            candidate.rank = 0
+        elif lastDevice and (lastDevice == candidate.byId or lastReal == os.path.realpath(candidate.device)):
+            candidate.rank = 1
+        elif candidate.usb:
+            candidate.rank = 2
+    candidates.sort(key=lambda candidate: candidate.rank) # stable, keeps name order within a rank
+    return candidates
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+""" Batches of fixes sent from the reading thread to the GUI thread
+    see class documentation below.
+"""
+
+
+import time
+
+
+
+class PositionBatch(object):
+    """The fixes read since the last batch, delivered to the GUI thread as one signal
+
+    CLASS VARIABLES:
+    positions = tuple of nmeaparser.GPSPosition, oldest first
+    readTime = time.time() of the first fix of the batch, to measure how late the GUI is
+    """
+
+    __slots__ = ('positions', 'readTime')
+
+    def __init__(self, positions, readTime=None):
+
+        self.positions = tuple(positions)
+        self.readTime = time.time() if readTime is None else readTime
+
+
+    def __len__(self):
+
+        return len(self.positions)
+
+
+    def __iter__(self):
+
+        return iter(self.positions)
+
+
+    def latest(self):
+
+        return self.positions[-1]
+
+
+
+class PositionCoalescer(object):
+    """Collects fixes and releases them as PositionBatch objects at most uiRate times a second
+
+    A receiver sending 10-100 fixes a second would otherwise queue one cross thread event per
+    fix, each one redrawing the dock and the map. The reading thread add()s every fix and
+    emits what due() returns; whatever is pending when reading stops is taken by flush().
+
+    CLASS VARIABLES:
+    uiRate = batches per second at most (0 = one batch per fix)
+    batches = number of batches released so far
+    fixes = number of fixes released so far
+
+    METHODS:
+    add = queues a fix
+    due = returns the pending fixes as a batch if the last one was released 1/uiRate s ago
+    timeUntilDue = seconds before due() releases the pending fixes, None if there are none
+    flush = returns the pending fixes as a batch, None if there are none
+    """
+
+    def __init__(self, uiRate=20.0):
+
+        self.uiRate = uiRate
+        self.interval = 1.0 / uiRate if uiRate > 0 else 0.0
+        self.batches = 0
+        self.fixes = 0
+        self._pending = []
+        self._firstTime = None
+        self._lastRelease = 0.0
+
+
+    def add(self, aGPSPosition):
+
+        if not self._pending:
+            self._firstTime = time.time()
+        self._pending.append(aGPSPosition)
+
+
+    def due(self, now=None):
+
+        if not self._pending:
+            return None
+        if now is None:
+            now = time.time()
+        if now - self._lastRelease < self.interval:
+            return None
+        return self.flush()
+
+
+    def timeUntilDue(self, now=None):
+
+        if not self._pending:
+            return None
+        if now is None:
+            now = time.time()
+        return max(self._lastRelease + self.interval - now, 0.0)
+
+
+    def flush(self):
+
+        if not self._pending:
+            return None
+        batch = PositionBatch(self._pending, self._firstTime)
+        self._pending = []
+        self._lastRelease = time.time()
+        self.batches += 1
+        self.fixes += len(batch)
+        return batch
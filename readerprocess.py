@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+""" Receiver read, parsed and filtered in a separate process
+    see documentation of readerMain and startReader below.
+"""
+
+
+import os
+import sys
+import struct
+import select
+import cPickle
+import subprocess
+import _multiprocessing
+
+if sys.platform == 'win32':
+    import msvcrt
+
+from gpsconnection import GPSConnection, NoGPSConnected
+from nmeaparser import GPSPosition
+from acquisitionfilter import compileFilter
+from positionbatch import PositionBatch, PositionCoalescer
+from sharedfix import FixPublisher
+
+
+# one accepted fix: longitude, latitude, utcTime, hdop, speed, bearing, numSatellites, fixQuality
+# (the fields of trackstore.TrackColumns, 38 bytes)
+FIX_RECORD = struct.Struct('<dddfffBB')
+# before the fixes of a batch: readTime, sentences parsed, corrupted sentences, datum EPSG
+BATCH_HEADER = struct.Struct('<dIII')
+
+# first byte of the messages from the worker
+FIXES = 'F' # BATCH_HEADER + FIX_RECORD * number of fixes
+CONNECTED = 'C' # pickled dict of the connection (see connectionInfo)
+FAILED = 'E' # the message of the NoGPSConnected that ended the worker
+BAD_SENTENCES = 'B' # pickled parser.badSentences, sent when the count of corrupted sentences changes
+PUBLISH_FAILED = 'W' # why the fix file (settings publishFile) cannot be opened
+
+# first byte of the messages to the worker
+STOP = 'S'
+THRESHOLDS = 'T' # pickled arguments of acquisitionfilter.compileFilter
+NEW_TRACK = 'N' # the next fix starts a new track: the acquisition filter forgets the last one
+
+
+def packBatch(batch, parser, datumEPSG):
+    """Returns the FIXES message of a PositionBatch"""
+
+    pack = FIX_RECORD.pack
+    records = [pack(p.longitude, p.latitude, p.utcTime, p.hdop, p.speed, p.bearing, p.numSatellites,
+                    p.fixQuality) for p in batch.positions]
+    return FIXES + BATCH_HEADER.pack(batch.readTime, parser.sentenceCount, parser.badCount, datumEPSG) + \
+        ''.join(records)
+
+
+def unpackBatch(message):
+    """Returns (PositionBatch, sentences parsed, corrupted sentences, datum EPSG) of a FIXES message"""
+
+    readTime, sentenceCount, badCount, datumEPSG = BATCH_HEADER.unpack_from(message, 1)
+    positions = []
+    size = FIX_RECORD.size
+    unpack = FIX_RECORD.unpack_from
+    for offset in xrange(1 + BATCH_HEADER.size, len(message), size):
+        p = GPSPosition()
+        p.longitude, p.latitude, p.utcTime, p.hdop, p.speed, p.bearing, p.numSatellites, p.fixQuality = \
+            unpack(message, offset)
+        p.hasFix = True
+        p.datumEPSG = datumEPSG
+        positions.append(p)
+    return PositionBatch(positions, readTime), sentenceCount, badCount, datumEPSG
+
+
+def connectionInfo(session):
+    """The state of a connected GPSConnection that the GUI shows and remembers"""
+
+    return {'portName': session.portName, 'port': session.port, 'baudRate': session.baudRate,
+            'timeToConnect': session.timeToConnect, 'datumEPSG': session.datumEPSG,
+            'cache': session.cache.toStrings()}
+
+
+def readerMain(commands, fixes, settings):
+    """Worker process: connects to the receiver, reads, parses and filters it and sends the
+    accepted fixes, at most uiRate batches a second, as FIXES messages on the fixes pipe.
+
+    settings is a dict: replayFile, replaySpeed, tryAllPorts, portNumber, portSpeed (see
+    ReadGpsd), lastDevice, cache (ConnectionCache.toStrings), thresholds (arguments of
+    compileFilter), uiRate, eventDriven and publishFile (sharedfix file where every fix is
+    published as soon as it is parsed, before the filter; '' = none). The first message is
+    CONNECTED or FAILED. The worker reads until it gets STOP on the commands pipe or loses the
+    receiver (FAILED), then closes the port and returns. THRESHOLDS changes the acquisition
+    filter, same track; NEW_TRACK resets it, so that the first fix of the new track is kept.
+    """
+
+    session = GPSConnection()
+    session.lastDevice = settings['lastDevice']
+    session.cache.fromStrings(settings['cache'])
+    try:
+        if settings['replayFile']:
+            session.connect_replay(settings['replayFile'], settings['replaySpeed'])
+        elif settings['tryAllPorts']:
+            session.search_available_port()
+        else:
+            session.connectPortBySettings(settings['portNumber'], settings['portSpeed'])
+    except NoGPSConnected, e:
+        fixes.send_bytes(FAILED + str(e))
+        return
+    fixes.send_bytes(CONNECTED + cPickle.dumps(connectionInfo(session), 2))
+
+    publisher = None
+    if settings['publishFile']:
+        try:
+            publisher = FixPublisher(settings['publishFile'])
+        except EnvironmentError, e:
+            fixes.send_bytes(PUBLISH_FAILED + str(e))
+    acquisitionFilter = compileFilter(*settings['thresholds'])
+    coalescer = PositionCoalescer(settings['uiRate'])
+    fileno = session.fileno() if settings['eventDriven'] else None
+    sentBadCount = 0
+    try:
+        while True:
+            if fileno is not None:
+                readable = select.select([fileno, commands], [], [], coalescer.timeUntilDue())[0]
+                command = commands in readable
+                if fileno in readable:
+                    session.readChunk()
+            else:
+                session.readChunk() # waits at most the port timeout
+                command = commands.poll()
+            if command:
+                message = commands.recv_bytes()
+                if message[0] == STOP:
+                    break
+                if message[0] == THRESHOLDS:
+                    lastPosition = acquisitionFilter.lastPosition
+                    acquisitionFilter = compileFilter(*cPickle.loads(message[1:]))
+                    acquisitionFilter.lastPosition = lastPosition
+                elif message[0] == NEW_TRACK:
+                    acquisitionFilter.reset()
+            epochs = session.epochs
+            session.epochs = []
+            if publisher is not None and epochs:
+                publisher.publish(epochs)
+            for gpsPosition in epochs:
+                if gpsPosition.hasFix and acquisitionFilter.accept(gpsPosition):
+                    coalescer.add(gpsPosition)
+            batch = coalescer.due() # flush() only when reading stops
+            if batch is not None:
+                if session.parser.badCount != sentBadCount:
+                    sentBadCount = session.parser.badCount
+                    fixes.send_bytes(BAD_SENTENCES + cPickle.dumps(session.parser.badSentences, 2))
+                fixes.send_bytes(packBatch(batch, session.parser, session.datumEPSG))
+    except NoGPSConnected, e:
+        fixes.send_bytes(FAILED + str(e))
+    except (IOError, EOFError): # the GUI side went away
+        pass
+    batch = coalescer.flush()
+    if batch is not None:
+        try:
+            fixes.send_bytes(packBatch(batch, session.parser, session.datumEPSG))
+        except IOError:
+            pass
+    session.serialPort.close()
+    if publisher is not None:
+        publisher.close()
+
+
+def interpreter():
+    """The Python interpreter to run the worker with: in QGIS sys.executable is QGIS itself"""
+
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+    if sys.platform == 'win32':
+        return os.path.join(sys.exec_prefix, 'pythonw.exe')
+    return os.path.join(sys.exec_prefix, 'bin', 'python%d.%d' % sys.version_info[:2])
+
+
+def connection(fd):
+    """A multiprocessing connection (length prefixed messages, poll, fileno) on the pipe fd"""
+
+    if sys.platform == 'win32':
+        return _multiprocessing.PipeConnection(msvcrt.get_osfhandle(fd))
+    return _multiprocessing.Connection(fd)
+
+
+def startReader(settings):
+    """Starts readerMain in a new interpreter, returns (subprocess.Popen, commands pipe, fixes pipe)
+
+    The worker runs this module as a script, its commands pipe being its stdin and its fixes pipe
+    its stdout; the settings are the first command. It is not a fork of the calling process: a
+    fork of QGIS would carry the state of Qt and GDAL, and the locks held by its other threads,
+    into the worker. When QGIS ends, the worker reads EOF on its commands pipe and stops.
+    """
+
+    process = subprocess.Popen([interpreter(), os.path.splitext(os.path.abspath(__file__))[0] + '.py'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=sys.platform != 'win32')
+    commands = connection(os.dup(process.stdin.fileno()))
+    fixes = connection(os.dup(process.stdout.fileno()))
+    process.stdin.close()
+    process.stdout.close()
+    commands.send_bytes(cPickle.dumps(settings, 2))
+    return process, commands, fixes
+
+
+def main():
+    """The worker started by startReader"""
+
+    # stdout carries the messages to the GUI: what the modules print goes to stderr
+    fixes = connection(os.dup(1))
+    try:
+        os.dup2(2, 1)
+    except OSError: # pythonw.exe has no stderr
+        os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+    commands = connection(0)
+    try:
+        settings = cPickle.loads(commands.recv_bytes())
+    except EOFError:
+        return
+    readerMain(commands, fixes, settings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+""" Additional GPS receivers tracked at the same time as the main one
+    see class documentation below.
+"""
+
+
+from PyQt4.QtCore import QThread, pyqtSignal
+from PyQt4.QtGui import QColor
+from qgis.core import *
+from qgis.gui import *
+
+from CanvasMarkers import PositionMarker
+from trackstore import TrackStore
+from geodesy import TrackProjection
+from ingest import IngestLoop, parseSource
+from positionbatch import PositionBatch, PositionCoalescer
+
+
+# line and marker colours of the additional receivers, in turn
+RECEIVER_COLORS = [QColor(0, 0, 255), QColor(0, 160, 0), QColor(255, 128, 0), QColor(160, 0, 160),
+                   QColor(0, 160, 160), QColor(128, 80, 0), QColor(255, 0, 128), QColor(80, 80, 80)]
+
+
+
+class IngestThread(QThread):
+    """Reads all of the additional receivers on one ingest.IngestLoop in its own thread
+
+    Each receiver's fixes are coalesced on their own and sent at most uiRate times a second as
+    receiverPositions(receiver index, PositionBatch); a receiver that is lost is reported with
+    receiverLost(receiver index, reason). The sources must be added before start().
+
+    The main receiver is not on this loop: it keeps the loop of its ReadGpsd thread, so the
+    receivers take two loops and threads, one more than a shared loop. This is deliberate. That
+    loop only runs between the port search and the loss of the main receiver (ReadGpsd.readEvents
+    stops it to reconnect), and the process reader and the polling paths have no loop at all,
+    while the additional receivers must be read through all of that.
+
+    SIGNALS:
+    receiverPositions(int, PositionBatch) = fixes of a receiver
+    receiverLost(int, str) = a receiver stopped sending or could not be opened
+
+    METHODS:
+    addReceiver = adds an ingest source (or its command line description) as the next receiver
+    stop = stops reading and closes the sources, waiting for the thread a limited time
+    """
+
+    receiverPositions = pyqtSignal(int, PositionBatch)
+    receiverLost = pyqtSignal(int, str)
+
+    def __init__(self, uiRate=20.0, parent=None):
+
+        QThread.__init__(self, parent)
+        self.loop = IngestLoop()
+        self.loop.subscribe(self.positionsRead, self.sourceLost)
+        self.uiRate = uiRate
+        self.sources = []
+        self.coalescers = {} # source -> PositionCoalescer
+        self.flushTimers = {} # source -> pending IngestLoop timer
+
+
+    def addReceiver(self, source):
+
+        if isinstance(source, basestring):
+            source = parseSource(source)
+        self.sources.append(source)
+        self.coalescers[source] = PositionCoalescer(self.uiRate)
+        return len(self.sources) - 1
+
+
+    def run(self):
+
+        for index, source in enumerate(self.sources):
+            try:
+                self.loop.addSource(source)
+            except Exception, e: # serial.SerialException, socket.error, IOError
+                self.receiverLost.emit(index, str(e))
+        self.loop.run()
+        for source in self.sources:
+            self.emitDue(source, True)
+        self.loop.close()
+
+
+    def positionsRead(self, source, positions):
+
+        coalescer = self.coalescers[source]
+        for aGPSPosition in positions:
+            if aGPSPosition.hasFix:
+                coalescer.add(aGPSPosition)
+        if source not in self.flushTimers:
+            self.emitDue(source)
+
+
+    def emitDue(self, source, flush=False):
+
+        self.flushTimers.pop(source, None)
+        coalescer = self.coalescers[source]
+        batch = coalescer.flush() if flush else coalescer.due()
+        if batch is not None:
+            self.receiverPositions.emit(self.sources.index(source), batch)
+        elif coalescer.timeUntilDue() is not None:
+            self.flushTimers[source] = self.loop.callLater(coalescer.timeUntilDue(), self.emitDue, source)
+
+
+    def sourceLost(self, source, reason):
+
+        self.emitDue(source, True)
+        self.receiverLost.emit(self.sources.index(source), reason)
+
+
+    def stop(self, timeout=2000):
+        """Returns True if the thread ended within timeout ms (it may still be opening a source)"""
+
+        self.loop.stop() # kept if the loop is not running yet, run() then returns at once
+        return self.wait(timeout)
+
+
+
+class ReceiverTrack(object):
+    """Track, marker and line of an additional receiver, drawn on the canvas like the main one
+
+    CLASS VARIABLES:
+    name = name of the receiver's source
+    trackStore = the fixes of its tracks
+    acquisitionFilter = its own copy of the acquisition filter (see acquisitionfilter.compileFilter)
+    positionMarker, rubberBand = its marker and current line, in its colour
+    rubberBandS = the lines of its finished tracks
+    sessionId = its session in the GeoPackage, None if the session is not recorded
+
+    METHODS:
+    addBatch = records and draws a PositionBatch
+    newTrack = closes the current track, the next fixes start a new line
+    erase = removes the lines and forgets the tracks
+    remove = removes the marker and the lines from the canvas
+    """
+
+    def __init__(self, canvas, name, color, acquisitionFilter, lineWidth=3, markerNumber=0):
+
+        self.canvas = canvas
+        self.name = name
+        self.color = QColor(color)
+        self.lineWidth = lineWidth
+        self.trackStore = TrackStore()
+        self.trackProjection = TrackProjection()
+        self.acquisitionFilter = acquisitionFilter
+        self.positionMarker = PositionMarker(canvas, markerNumber, self.color, QColor(255, 255, 255))
+        self.rubberBand = self.newRubberBand()
+        self.rubberBandS = []
+        self.sessionId = None
+
+
+    def newRubberBand(self):
+
+        rubberBand = QgsRubberBand(self.canvas)
+        rubberBand.setColor(self.color)
+        rubberBand.setWidth(self.lineWidth)
+        return rubberBand
+
+
+    def addBatch(self, batch, transform, trackDatabase=None):
+        """Records the fixes the filter accepts, then moves the marker and redraws the line once"""
+
+        accepted = []
+        lastPosition = None
+        for aGPSPosition in batch.positions:
+            if not self.acquisitionFilter.accept(aGPSPosition):
+                continue
+            lastPosition = self.trackStore.lastPosition
+            self.trackStore.append(aGPSPosition)
+            if trackDatabase is not None and self.sessionId is not None:
+                trackDatabase.addFix(aGPSPosition, len(self.trackStore.tracks), self.sessionId)
+            accepted.append(aGPSPosition)
+        if not accepted:
+            return
+        aGPSPosition = accepted[-1]
+        bearing = aGPSPosition.bearing
+        if bearing == 0.0 and lastPosition is not None:
+            bearing = self.trackProjection.bearing(lastPosition, aGPSPosition)
+        for earlier in accepted[:-1]:
+            self.rubberBand.addPoint(transform.transform(QgsPoint(earlier.longitude, earlier.latitude)), False)
+        p = transform.transform(QgsPoint(aGPSPosition.longitude, aGPSPosition.latitude))
+        self.rubberBand.addPoint(p)
+        self.positionMarker.setHasPosition(True)
+        self.positionMarker.newCoords(p, bearing)
+
+
+    def newTrack(self, trackDatabase=None):
+
+        if trackDatabase is not None and self.sessionId is not None and self.trackStore.currentLength() > 0:
+            trackDatabase.finishTrack(self.trackStore.tracks[-1], len(self.trackStore.tracks), self.sessionId)
+        self.trackStore.startTrack()
+        self.acquisitionFilter.reset()
+        self.rubberBandS.append(self.rubberBand)
+        self.rubberBand = self.newRubberBand()
+
+
+    def erase(self):
+
+        for band in self.rubberBandS + [self.rubberBand]:
+            band.reset()
+        self.rubberBandS = []
+        self.trackStore.clear()
+
+
+    def remove(self):
+
+        scene = self.canvas.scene()
+        for band in self.rubberBandS + [self.rubberBand]:
+            band.reset()
+            scene.removeItem(band)
+        scene.removeItem(self.positionMarker)
+        self.rubberBandS = []
+        self.trackStore.clear()
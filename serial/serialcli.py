@@ -171,7 +171,8 @@ class Serial(SerialBase):
             raise portNotOpenError
             # must use single byte reads as this is the only way to read
             # without applying encodings
-        data = []
+        data = [self._takeBuffered(size)]
+        size -= len(data[0])
         while size:
             try:
                 data.append(chr(self._port_handle.ReadByte()))
@@ -204,6 +205,7 @@ class Serial(SerialBase):
         if not self._port_handle: 
             raise portNotOpenError
         self._port_handle.DiscardInBuffer()
+        self._rxbuf = ''
 
 
     def flushOutput(self):
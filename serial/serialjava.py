@@ -149,7 +149,7 @@ class Serial(SerialBase):
            return less characters as requested. With no timeout it will block
            until the requested number of bytes is read."""
         if not self.sPort: raise portNotOpenError
-        read = ''
+        read = self._takeBuffered(size)
         if size > 0:
             while len(read) < size:
                 x = self._instream.read()
@@ -169,6 +169,7 @@ class Serial(SerialBase):
         """Clear input buffer, discarding all that is in the buffer."""
         if not self.sPort: raise portNotOpenError
         self._instream.skip(self._instream.available())
+        self._rxbuf = ''
 
     def flushOutput(self):
         """Clear output buffer, aborting the current output and
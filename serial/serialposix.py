@@ -325,6 +325,7 @@ class Serial(SerialBase):
                 os.close(self.fd)
                 self.fd = None
             self._isOpen = False
+        self._rxbuf = ''
 
     def makeDeviceName(self, port):
         return device(port)
@@ -337,12 +338,18 @@ class Serial(SerialBase):
         s = fcntl.ioctl(self.fd, TIOCINQ, TIOCM_zero_str)
         return struct.unpack('I',s)[0]
 
+    def fileno(self):
+        """Return the file descriptor of the port, to wait for input with select/poll.
+           Bytes already taken into the receive buffer by readline are not seen there."""
+        if self.fd is None: raise portNotOpenError
+        return self.fd
+
     def read(self, size=1):
         """Read size bytes from the serial port. If a timeout is set it may
            return less characters as requested. With no timeout it will block
            until the requested number of bytes is read."""
         if self.fd is None: raise portNotOpenError
-        read = ''
+        read = self._takeBuffered(size)
         inp = None
         if size > 0:
             while len(read) < size:
@@ -390,6 +397,7 @@ class Serial(SerialBase):
         if self.fd is None:
             raise portNotOpenError
         termios.tcflush(self.fd, TERMIOS.TCIFLUSH)
+        self._rxbuf = ''
 
     def flushOutput(self):
         """Clear output buffer, aborting the current output and
@@ -180,6 +180,7 @@ class SerialBase(FileLike):
         self._rtscts   = None           #correct value is assigned below trough properties
         self._dsrdtr   = None           #correct value is assigned below trough properties
         self._interCharTimeout = None   #correct value is assigned below trough properties
+        self._rxbuf    = ''             #bytes received but not yet handed out by read/readline
         
         #assign values using get/set methods using the properties feature
         self.port     = port
@@ -203,6 +204,68 @@ class SerialBase(FileLike):
 
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
 
+    #buffered line access: instead of one read(1) (and one select/read syscall
+    #pair) per byte, everything the driver reports as waiting is drained in a
+    #single read into self._rxbuf and lines are cut out of that buffer.
+    #The platform read() implementations serve self._rxbuf first, so read(),
+    #readline() and readlines_available() can be mixed freely.
+
+    def _takeBuffered(self, size):
+        """internal - remove and return up to size bytes from the receive buffer"""
+        data = self._rxbuf[:size]
+        self._rxbuf = self._rxbuf[size:]
+        return data
+
+    def _fillBuffer(self, block=True):
+        """internal - append everything waiting in the driver to the receive
+        buffer with one read. If nothing is waiting and block is true, wait
+        (up to the timeout) for at least one byte. Returns the number of
+        bytes added."""
+        waiting = self.inWaiting()
+        if not waiting and not block:
+            return 0
+        pending = self._rxbuf
+        self._rxbuf = ''
+        chunk = self.read(max(waiting, 1))
+        self._rxbuf = pending + chunk
+        return len(chunk)
+
+    def readline(self, size=None, eol='\n'):
+        """read a line which is terminated with end-of-line (eol) character
+        ('\n' by default) or until timeout"""
+        
+        start = 0
+        while 1:
+            pos = self._rxbuf.find(eol, start)
+            if pos >= 0:
+                end = pos + len(eol)
+                if size is not None and end > size:
+                    end = size
+                return self._takeBuffered(end)
+            if size is not None and len(self._rxbuf) >= size:
+                return self._takeBuffered(size)
+            start = max(len(self._rxbuf) - len(eol) + 1, 0)
+            if not self._fillBuffer():
+                break   #timeout, hand out the partial line
+            
+        return self._takeBuffered(len(self._rxbuf))
+
+    def readlines_available(self, eol='\n'):
+        """return a list with every complete line already received, without
+        blocking. An incomplete trailing line stays buffered for the next call."""
+        
+        self._fillBuffer(block=False)
+        end = self._rxbuf.rfind(eol)
+        if end < 0:
+            return []
+        end += len(eol)
+        lines = self._rxbuf[:end].split(eol)
+        self._rxbuf = self._rxbuf[end:]
+        lines.pop() #empty string after the last eol
+        return [line + eol for line in lines]
+
+    #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
     #TODO: these are not realy needed as the is the BAUDRATES etc attribute...
     #maybe i remove them before the final release...
     
@@ -220,6 +220,8 @@ class Serial(SerialBase):
            until the requested number of bytes is read."""
            
         if not self.hComPort: raise portNotOpenError
+        buffered = self._takeBuffered(size)
+        size -= len(buffered)
         if size > 0:
             win32event.ResetEvent(self._overlappedRead.hEvent)
             flags, comstat = win32file.ClearCommError(self.hComPort)
@@ -237,7 +239,7 @@ class Serial(SerialBase):
                 read = str(buf[:n])
         else:
             read = ''
-        return read
+        return buffered + read
 
     def write(self, data):
         """Output the given string over the serial port."""
@@ -262,6 +264,7 @@ class Serial(SerialBase):
         
         if not self.hComPort: raise portNotOpenError
         win32file.PurgeComm(self.hComPort, win32file.PURGE_RXCLEAR | win32file.PURGE_RXABORT)
+        self._rxbuf = ''
 
 
     def flushOutput(self):
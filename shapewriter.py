@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+""" SHAPE file output of the GPS tracks: attribute schemas, features and the streaming writer
+    see class and function documentation below.
+"""
+
+
+import time
+
+from PyQt4.QtCore import QVariant
+from qgis.core import *
+
+from nmeaparser import formatDateTime
+
+
+
+def pointFields():
+    """Returns the QgsFields of the Points SHAPE file"""
+
+    fields = QgsFields()
+    fields.append(QgsField("LATITUDE", QVariant.Double , "Real", 9, 6))
+    fields.append(QgsField("LONGITUDE", QVariant.Double, "Real", 10, 6))
+    fields.append(QgsField("NUMOFSATS", QVariant.Int, "Integer", 2, 0))
+    fields.append(QgsField("HDOP", QVariant.Double, "Real", 4, 2))
+    fields.append(QgsField("DATETIME", QVariant.String, "String", 19, 0))
+    fields.append(QgsField("FIXTYPE", QVariant.String, "String", 1, 0))
+    fields.append(QgsField("BEARING", QVariant.Double, "Real", 6, 2))
+    fields.append(QgsField("SPEED-KPH", QVariant.Double, "Real", 5, 1))
+    fields.append(QgsField("TRACKNUM", QVariant.Int, "Integer", 2, 0))
+    return fields
+
+
+def lineFields():
+    """Returns the QgsFields of the Lines SHAPE file"""
+
+    fields = QgsFields()
+    fields.append(QgsField("SDATETIME", QVariant.String, "String", 19, 0))
+    fields.append(QgsField("EDATETIME", QVariant.String, "String", 19, 0))
+    fields.append(QgsField("TRACKNUM", QVariant.Int, "Integer", 2, 0))
+    return fields
+
+
+def pointFeature(fields, longitude, latitude, utcTime, hdop, speed, bearing, numSatellites, fixQuality,
+                 trackNumber, dateTime=None):
+    """
+    Returns the QgsFeature of one fix of the Points SHAPE file. The arguments after fields are in
+    the order of the columns of a trackstore.TrackColumns row; dateTime is formatDateTime(utcTime)
+    when the caller already has it.
+    """
+
+    theFeature = QgsFeature(fields)
+    theFeature.setGeometry(QgsGeometry.fromPoint(QgsPoint(longitude, latitude)))
+    theFeature.setAttributes([latitude, longitude, numSatellites, hdop, dateTime or formatDateTime(utcTime),
+                              str(fixQuality), bearing, speed, trackNumber])
+    return theFeature
+
+
+def lineFeature(fields, track, trackNumber):
+    """Returns the QgsFeature of the Lines SHAPE file for a trackstore.TrackColumns"""
+
+    theFeature = QgsFeature(fields)
+    pointsList = [QgsPoint(longitude, latitude) for longitude, latitude in track.rows(('longitude', 'latitude'))]
+    theFeature.setGeometry(QgsGeometry.fromPolyline(pointsList))
+    utcTimes = track.columns['utcTime']
+    theFeature.setAttributes([formatDateTime(utcTimes[0]), formatDateTime(utcTimes[-1]), trackNumber])
+    return theFeature
+
+
+
+def addFeatures(writer, features):
+    """
+    Adds a list of features to a QgsVectorFileWriter (or a data provider) with one addFeatures
+    call where the API has it, with one addFeature call per feature otherwise (QgsVectorFileWriter
+    of QGIS 2). Returns True unless the writer reported an error.
+    """
+
+    bulkAdd = getattr(writer, 'addFeatures', None)
+    if bulkAdd is not None:
+        result = bulkAdd(features)
+        return result[0] if isinstance(result, tuple) else bool(result)
+    addFeature = writer.addFeature
+    status = True
+    for theFeature in features:
+        status = addFeature(theFeature) and status
+    return status
+
+
+def exportPoints(writer, trackStore, batchSize=10000, progress=None):
+    """
+    Writes the fixes of all of the tracks of trackStore (a trackstore.TrackStore) to writer, the
+    features being built with one attribute vector each and one shared QgsFields, and added
+    batchSize at a time. progress, if given, is called after each batch with the number of points
+    written so far; the export stops if it returns False. Returns the number of points written.
+    """
+
+    fields = pointFields()
+    written = 0
+    batch = []
+    second = None
+    for trackIndex, track in enumerate(trackStore.tracks):
+        trackNumber = trackIndex + 1
+        for longitude, latitude, utcTime, hdop, speed, bearing, numSatellites, fixQuality in track.rows():
+            if int(utcTime) != second: # the fixes of a 5-10 Hz receiver share their date string
+                second = int(utcTime)
+                dateTime = formatDateTime(second)
+            batch.append(pointFeature(fields, longitude, latitude, utcTime, hdop, speed, bearing, numSatellites,
+                                      fixQuality, trackNumber, dateTime))
+            if len(batch) >= batchSize:
+                addFeatures(writer, batch)
+                written += len(batch)
+                batch = []
+                if progress is not None and progress(written) is False:
+                    return written
+    if batch:
+        addFeatures(writer, batch)
+        written += len(batch)
+        if progress is not None:
+            progress(written)
+    return written
+
+
+def exportLines(writer, trackStore, progress=None):
+    """
+    Writes one line per track of trackStore (tracks of less than 2 fixes are skipped). progress,
+    if given, is called after each line with the number of tracks done; the export stops if it
+    returns False. Returns the number of lines written.
+    """
+
+    fields = lineFields()
+    written = 0
+    for trackIndex, track in enumerate(trackStore.tracks):
+        if len(track) > 1:
+            addFeatures(writer, [lineFeature(fields, track, trackIndex + 1)])
+            written += 1
+        if progress is not None and progress(trackIndex + 1) is False:
+            break
+    return written
+
+
+
+class StreamingShapeWriter(object):
+    """Writes the tracks to SHAPE files while they are recorded
+
+    The SHAPE files are created empty (trackGps.createSHAPEfile) when tracking starts and are
+    then opened as OGR layers. Each accepted fix is turned into a feature at once and the
+    features are added in batches, every batchSize fixes or once the oldest queued fix waited
+    flushInterval seconds; the OGR provider syncs the files to disk after each batch, so a crash
+    loses at most one batch. The age is checked by addFix and by flushIfDue, which the owner
+    calls from a timer: otherwise the queue would wait for the next accepted fix, which may
+    never come (receiver silent, unit standing still under a distance threshold). The line of a
+    track is written when the track ends (finishTrack).
+
+    CLASS VARIABLES:
+    pointsLayer = QgsVectorLayer of the Points SHAPE file, None if points are not saved
+    linesLayer = QgsVectorLayer of the Lines SHAPE file, None if lines are not saved
+    batchSize = number of fixes written at once
+    flushInterval = longest time (s) a fix waits before being written
+    written = number of fixes written so far
+
+    METHODS:
+    addFix = queues a fix, writes the queue when it is full or old enough
+    flushIfDue = writes the queue if its oldest fix waited flushInterval seconds
+    flush = writes the queued fixes
+    finishTrack = writes the line of a finished track
+    close = writes what is left and releases the files
+    """
+
+    def __init__(self, pointsFileName='', linesFileName='', batchSize=50, flushInterval=5.0):
+
+        self.pointsLayer = self.openLayer(pointsFileName, "GPS points")
+        self.linesLayer = self.openLayer(linesFileName, "GPS lines")
+        self.pointFields = pointFields()
+        self.lineFields = lineFields()
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.written = 0
+        self._pending = []
+        self._firstPending = 0.0 # time the oldest queued fix was added
+
+
+    def openLayer(self, fileName, name):
+
+        if not fileName:
+            return None
+        layer = QgsVectorLayer(fileName, name, "ogr")
+        if not layer.isValid():
+            raise IOError("Cannot open %s for writing" % fileName)
+        return layer
+
+
+    def isValid(self):
+
+        return self.pointsLayer is not None or self.linesLayer is not None
+
+
+    def addFix(self, aGPSPosition, trackNumber):
+
+        if self.pointsLayer is None:
+            return
+        if not self._pending:
+            self._firstPending = time.time()
+        self._pending.append(pointFeature(self.pointFields, aGPSPosition.longitude, aGPSPosition.latitude,
+                                          aGPSPosition.utcTime, aGPSPosition.hdop, aGPSPosition.speed,
+                                          aGPSPosition.bearing, aGPSPosition.numSatellites,
+                                          aGPSPosition.fixQuality, trackNumber))
+        if len(self._pending) >= self.batchSize:
+            self.flush()
+        else:
+            self.flushIfDue()
+
+
+    def flushIfDue(self):
+
+        if self._pending and time.time() - self._firstPending >= self.flushInterval:
+            self.flush()
+
+
+    def flush(self):
+
+        if not self._pending:
+            return
+        addFeatures(self.pointsLayer.dataProvider(), self._pending)
+        self.written += len(self._pending)
+        self._pending = []
+
+
+    def finishTrack(self, track, trackNumber):
+        """Writes the queued fixes and the line of track (a trackstore.TrackColumns)"""
+
+        if self.pointsLayer is not None:
+            self.flush()
+        if self.linesLayer is not None and len(track) > 1:
+            addFeatures(self.linesLayer.dataProvider(), [lineFeature(self.lineFields, track, trackNumber)])
+
+
+    def close(self):
+
+        if self.pointsLayer is not None:
+            self.flush()
+        self.pointsLayer = None
+        self.linesLayer = None
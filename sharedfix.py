@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+""" The latest fix and the recent ones, published in a memory mapped file for other processes
+    see class documentation below.
+"""
+
+
+import os
+import sys
+import time
+import mmap
+import struct
+import tempfile
+import argparse
+
+from nmeaparser import GPSPosition
+
+
+# file read by default by the other tools of the laptop
+DEFAULT_FILE = os.path.join(tempfile.gettempdir(), 'beegps-fix.map')
+
+# magic, layout version, number of records in the ring, size of a record
+HEADER = struct.Struct('<4sIII')
+MAGIC = 'BGFX'
+VERSION = 1
+# seqlock version counter (odd while the writer is changing the file), fixes published so far
+COUNTERS = struct.Struct('<QQ')
+COUNTERS_OFFSET = 16 # 8 byte aligned
+# longitude, latitude, utcTime, hdop, speed, bearing, datumEPSG, numSatellites, fixQuality
+FIX_RECORD = struct.Struct('<dddfffIBB')
+LATEST_OFFSET = COUNTERS_OFFSET + COUNTERS.size
+
+
+def fileSize(ringSize):
+
+    return LATEST_OFFSET + FIX_RECORD.size * (ringSize + 1)
+
+
+
+class FixPublisher(object):
+    """Writes the latest fix, and a ring of the recent ones, in a memory mapped file
+
+    The tracker is the only process that reads the receiver (its port cannot be shared); other
+    processes (camera triggers, data loggers, other plugins) read the position from this file
+    with FixReader, without any I/O or NMEA parsing.
+
+    The file layout, little endian, for readers in other languages:
+        0   magic 'BGFX', uint32 version, uint32 ringSize, uint32 record size
+        16  uint64 version counter (seqlock: odd while the file is being changed),
+            uint64 number of fixes published
+        32  the latest fix, then ringSize records; fix number n (from 1) is in slot (n - 1) % ringSize
+    a record being FIX_RECORD: float64 longitude, latitude, utcTime (s since 1970), float32 hdop,
+    speed (km/h), bearing, uint32 datum EPSG, uint8 satellites, fix quality. A reader copies
+    what it needs between two reads of the version counter and starts again if the counter was
+    odd or changed.
+
+    CLASS VARIABLES:
+    fileName = the memory mapped file
+    ringSize = number of recent fixes kept
+    published = number of fixes published so far
+
+    METHODS:
+    publish = publishes fixes, oldest first, the last one becoming the latest fix
+    close = unmaps the file (it is left for the readers, with the last fix)
+    """
+
+    def __init__(self, fileName=DEFAULT_FILE, ringSize=256):
+
+        self.fileName = fileName
+        self.ringSize = ringSize
+        self.published = 0
+        # the file of an earlier session is reused, not truncated: readers may have it mapped
+        self._file = os.fdopen(os.open(fileName, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0644), 'r+b')
+        self._file.truncate(fileSize(ringSize))
+        self._map = mmap.mmap(self._file.fileno(), fileSize(ringSize))
+        # the version counter goes on from the earlier session, so that no reader mistakes a
+        # version of the new session for the one it started reading with
+        magic, version, oldRingSize, recordSize = HEADER.unpack_from(self._map, 0)
+        self._version = COUNTERS.unpack_from(self._map, COUNTERS_OFFSET)[0] if magic == MAGIC else 0
+        self._version += 1 + (self._version & 1) # odd, while the header changes
+        struct.pack_into('<Q', self._map, COUNTERS_OFFSET, self._version)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, ringSize, FIX_RECORD.size)
+        self._version += 1
+        COUNTERS.pack_into(self._map, COUNTERS_OFFSET, self._version, 0)
+
+
+    def publish(self, positions):
+        """Publishes the GPSPosition objects of positions (those with a fix), oldest first"""
+
+        records = [FIX_RECORD.pack(p.longitude, p.latitude, p.utcTime, p.hdop, p.speed, p.bearing, p.datumEPSG,
+                                   p.numSatellites, p.fixQuality) for p in positions if p.hasFix]
+        if not records:
+            return
+        records = records[-self.ringSize:] # older ones would be overwritten at once
+        fixMap = self._map
+        size = FIX_RECORD.size
+        self._version += 1 # odd: readers retry
+        struct.pack_into('<Q', fixMap, COUNTERS_OFFSET, self._version)
+        for record in records:
+            self.published += 1
+            offset = LATEST_OFFSET + size * (1 + (self.published - 1) % self.ringSize)
+            fixMap[offset:offset + size] = record
+        fixMap[LATEST_OFFSET:LATEST_OFFSET + size] = records[-1]
+        struct.pack_into('<Q', fixMap, COUNTERS_OFFSET + 8, self.published)
+        self._version += 1 # even: consistent again
+        struct.pack_into('<Q', fixMap, COUNTERS_OFFSET, self._version)
+
+
+    def close(self):
+
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+
+
+class FixReader(object):
+    """Reads the fixes published by a FixPublisher, from any process of the machine
+
+    Reading copies a few dozen bytes from the memory map; a read that overlaps a write of the
+    publisher is started again (seqlock), so the fixes returned are never half written. A write
+    takes microseconds: if the counter stays odd for timeout seconds the publisher died while
+    writing, and the read raises IOError instead of waiting for ever (the file is consistent
+    again once the tracker publishes anew).
+
+    CLASS VARIABLES:
+    fileName = the memory mapped file
+    ringSize = number of recent fixes the publisher keeps
+    retries = number of reads started again because the publisher was writing
+    timeout = seconds a read waits for a write to end
+
+    METHODS:
+    published = number of fixes published so far (poll it to know when there is a new fix)
+    latest = the latest fix (a GPSPosition), None before the first one
+    recent = up to n recent fixes, oldest first
+    close = unmaps the file
+    """
+
+    def __init__(self, fileName=DEFAULT_FILE, timeout=0.1):
+
+        self.fileName = fileName
+        self.retries = 0
+        self.timeout = timeout
+        self._file = open(fileName, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.ringSize, recordSize = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or recordSize != FIX_RECORD.size:
+            self.close()
+            raise IOError("%s is not a fix file of this version" % fileName)
+
+
+    def read(self, copy):
+        """Returns copy(number of fixes published) once it ran without a write of the publisher"""
+
+        fixMap = self._map
+        deadline = None
+        while True:
+            version, published = COUNTERS.unpack_from(fixMap, COUNTERS_OFFSET)
+            if not version & 1:
+                result = copy(published)
+                if struct.unpack_from('<Q', fixMap, COUNTERS_OFFSET)[0] == version:
+                    return result
+            self.retries += 1
+            if deadline is None:
+                deadline = time.time() + self.timeout
+            elif time.time() > deadline:
+                raise IOError("%s: the publisher stopped in the middle of a write" % self.fileName)
+            time.sleep(0) # let the publisher finish
+
+
+    def published(self):
+
+        return COUNTERS.unpack_from(self._map, COUNTERS_OFFSET)[1]
+
+
+    def latest(self):
+
+        def copy(published):
+            return self._map[LATEST_OFFSET:LATEST_OFFSET + FIX_RECORD.size] if published else None
+
+        record = self.read(copy)
+        return positionFromRecord(record) if record is not None else None
+
+
+    def recent(self, n=None):
+
+        size = FIX_RECORD.size
+        ringSize = self.ringSize
+
+        def copy(published):
+            count = min(published, ringSize if n is None else min(n, ringSize))
+            records = []
+            for number in xrange(published - count + 1, published + 1):
+                offset = LATEST_OFFSET + size * (1 + (number - 1) % ringSize)
+                records.append(self._map[offset:offset + size])
+            return records
+
+        return [positionFromRecord(record) for record in self.read(copy)]
+
+
+    def close(self):
+
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+
+
+def positionFromRecord(record):
+
+    p = GPSPosition()
+    p.longitude, p.latitude, p.utcTime, p.hdop, p.speed, p.bearing, p.datumEPSG, p.numSatellites, \
+        p.fixQuality = FIX_RECORD.unpack(record)
+    p.hasFix = True
+    return p
+
+
+def main(argv):
+    """Prints the fixes published by the tracker, as they arrive"""
+
+    parser = argparse.ArgumentParser(description="Prints the position published by the GPS tracker")
+    parser.add_argument('fileName', nargs='?', default=DEFAULT_FILE, help="fix file (default %s)" % DEFAULT_FILE)
+    parser.add_argument('--interval', type=float, default=0.1, help="seconds between polls")
+    args = parser.parse_args(argv[1:])
+    reader = FixReader(args.fileName)
+    shown = None
+    try:
+        while True:
+            published = reader.published()
+            if published != shown:
+                shown = published
+                try:
+                    p = reader.latest()
+                except IOError, e: # tried again at the next poll
+                    print e
+                    p = None
+                if p is not None:
+                    print '%s %.7f %.7f hdop %.1f %d satellites, fix %d' % (p.theDateTime, p.latitude, p.longitude,
+                                                                           p.hdop, p.numSatellites, p.fixQuality)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    reader.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -15,9 +15,9 @@ on Windows. I try to make notes where major changes occur.
 
 
 import os, sys
+import sqlite3
+import cPickle
 from time import *
-import datetime
-import math
 from decimal import Decimal
 
 from PyQt4.QtCore import * 
@@ -27,7 +27,18 @@ from qgis.core import *
 from qgis.gui import *
 
 from CanvasMarkers import PositionMarker
+from positionbatch import PositionBatch, PositionCoalescer
+from ingest import IngestLoop, ConnectionSource
+from receivers import IngestThread, ReceiverTrack, RECEIVER_COLORS
+import readerprocess
+from sharedfix import FixPublisher, DEFAULT_FILE as DEFAULT_FIX_FILE
 from gpsconnection import *
+from trackstore import TrackStore
+from acquisitionfilter import compileFilter, parseThreshold
+from geodesy import TrackProjection
+from shapewriter import StreamingShapeWriter, pointFields, lineFields
+from trackdatabase import TrackDatabase
+from exportworker import ShapeExportWorker
 from gpstrackeroptions import GPSTrackerOptions
 from shapefilenames import ShapeFileNames
 from helpform import *
@@ -35,7 +46,24 @@ from helpform import *
 
 
 class ReadGpsd (QThread):
-    """Thread that connects to GPSConnection and send read lat/lon to plugin interface"""
+    """Thread that connects to GPSConnection and send read lat/lon to plugin interface
+
+    The fixes are sent in PositionBatch objects (positionsRead signal), at most uiRate of them
+    a second, so that a fast receiver does not flood the GUI thread with one event per fix.
+
+    When eventDriven is True and the port has a file descriptor (POSIX serial ports) the
+    connected port is read by an ingest.IngestLoop, the thread being one of its subscribers: it
+    sleeps in select until bytes arrive, a batch is due or stop() wakes it, so no CPU is used
+    while the receiver is silent and stop() returns at once. Otherwise (Windows, replayed logs)
+    the port is polled with its read timeout.
+
+    When publishFile is set every fix is published there (sharedfix.FixPublisher) as soon as it
+    is parsed, before the coalescer and the acquisition filter, so that other processes get the
+    current position even when the GUI is late; publishFailed(message) is emitted if the file
+    cannot be opened.
+    """
+
+    positionsRead = pyqtSignal(PositionBatch)
     
     def __init__ (self, parent=None, session=None):
         
@@ -43,14 +71,60 @@ class ReadGpsd (QThread):
         self.session = GPSConnection()
         self.running = False
         self.tryAllPorts = True # by default all ports will be searched for a GPS device
+        self.replayFile = '' # recorded NMEA log read instead of a receiver, if set
+        self.replaySpeed = 1.0
+        self.uiRate = 20.0 # batches of fixes sent to the GUI per second at most
+        self.eventDriven = True # wait in select on the port instead of polling it, where possible
+        self.ingestLoop = IngestLoop() if os.name == 'posix' else None
+        self.publishFile = '' # memory mapped file where the fixes are published, '' = none
+        self.fixPublisher = None # its FixPublisher, open from the first start to closePublisher
+
+
+    def openPublisher(self):
+
+        if self.publishFile and self.fixPublisher is None:
+            try:
+                self.fixPublisher = FixPublisher(self.publishFile)
+            except EnvironmentError, e: # IOError, OSError, mmap.error
+                self.emit(SIGNAL("publishFailed(PyQt_PyObject)"), str(e))
+
+
+    def closePublisher(self):
+
+        if self.fixPublisher is not None:
+            self.fixPublisher.close()
+            self.fixPublisher = None
+
+
+    def startTrack(self):
+        # the GUI's acquisition filter is the only one: nothing to reset in this thread
+
+        pass
 
 
     def setConnectionValues(self, portNumber, portSpeed):        
         
-        if portSpeed in range(len(self.session.baudRates)) and portNumber in range(11,18):
+        if portSpeed in range(len(self.session.baudRates)) and 0 <= portNumber < self.session.port_maxval:
             self.tryAllPorts = False # by default all ports will be searched for a GPS device
             self.portNumber = portNumber
             self.portSpeed = portSpeed
+
+
+    def setReplay(self, fileName, speed=1.0):
+        """Reads the recorded NMEA log fileName at speed times real time (0 = as fast as possible)"""
+
+        self.replayFile = fileName
+        self.replaySpeed = speed
+
+
+    def start(self):
+        # running is set here, not in run(), so that a stop() during the port search is not undone
+        # by the thread; a stop left pending by the last session must not end this one
+
+        self.running = True
+        if self.ingestLoop is not None:
+            self.ingestLoop.stopRequested = False
+        super(ReadGpsd,self).start()
     
     
     def run(self):
@@ -62,7 +136,9 @@ class ReadGpsd (QThread):
                 self.session.serialPort.open()
                 self.emit(SIGNAL("connectionMade()"))
             else: # not yet connected: find port and open it
-                if self.tryAllPorts: 
+                if self.replayFile:
+                    self.session.connect_replay(self.replayFile, self.replaySpeed)
+                elif self.tryAllPorts: 
                     self.session.search_available_port()
                 else: 
                     self.session.connectPortBySettings(self.portNumber, self.portSpeed )
@@ -73,31 +149,215 @@ class ReadGpsd (QThread):
 
         # gather data from gpsd
         #QMessageBox.information(self.parent.mainWindow(),"ReadGpsd","Reached else part of run method!",QMessageBox.Ok)
+        coalescer = PositionCoalescer(self.uiRate)
+        fileno = self.session.fileno() if self.eventDriven and self.ingestLoop is not None else None
+        self.openPublisher()
         try:
-            self.running = True
-            while self.running and self.session.connected :
+            if fileno is not None:
+                self.readEvents(coalescer)
+            while self.running and self.session.connected and fileno is None:
                 #~ msg = "lat:%s\nlon:%s" % (self.session.fix.latitude,self.session.fix.longitude)
                 #~ QMessageBox.information(self.iface.mainWindow(), "trackGps", msg)
                 #~ print msg
-                gpsPosition = self.session.getPosition()
+                gpsPosition = self.session.getPosition() # waits at most the port timeout
                 if gpsPosition.hasFix: 
-                    self.emit(SIGNAL("readCoords(PyQt_PyObject)"),gpsPosition)
+                    if self.fixPublisher is not None:
+                        self.fixPublisher.publish((gpsPosition,))
+                    coalescer.add(gpsPosition)
+                # a read that completed no epoch is the normal case between fixes: the pending
+                # fixes still wait for their 1/uiRate, released by the next due() after it
+                batch = coalescer.due()
+                if batch is not None:
+                    self.positionsRead.emit(batch)
         except NoGPSConnected, e: # method search_available_port will issue this message if no NMEA GPS port is found
+            self.emitPending(coalescer)
             self.emit(SIGNAL("connectionFailed(PyQt_PyObject)"),e)
             self.exit(1)
+        self.emitPending(coalescer)
             
             
         self.quit()
     
     
+    def readEvents(self, coalescer):
+        """Reads the connected port on the ingest loop until stop() or a lost connection"""
+
+        loop = self.ingestLoop
+        flushTimer = []
+        lostReason = []
+
+        def emitDue():
+            del flushTimer[:]
+            batch = coalescer.due()
+            if batch is not None:
+                self.positionsRead.emit(batch)
+            elif coalescer.timeUntilDue() is not None:
+                flushTimer.append(loop.callLater(coalescer.timeUntilDue(), emitDue))
+
+        def positionsRead(source, positions):
+            if self.fixPublisher is not None:
+                self.fixPublisher.publish(positions)
+            for gpsPosition in positions:
+                if gpsPosition.hasFix:
+                    coalescer.add(gpsPosition)
+            if not flushTimer:
+                emitDue()
+
+        def lost(source, reason):
+            lostReason.append(reason)
+            loop.stop()
+
+        source = ConnectionSource(self.session)
+        loop.subscribe(positionsRead, lost)
+        loop.addSource(source)
+        try:
+            loop.run() # returns at once if stop() came during the port search
+        finally:
+            loop.unsubscribe(positionsRead, lost)
+            loop.removeSource(source)
+            for timer in flushTimer:
+                loop.cancel(timer)
+        if lostReason:
+            raise NoGPSConnected(lostReason[0])
+
+
+    def emitPending(self, coalescer):
+
+        batch = coalescer.flush()
+        if batch is not None:
+            self.positionsRead.emit(batch)
+    
+    
     def stop(self):
         
         self.running = False
-        self.wait(2000)
+        if self.ingestLoop is not None:
+            self.ingestLoop.stop() # an event driven thread returns from select at once
+        self.wait(2000) # a polling thread finishes its read first
         self.session.serialPort.close()
 
 
 
+class ReadProcess (ReadGpsd):
+    """ReadGpsd whose receiver is read, parsed and filtered in a separate process
+
+    The worker (readerprocess.readerMain) holds the port; this thread only waits on the pipe,
+    unpacks the accepted fixes (38 byte records) and emits them as PositionBatch objects, so
+    parsing and filtering never hold the GIL of the QGIS interpreter. self.session is not
+    connected to a port: it mirrors the state of the worker's connection (port, speed, datum,
+    connection cache, corrupted sentences) for the dock and the settings.
+
+    setThresholds sends the acquisition filter thresholds to the worker; the fixes it sends
+    have passed them already, so the GUI's filter has no stage (a second Time or Distance stage
+    would measure from another last fix). startTrack resets the worker's filter.
+
+    The worker is a new Python interpreter (readerprocess.startReader), never a fork: a fork of
+    QGIS would carry the state of Qt and GDAL, and the locks held by its other threads, into the
+    worker. start() launches it, so from the GUI thread; this thread only reads its pipe.
+    """
+
+    def __init__ (self, parent=None, session=None):
+
+        super(ReadProcess,self).__init__(parent, session)
+        self.thresholds = ()
+        self.process = None
+        self.commands = None
+        self.fixes = None
+
+
+    def setThresholds(self, thresholds):
+        """thresholds = arguments of acquisitionfilter.compileFilter"""
+
+        self.thresholds = tuple(thresholds)
+        self.sendCommand(readerprocess.THRESHOLDS + cPickle.dumps(self.thresholds, 2))
+
+
+    def startTrack(self):
+
+        self.sendCommand(readerprocess.NEW_TRACK)
+
+
+    def sendCommand(self, message):
+
+        commands = self.commands
+        if commands is not None:
+            try:
+                commands.send_bytes(message)
+            except IOError:
+                pass # the worker has stopped
+
+
+    def start(self):
+
+        if self.process is not None: # the last worker ended on its own (connection failed or lost)
+            self.stop()
+        session = self.session
+        settings = {'replayFile': self.replayFile, 'replaySpeed': self.replaySpeed,
+                    'tryAllPorts': self.tryAllPorts, 'portNumber': getattr(self, 'portNumber', 0),
+                    'portSpeed': getattr(self, 'portSpeed', 0), 'lastDevice': session.lastDevice,
+                    'cache': session.cache.toStrings(), 'thresholds': self.thresholds,
+                    'uiRate': self.uiRate, 'eventDriven': self.eventDriven, 'publishFile': self.publishFile}
+        self.process, self.commands, self.fixes = readerprocess.startReader(settings)
+        super(ReadProcess,self).start()
+
+
+    def run(self):
+
+        session = self.session
+        fixes = self.fixes
+        try:
+            while True:
+                try:
+                    message = fixes.recv_bytes()
+                except (EOFError, IOError): # the worker has ended
+                    break
+                kind = message[0]
+                if kind == readerprocess.FIXES:
+                    batch, session.parser.sentenceCount, session.parser.badCount, session.datumEPSG = \
+                        readerprocess.unpackBatch(message)
+                    if len(batch):
+                        self.positionsRead.emit(batch)
+                elif kind == readerprocess.BAD_SENTENCES:
+                    session.parser.badSentences = cPickle.loads(message[1:])
+                elif kind == readerprocess.CONNECTED:
+                    info = cPickle.loads(message[1:])
+                    session.portName, session.port, session.baudRate = info['portName'], info['port'], info['baudRate']
+                    session.timeToConnect, session.datumEPSG = info['timeToConnect'], info['datumEPSG']
+                    session.cache.fromStrings(info['cache'])
+                    session.connected = True
+                    self.emit(SIGNAL("connectionMade()"))
+                elif kind == readerprocess.PUBLISH_FAILED:
+                    self.emit(SIGNAL("publishFailed(PyQt_PyObject)"), message[1:])
+                elif kind == readerprocess.FAILED:
+                    session.connected = False
+                    self.emit(SIGNAL("connectionFailed(PyQt_PyObject)"), NoGPSConnected(message[1:]))
+        finally:
+            fixes.close()
+        self.quit()
+
+
+    def stop(self):
+
+        self.running = False
+        if self.commands is not None:
+            try:
+                self.commands.send_bytes(readerprocess.STOP)
+            except IOError:
+                pass # the worker has stopped
+        self.wait(2000) # the worker closes the port and sends its last fixes
+        if self.process is not None:
+            if self.process.poll() is None: # still searching the ports
+                self.process.terminate()
+                self.wait()
+            self.process.wait()
+            self.commands.close()
+        self.process = None
+        self.commands = None
+        self.fixes = None
+        self.session.connected = False # the next start connects again, from the cache
+
+
+
 class trackGps:
     
     def __init__(self, iface):
@@ -108,7 +368,9 @@ class trackGps:
 
         self.guiStarted = False # signal to destructor that this isn't actually been displayed yet        
         
-        self.read = ReadGpsd(self.iface)
+        # read, parse and filter the receiver in a separate process, the GIL is left to QGIS
+        self.readInProcess = QSettings().value("trackGpsGPSSettings/readInProcess", False, type=bool)
+        self.read = ReadProcess(self.iface) if self.readInProcess else ReadGpsd(self.iface)
         
         # create dock widget from ui file
         print os.path.join(self.globalpath,"DockWidget.ui")
@@ -138,15 +400,64 @@ class trackGps:
         
         self.saveInSHAPEFile = self.GPSSettings.value("trackGpsGPSSettings/saveInSHAPEFile", False, type=bool)
         
+        # write the SHAPE files while tracking instead of when tracking stops
+        self.streamToSHAPEFile = self.GPSSettings.value("trackGpsGPSSettings/streamToSHAPEFile", False, type=bool)
+        self.shapeWriter = None # StreamingShapeWriter of the session being recorded
+        # writes the fixes queued by the recorders once they are old enough, even when no more come
+        self.flushTimer = QTimer()
+        self.flushTimer.setInterval(1000)
+        QObject.connect(self.flushTimer, SIGNAL("timeout()"), self.flushRecorders)
+        
+        # GeoPackage recording every session ('' = off)
+        self.databaseFile = self.GPSSettings.value("trackGpsGPSSettings/databaseFile", '', type=str)
+        self.trackDatabase = None # TrackDatabase open while tracking
+        
+        # memory mapped file where the latest fixes are published for other processes (see
+        # sharedfix.FixReader), '' = not published
+        self.publishFile = self.GPSSettings.value("trackGpsGPSSettings/publishFile", DEFAULT_FIX_FILE, type=str)
+        self.read.publishFile = self.publishFile
+        self.exportWorkers = [] # ShapeExportWorker threads writing SHAPE files
+        
         # now recover/set the values for the serial port connection
         self.searchAllConnectionsSpeeds = self.GPSSettings.value("trackGpsGPSSettings/searchAllConnectionsSpeeds",
                                                                  True, type=bool)
         self.serialPortNumber = self.GPSSettings.value("trackGpsGPSSettings/serialPortNumber", 0, type=int)
         self.serialPortSpeed = self.GPSSettings.value("trackGpsGPSSettings/serialPortSpeed", 0, type=int)
+        
+        # device that connected last time, tried first by the port search
+        self.lastDevice = self.GPSSettings.value("trackGpsGPSSettings/lastDevice", '', type=str)
+        self.read.session.lastDevice = self.lastDevice
+        
+        # last successful connections, tried first when the plugin connects
+        cachedConnections = self.GPSSettings.value("trackGpsGPSSettings/connectionCache", [])
+        if isinstance(cachedConnections, basestring): # a list of one comes back as a plain string
+            cachedConnections = [cachedConnections]
+        self.read.session.cache.fromStrings(cachedConnections)
 
         # set GPS connection values if they were recovered from a previous session
         if not self.searchAllConnectionsSpeeds: 
             self.read.setConnectionValues(self.serialPortNumber, self.serialPortSpeed)
+
+        # a recorded NMEA log to replay instead of the receiver (for testing, no field in the dialog)
+        self.replayFile = self.GPSSettings.value("trackGpsGPSSettings/replayFile", '', type=str)
+        self.replaySpeed = self.GPSSettings.value("trackGpsGPSSettings/replaySpeed", 1.0, type=float)
+        if self.replayFile:
+            self.read.setReplay(self.replayFile, self.replaySpeed)
+
+        # batches of fixes (and redraws) per second at most, whatever the rate of the receiver
+        self.uiRate = self.GPSSettings.value("trackGpsGPSSettings/uiRate", 20.0, type=float)
+        self.read.uiRate = self.uiRate
+        # wait in select for the receiver instead of polling the port (POSIX serial ports only)
+        self.eventDrivenReading = self.GPSSettings.value("trackGpsGPSSettings/eventDrivenReading", True, type=bool)
+        self.read.eventDriven = self.eventDrivenReading
+
+        # receivers tracked together with the main one, as ingest sources: serial:DEVICE[:BAUD],
+        # tcp:HOST:PORT or replay:FILE[:SPEED] (no field in the dialog yet)
+        self.extraReceivers = self.GPSSettings.value("trackGpsGPSSettings/extraReceivers", [])
+        if isinstance(self.extraReceivers, basestring): # a list of one comes back as a plain string
+            self.extraReceivers = [self.extraReceivers]
+        self.receivers = [] # ReceiverTrack of each additional receiver
+        self.ingestThread = None # reads all of the additional receivers on one loop
         
         # initialize the graphic elements for the GPS position
         self.positionMarker = PositionMarker(self.canvas, self.markerNumber, self.markerFillColor, self.markerOutlineColor)
@@ -155,8 +466,18 @@ class trackGps:
         self.rubberBand.setWidth(self.trackLineWidth)
         
         self.rubberBandS = []
-        self.GPSPositions = [] # array of positions in current track
-        self.GPSTracks = [] # array of all tracks
+        self.shownBadCount = 0 # corrupted sentence count shown in the dock
+        self.trackStore = TrackStore() # fixes of all tracks, the last one is the current track
+        self.trackProjection = TrackProjection() # local plane for the bearing between fixes
+        
+        # acquisition filter thresholds without a field in the dock (0 = no limit)
+        self.maxHDOP = self.GPSSettings.value("trackGpsGPSSettings/maxHDOP", 0.0, type=float)
+        self.minFixQuality = self.GPSSettings.value("trackGpsGPSSettings/minFixQuality", 0, type=int)
+        self.minSpeed = self.GPSSettings.value("trackGpsGPSSettings/minSpeed", 0.0, type=float)
+        self.maxSpeed = self.GPSSettings.value("trackGpsGPSSettings/maxSpeed", 0.0, type=float)
+        self.minDistance = 0.0 # metres, from the dock
+        self.minInterval = 0.0 # seconds, from the dock
+        self.compileAcquisitionFilter()
 
         
     def __del__(self):
@@ -176,8 +497,21 @@ class trackGps:
             GPSSettings.setValue("trackGpsGPSSettings/trackLineWidth", self.trackLineWidth)
             GPSSettings.setValue("trackGpsGPSSettings/lineColor", self.lineColor)
             GPSSettings.setValue("trackGpsGPSSettings/saveInSHAPEFile", self.saveInSHAPEFile)
+            GPSSettings.setValue("trackGpsGPSSettings/streamToSHAPEFile", self.streamToSHAPEFile)
+            GPSSettings.setValue("trackGpsGPSSettings/databaseFile", self.databaseFile)
             GPSSettings.setValue("trackGpsGPSSettings/serialPortNumber", self.serialPortNumber)
             GPSSettings.setValue("trackGpsGPSSettings/serialPortSpeed", self.serialPortSpeed)
+            GPSSettings.setValue("trackGpsGPSSettings/lastDevice", self.lastDevice)
+            GPSSettings.setValue("trackGpsGPSSettings/connectionCache", self.read.session.cache.toStrings())
+            GPSSettings.setValue("trackGpsGPSSettings/maxHDOP", self.maxHDOP)
+            GPSSettings.setValue("trackGpsGPSSettings/minFixQuality", self.minFixQuality)
+            GPSSettings.setValue("trackGpsGPSSettings/minSpeed", self.minSpeed)
+            GPSSettings.setValue("trackGpsGPSSettings/maxSpeed", self.maxSpeed)
+            GPSSettings.setValue("trackGpsGPSSettings/uiRate", self.uiRate)
+            GPSSettings.setValue("trackGpsGPSSettings/eventDrivenReading", self.eventDrivenReading)
+            GPSSettings.setValue("trackGpsGPSSettings/extraReceivers", self.extraReceivers)
+            GPSSettings.setValue("trackGpsGPSSettings/readInProcess", self.readInProcess)
+            GPSSettings.setValue("trackGpsGPSSettings/publishFile", self.publishFile)
             GPSSettings.synch()
             QMessageBox.information(self.iface.mainWindow(),"Class trackGPS Ending","trackGPS is being destroyed!")
 
@@ -211,10 +545,16 @@ class trackGps:
         QObject.connect(self.actionStop,  SIGNAL("activated()"), self.toogleGather)
         QObject.connect(self.actionOptions,  SIGNAL("activated()"), self.showGPSMenuOptions)
         QObject.connect(self.dock.btnStart,  SIGNAL("clicked()"), self.toogleGather)
-        QObject.connect(self.read,  SIGNAL("readCoords(PyQt_PyObject)"), self.setCoords)
+        self.read.positionsRead.connect(self.setCoords)
         QObject.connect(self.read,  SIGNAL("connectionFailed(PyQt_PyObject)"), self.connectionFailed)
         QObject.connect(self.read,  SIGNAL("connectionMade()"), self.connectionMade)
+        QObject.connect(self.read,  SIGNAL("publishFailed(PyQt_PyObject)"), self.publishFailed)
         QObject.connect(self.helpAction, SIGNAL("activated()"), self.helpWindow)
+        
+        # the acquisition filter is rebuilt when a threshold is edited, not read on every fix
+        QObject.connect(self.dock.lineTreshold, SIGNAL("editingFinished()"), self.thresholdsEdited)
+        QObject.connect(self.dock.lineTimeIntervals, SIGNAL("editingFinished()"), self.thresholdsEdited)
+        self.thresholdsEdited()
      
         # Add menu items for action
         self.iface.addPluginToMenu("beeGPS", self.actionOptions)
@@ -248,15 +588,14 @@ class trackGps:
         self.rubberBandS.append(self.rubberBand)
         self.showGPSMenuOptions() # give user opportunity to change display options
         
-        #if len(self.GPSPositions) > 0: # temporary section to display positional information
-        #    QMessageBox.information(self.iface.mainWindow(),"trackGPS","There are: " + str(len(self.GPSPositions)) + " GPS Positions in the current track")
-        #    for i in range(len(self.GPSPositions)):
-        #        QMessageBox.information(self.iface.mainWindow(),"trackGPS","Position #" + str(i) + ": Latitude=" + str(self.GPSPositions[i].latitude))
 
         self.rubberBand=QgsRubberBand(self.canvas) # start new rubber band
-        if len(self.GPSPositions) > 0 and self.saveInSHAPEFile:
-            self.GPSTracks.append(self.GPSPositions) # save GPSPositions to GPSTracks
-            self.GPSPositions = [] #reset of array contenent the current position
+        for receiver in self.receivers:
+            receiver.newTrack(self.trackDatabase)
+        self.finishStreamedTrack()
+        self.trackStore.startTrack() # close the current track (SHAPE files and GeoPackage), next fixes go in a new one
+        self.acquisitionFilter.reset() # the first fix of the new track is always kept
+        self.read.startTrack() # and so by the filter of the reader process
         self.startGather() # open serial port and record new track
        
        
@@ -266,6 +605,7 @@ class trackGps:
         self.iface.removePluginMenu("beeGPS", self.actionStart)
         self.iface.removePluginMenu("beeGPS", self.actionStop)
         self.iface.removePluginMenu("beeGPS", self.actionOptions)
+        self.read.closePublisher()
     
     
     def startGather(self):
@@ -285,43 +625,50 @@ class trackGps:
         # create transform object from WGS84 (GPS) to canvas CRS
         self.transform = QgsCoordinateTransform(QgsCoordinateReferenceSystem(self.read.session.datumEPSG,\
                                                         QgsCoordinateReferenceSystem.EpsgCrsId ),dest_crs)
+        if self.saveInSHAPEFile and self.streamToSHAPEFile and self.shapeWriter is None:
+            self.openShapeWriter() # the files stay open for all of the tracks of the session
+        if self.databaseFile and self.trackDatabase is None:
+            self.openTrackDatabase()
+        self.flushTimer.start()
         self.read.start()
+        if self.extraReceivers and self.ingestThread is None:
+            self.startReceivers(dest_crs)
         self.read.exec_()
     
     
-    def setCoords(self, aGPSPosition):
+    def setCoords(self, batch):
+        """Records the fixes of a PositionBatch, then redraws the dock and the map once"""
     
-        boolDistance = True
-        boolTime = True
-    
-        #Controllo se  la prima acquisizione valutando la dimensione di GPSPosition[] a 0, in caso positivo acquisisco.
-        if len(self.GPSPositions) == 0:
-            self.GPSPositions.append(aGPSPosition)
-            
-        else:
-            #Metodo tresholdAcquisition() per l'acquisizione dei punti "live" in base alla soglia di distanza che ritorna 
-            #TRUE in caso la soglia sia stata superata, altrimenti FALSE
-            boolDistance = self.tresholdAcquisition(aGPSPosition)
-            
-        #Controllo che tresholdAcquisition() abbia ritornato TRUE altrimenti passo al punto successivo
-        if boolDistance == False:
+        #Il filtro di acquisizione (qualita', velocita', soglia temporale e di distanza) decide se la
+        #posizione viene acquisita; la prima posizione di una traccia e' sempre acquisita
+        accepted = []
+        lastPosition = None
+        for aGPSPosition in batch.positions:
+            if not self.acquisitionFilter.accept(aGPSPosition):
+                continue
+            lastPosition = self.trackStore.lastPosition
+            self.trackStore.append(aGPSPosition)
+            if self.shapeWriter is not None:
+                self.shapeWriter.addFix(aGPSPosition, len(self.trackStore.tracks))
+            if self.trackDatabase is not None:
+                self.trackDatabase.addFix(aGPSPosition, len(self.trackStore.tracks))
+            accepted.append(aGPSPosition)
+        if not accepted:
             return
-            
-        #Metodo timeIntervals() per l'acquisizione dei punti "live" in base alla soglia di tempo che ritorna TRUE in caso
-        #la soglia sia stata superata e acquisita, altrimenti FALSE
-        boolTime = self.timeIntervals(aGPSPosition)
+        aGPSPosition = accepted[-1]
         
-        #Controllo che timeIntervals() abbia ritornato TRUE altrimenti passo al punto successivo
-        if boolTime == False:
-          return
-        
-        else:
-            self.GPSPositions.append(aGPSPosition)
+        #senza rotta dal ricevitore (nessun RMC o velocita' nulla) la direzione del marker e' calcolata
+        #nel piano locale fra l'ultima posizione acquisita e questa
+        bearing = aGPSPosition.bearing
+        if bearing == 0.0 and lastPosition is not None:
+            bearing = self.trackProjection.bearing(lastPosition, aGPSPosition)
 
         # display raw values
+        if self.read.session.parser.badCount != self.shownBadCount:
+            self.showConnectionInformation() # corrupted sentences were dropped since the last fix
         self.dock.date.setText(aGPSPosition.theDateTime)
-        self.dock.lat.setText(str(aGPSPosition.latitude) + ' ' + aGPSPosition.latitudeNS)
-        self.dock.lon.setText(str(aGPSPosition.longitude) + ' ' + aGPSPosition.longitudeEW)
+        self.dock.lat.setText(str(abs(aGPSPosition.latitude)) + ' ' + aGPSPosition.latitudeNS)
+        self.dock.lon.setText(str(abs(aGPSPosition.longitude)) + ' ' + aGPSPosition.longitudeEW)
         self.dock.lineBearing.setText("%5.1i"%aGPSPosition.bearing)
         self.dock.lineSpeed.setText("%5.1i"%aGPSPosition.speed)
         self.dock.lineHDOP.setText(str(aGPSPosition.hdop))
@@ -332,13 +679,13 @@ class trackGps:
         else:
             self.dock.lineQuality.setText("Differential GPS fix") 
         
-        # display arrow on the map
-        latitude = aGPSPosition.latitude if aGPSPosition.latitudeNS == 'N' else aGPSPosition.latitude * -1.0
-        longitude = aGPSPosition.longitude if aGPSPosition.longitudeEW == 'E' else aGPSPosition.longitude * -1.0
-        p=self.transform.transform(QgsPoint(longitude, latitude))
+        # display arrow on the map, the rubber band is redrawn once for the whole batch
+        for earlier in accepted[:-1]:
+            self.rubberBand.addPoint(self.transform.transform(QgsPoint(earlier.longitude, earlier.latitude)), False)
+        p=self.transform.transform(QgsPoint(aGPSPosition.longitude, aGPSPosition.latitude))
         self.rubberBand.addPoint(p)
         self.positionMarker.setHasPosition(True)
-        self.positionMarker.newCoords(p,aGPSPosition.bearing)
+        self.positionMarker.newCoords(p,bearing)
         
         doRefresh = False
         if doRefresh:
@@ -352,26 +699,38 @@ class trackGps:
     
     def stopGather(self):
         self.read.stop()
+        self.stopReceivers()
+        self.flushTimer.stop()
         self.positionMarker.hide()
-        if len(self.GPSPositions) > 0: # and self.saveInSHAPEFile:
-            self.GPSTracks.append(self.GPSPositions) # save GPSPositions to GPSTracks
+        self.finishStreamedTrack()
+        self.trackStore.startTrack() # close the current track
+        self.acquisitionFilter.reset()
                                                                                                                                     
+        if self.trackDatabase is not None:
+            self.trackDatabase.close()
+            self.trackDatabase = None
+        if self.shapeWriter is not None:
+            # the fixes are already on disk, only the last batch was written by finishStreamedTrack
+            self.shapeWriter.close()
+            self.shapeWriter = None
         # if len(self.GPSTracks) > 0 and self.saveInSHAPEFile:
-        if self.saveInSHAPEFile: # this is temporary
+        elif self.saveInSHAPEFile: # this is temporary
             # option to save SHAPE file is on, prompt for filename and write the tracks to the file
             self.makeShapeFiles()
             
-        if len(self.GPSTracks) > 0:
+        if len(self.trackStore.tracks) > 0 or self.receivers:
             answer = QMessageBox.question(self.iface.mainWindow(),"Erase Tracks?","Erase the currently displayed tracks?",\
                                           QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if answer == QMessageBox.Yes:
                 for band in self.rubberBandS:
                     band.reset()
                 self.rubberBand.reset()
+                for receiver in self.receivers:
+                    receiver.remove()
+                self.receivers = []
                 self.canvas.refresh()
                 self.rubberBandS = []
-            self.GPSPositions = []
-            self.GPSTracks = []
+            self.trackStore.clear()
     
     
     def toogleGather(self):
@@ -394,15 +753,35 @@ class trackGps:
         # QMessageBox.information(self.iface.mainWindow(),"trackGps","GPS Receiver Connected on port: %s at %i baud\n"%\
         #                     (self.read.session.portName,self.read.session.baudRate),QMessageBox.Ok,0)
         
-        self.dock.gpsInformation.setText("GPS Connected on port: %s at %i baud"%(self.read.session.portName,\
-                                                                                          self.read.session.baudRate))
+        self.showConnectionInformation()
         self.dock.btnStart.setText("Stop")
         self.dock.btnStartNewTrack.setDisabled(False)
         
+        if self.trackDatabase is not None:
+            self.trackDatabase.setSessionDevice(str(self.read.session.portName))
+        if self.read.replayFile: # a replayed log is not a device to remember
+            return
         # save connection values in session parameters
-        self.serialPortNumber = self.read.session.port
-        self.serialPortSpeed = self.read.session.baudRates.index(self.read.session.baudRate)
-        self.searchAllConnectionsSpeeds = False
+        self.lastDevice = self.read.session.portName
+        self.read.session.lastDevice = self.lastDevice
+        # store the connection cache right away, so that it survives a crash
+        self.GPSSettings.setValue("trackGpsGPSSettings/connectionCache", self.read.session.cache.toStrings())
+        if isinstance(self.read.session.port, int): # numbered port, can be set in the options dialog
+            self.serialPortNumber = self.read.session.port
+            self.serialPortSpeed = self.read.session.baudRates.index(self.read.session.baudRate)
+            self.searchAllConnectionsSpeeds = False
+        
+        
+    def showConnectionInformation(self):
+        
+        session = self.read.session
+        self.shownBadCount = session.parser.badCount
+        info = "GPS Connected on port: %s at %i baud in %.1f s"%(session.portName, session.baudRate,\
+                                                                 session.timeToConnect or 0.0)
+        if session.parser.badCount > 0:
+            info += " - %.2f%% corrupted sentences (%s)"%(100.0 * session.parser.corruptionRate(),\
+                ", ".join(["%s: %d"%item for item in sorted(session.parser.badSentences.items())]))
+        self.dock.gpsInformation.setText(info)
         
         
     def connectionFailed(self, msg):
@@ -431,9 +810,18 @@ class trackGps:
                 self.trackLineWidth = myGPSOptionsDlg.sbxTrackWidth.value()
             if myGPSOptionsDlg.cbxSaveGPSTrack.isChecked() != self.saveInSHAPEFile: 
                 self.saveInSHAPEFile = myGPSOptionsDlg.cbxSaveGPSTrack.isChecked()
+            if myGPSOptionsDlg.cbxStreamGPSTrack.isChecked() != self.streamToSHAPEFile: 
+                self.streamToSHAPEFile = myGPSOptionsDlg.cbxStreamGPSTrack.isChecked()
+            if myGPSOptionsDlg.databaseFile != self.databaseFile: 
+                self.databaseFile = myGPSOptionsDlg.databaseFile
     
     
-    def makeShapeFiles(self):
+    def askShapeFileNames(self, datumEPSG):
+        '''
+        prompts for the names of the SHAPE files
+        Returns: pointsFileName, linesFileName, CRS - or None if the user cancelled or the CRS is not valid
+            an empty file name means that this file is not to be saved
+        '''
 
         myFileName = QgsProject.instance().fileName()
         myFileName = str(myFileName)
@@ -446,81 +834,203 @@ class trackGps:
         myShapeFileNamesDlg = ShapeFileNames(myFilePath)
         isOK = myShapeFileNamesDlg.exec_()
         CRS = QgsCoordinateReferenceSystem()
-        crsIsOk = CRS.createFromOgcWmsCrs("EPSG:%d" % self.GPSTracks[0][0].datumEPSG)
+        crsIsOk = CRS.createFromOgcWmsCrs("EPSG:%d" % datumEPSG)
         if not crsIsOk: 
             QMessageBox.warning(self.iface.mainWindow(),"trackGPS - makeShapeFiles","Error creating CRS from"+\
-                                            " EPSG ID:" + str(self.GPSTracks[0][0].datumEPSG))
+                                            " EPSG ID:" + str(datumEPSG))
         if isOK and crsIsOk:
-            if len(myShapeFileNamesDlg.lnePointsFileName.text()) > 0:
-                # set up the fields for the Points SHAPE file
-                box = QgsFields() 
-                box.append(QgsField("LATITUDE", QVariant.Double , "Real", 9, 6)) 
-                box.append(QgsField("LONGITUDE", QVariant.Double, "Real", 10, 6)) 
-                box.append(QgsField("NUMOFSATS", QVariant.Int, "Integer", 2, 0))
-                box.append(QgsField("HDOP", QVariant.Double, "Real", 4, 2))
-                box.append(QgsField("DATETIME", QVariant.String, "String", 19, 0)) 
-                box.append(QgsField("FIXTYPE", QVariant.String, "String", 1, 0))
-
-                box.append(QgsField("BEARING", QVariant.Double, "Real", 6, 2))
-                box.append(QgsField("SPEED-KPH", QVariant.Double, "Real", 5, 1)) 
-                box.append(QgsField("TRACKNUM", QVariant.Int, "Integer", 2, 0))
-                
-                # set up the CRS
-                # open the points SHAPE file
-                pointsFile, fileOK = self.createSHAPEfile(myShapeFileNamesDlg.lnePointsFileName.text(),box,QGis.WKBPoint,CRS)
-                if fileOK:
-                    for j in range(len(self.GPSTracks)):
-                        for i in range(len(self.GPSTracks[j])):
-                            theFeature = QgsFeature()
-                            latitude = self.GPSTracks[j][i].latitude
-                            if self.GPSTracks[j][i].latitudeNS == 'S': 
-                                latitude = -latitude
-                            longitude = self.GPSTracks[j][i].longitude
-                            if self.GPSTracks[j][i].longitudeEW == 'W': 
-                                longitude = -longitude
-                            theFeature.setGeometry(QgsGeometry.fromPoint(QgsPoint(longitude,latitude)))
-                            theFeature.setAttributes([0, latitude])
-                            theFeature.setAttributes([1, longitude])
-                            theFeature.setAttributes([2, self.GPSTracks[j][i].numSatellites])
-                            theFeature.setAttributes([3, self.GPSTracks[j][i].hdop])
-                            theFeature.setAttributes([4, self.GPSTracks[j][i].theDateTime])
-                            theFeature.setAttributes([5, self.GPSTracks[j][i].fixQuality])
-                            theFeature.setAttributes([6, self.GPSTracks[j][i].bearing])
-                            theFeature.setAttributes([7, self.GPSTracks[j][i].speed])
-                            theFeature.setAttributes([8, j+1])
-                            pointsFile.addFeature(theFeature)
-                            
-                    del pointsFile # del file object to force a flush and close
-                    
-            if len(myShapeFileNamesDlg.lneLinesFileName.text()) > 0:
-                # set up the fields for the Lines SHAPE file
-                lines_box = QgsFields()
-                lines_box.append(QgsField("SDATETIME", QVariant.String, "String", 19, 0))
-                lines_box.append(QgsField("EDATETIME", QVariant.String, "String", 19, 0))
-                lines_box.append(QgsField("TRACKNUM", QVariant.Int, "Integer", 2, 0))
-                
-                linesFile, fileOK = self.createSHAPEfile(myShapeFileNamesDlg.lneLinesFileName.text(),lines_box,QGis.WKBLineString,CRS)
-                if fileOK:
-                    for j in range(len(self.GPSTracks)):
-                        theFeature = QgsFeature()
-                        pointsList = []
-                        for i in range(len(self.GPSTracks[j])):
-                            latitude = self.GPSTracks[j][i].latitude
-                            if self.GPSTracks[j][i].latitudeNS == 'S': 
-                                latitude = -latitude
-                            longitude = self.GPSTracks[j][i].longitude
-                            if self.GPSTracks[j][i].longitudeEW == 'W': 
-                                longitude = -longitude
-                            pointsList.append(QgsPoint(longitude,latitude))
-                            
-                        theFeature.setGeometry(QgsGeometry.fromPolyline(pointsList))
-                        theFeature.setAttributes([0, self.GPSTracks[j][0].theDateTime])
-                        theFeature.setAttributes([1, self.GPSTracks[j][len(self.GPSTracks[j])-1].theDateTime])
-                        theFeature.setAttributes([2, j+1])
-                        linesFile.addFeature(theFeature)
-                        
-                    del linesFile # del file object to force a flush and close
-                    
+            return myShapeFileNamesDlg.lnePointsFileName.text(), myShapeFileNamesDlg.lneLinesFileName.text(), CRS
+        return None
+
+
+    def openShapeWriter(self):
+        '''
+        creates the SHAPE files at the start of a session and opens them for writing the fixes as they
+        are accepted (streaming mode). If the user cancels, the tracks are saved when tracking stops.
+        '''
+
+        names = self.askShapeFileNames(self.read.session.datumEPSG)
+        if names is None:
+            return
+        pointsFileName, linesFileName, CRS = names
+        if len(pointsFileName) > 0:
+            pointsFile, fileOK = self.createSHAPEfile(pointsFileName,pointFields(),QGis.WKBPoint,CRS)
+            del pointsFile # close the empty file, it is reopened for appending
+            if not fileOK:
+                pointsFileName = ''
+        if len(linesFileName) > 0:
+            linesFile, fileOK = self.createSHAPEfile(linesFileName,lineFields(),QGis.WKBLineString,CRS)
+            del linesFile
+            if not fileOK:
+                linesFileName = ''
+        try:
+            self.shapeWriter = StreamingShapeWriter(pointsFileName, linesFileName)
+        except IOError, e:
+            QMessageBox.warning(self.iface.mainWindow(),"trackGPS - openShapeWriter",str(e) +\
+                                " - the tracks will be saved when tracking stops")
+            return
+        if not self.shapeWriter.isValid():
+            self.shapeWriter = None
+
+
+    def openTrackDatabase(self):
+        '''
+        opens (or creates) the GeoPackage that records the sessions and starts a new session in it
+        '''
+
+        try:
+            self.trackDatabase = TrackDatabase(self.databaseFile, self.read.session.datumEPSG)
+            self.trackDatabase.startSession('', self.read.session.datumEPSG) # device set by connectionMade
+        except (IOError, sqlite3.Error), e:
+            self.trackDatabase = None
+            QMessageBox.warning(self.iface.mainWindow(),"trackGPS - openTrackDatabase","Cannot record in " +\
+                                self.databaseFile + ": " + str(e))
+
+
+    def publishFailed(self, message):
+
+        self.iface.messageBar().pushMessage("beeGPS", "Cannot publish the position in " + self.publishFile +\
+                                            ": " + message, QgsMessageBar.WARNING, 10)
+
+
+    def startReceivers(self, dest_crs):
+        '''
+        starts reading the additional receivers (self.extraReceivers) on one IngestThread; each one
+        has its own track store, acquisition filter, marker and line colour, and its own session
+        in the GeoPackage. The SHAPE files only hold the main receiver's tracks.
+        '''
+
+        self.receiverTransform = QgsCoordinateTransform(QgsCoordinateReferenceSystem(4326,\
+                                                        QgsCoordinateReferenceSystem.EpsgCrsId), dest_crs)
+        # owned by the main window, so that a thread still opening a source when it is stopped
+        # is not destroyed while it runs
+        self.ingestThread = IngestThread(self.uiRate, self.iface.mainWindow())
+        for description in self.extraReceivers:
+            try:
+                index = self.ingestThread.addReceiver(description)
+            except (ValueError, IOError), e:
+                self.iface.messageBar().pushMessage("beeGPS", "Receiver " + description + ": " + str(e),
+                                                    QgsMessageBar.WARNING, 10)
+                continue
+            source = self.ingestThread.sources[index]
+            if index == len(self.receivers):
+                self.receivers.append(ReceiverTrack(self.canvas, source.name,
+                                                    RECEIVER_COLORS[index % len(RECEIVER_COLORS)],
+                                                    self.newAcquisitionFilter(), self.trackLineWidth,
+                                                    self.markerNumber))
+            receiver = self.receivers[index]
+            receiver.positionMarker.show()
+            if self.trackDatabase is not None:
+                receiver.sessionId = self.trackDatabase.startSession(source.name)
+        self.ingestThread.receiverPositions.connect(self.setReceiverCoords)
+        self.ingestThread.receiverLost.connect(self.receiverLost)
+        self.ingestThread.start()
+
+
+    def stopReceivers(self):
+
+        if self.ingestThread is None:
+            return
+        if not self.ingestThread.stop(): # it ends by itself later, its fixes are not wanted any more
+            self.ingestThread.receiverPositions.disconnect(self.setReceiverCoords)
+            self.ingestThread.receiverLost.disconnect(self.receiverLost)
+        QCoreApplication.sendPostedEvents() # the last batches, before the tracks are closed
+        self.ingestThread = None
+        for receiver in self.receivers:
+            receiver.newTrack(self.trackDatabase)
+            receiver.positionMarker.hide()
+
+
+    def setReceiverCoords(self, index, batch):
+
+        if index < len(self.receivers):
+            self.receivers[index].addBatch(batch, self.receiverTransform, self.trackDatabase)
+
+
+    def receiverLost(self, index, reason):
+
+        name = self.receivers[index].name if index < len(self.receivers) else str(index + 1)
+        self.iface.messageBar().pushMessage("beeGPS", "Receiver " + name + " lost: " + reason,
+                                            QgsMessageBar.WARNING, 10)
+
+
+    def flushRecorders(self):
+        # flushTimer: the fixes queued for the files are written after flushInterval at most
+
+        if self.shapeWriter is not None:
+            self.shapeWriter.flushIfDue()
+        if self.trackDatabase is not None:
+            self.trackDatabase.flushIfDue()
+
+
+    def finishStreamedTrack(self):
+        # writes the line of the track being recorded when it ends (streaming mode and GeoPackage)
+
+        if self.trackStore.currentLength() > 0:
+            if self.shapeWriter is not None:
+                self.shapeWriter.finishTrack(self.trackStore.tracks[-1], len(self.trackStore.tracks))
+            if self.trackDatabase is not None:
+                self.trackDatabase.finishTrack(self.trackStore.tracks[-1], len(self.trackStore.tracks))
+
+
+    def makeShapeFiles(self):
+        '''
+        prompts for the SHAPE file names, creates the files and starts a ShapeExportWorker writing a
+        snapshot of the tracks in the background; the progress and a Cancel button are shown in the
+        message bar
+        '''
+
+        names = self.askShapeFileNames(self.trackStore.datumEPSG)
+        if names is None:
+            return
+        pointsFileName, linesFileName, CRS = names
+        pointsFile = None
+        linesFile = None
+        if len(pointsFileName) > 0:
+            pointsFile, fileOK = self.createSHAPEfile(pointsFileName,pointFields(),QGis.WKBPoint,CRS)
+            if not fileOK:
+                pointsFile = None
+        if len(linesFileName) > 0:
+            linesFile, fileOK = self.createSHAPEfile(linesFileName,lineFields(),QGis.WKBLineString,CRS)
+            if not fileOK:
+                linesFile = None
+        if pointsFile is None and linesFile is None:
+            return
+        
+        worker = ShapeExportWorker(self.trackStore.snapshot(), pointsFile, linesFile)
+        del pointsFile, linesFile # the worker holds the only references, it closes the files
+        
+        messageBar = self.iface.messageBar()
+        worker.message = messageBar.createMessage("beeGPS", "Saving the GPS tracks...")
+        worker.progressBar = QProgressBar()
+        worker.progressBar.setMaximum(100)
+        cancelButton = QPushButton("Cancel")
+        worker.message.layout().addWidget(worker.progressBar)
+        worker.message.layout().addWidget(cancelButton)
+        messageBar.pushWidget(worker.message, QgsMessageBar.INFO)
+        
+        QObject.connect(cancelButton, SIGNAL("clicked()"), worker.cancel)
+        QObject.connect(worker, SIGNAL("exportProgress(int, int)"),
+                        lambda done, total, bar=worker.progressBar: bar.setValue(100 * done / max(total, 1)))
+        QObject.connect(worker, SIGNAL("exportFinished(PyQt_PyObject)"),
+                        lambda result, worker=worker: self.exportFinished(worker, result))
+        self.exportWorkers.append(worker) # keep a reference until it is finished
+        worker.start()
+        
+    
+    def exportFinished(self, worker, result):
+        
+        pointsWritten, linesWritten, cancelled = result
+        worker.wait()
+        self.exportWorkers.remove(worker)
+        self.iface.messageBar().popWidget(worker.message)
+        info = "%d points and %d lines saved" % (pointsWritten, linesWritten)
+        if cancelled:
+            info = "Saving cancelled - " + info
+        self.iface.messageBar().pushMessage("beeGPS", info, QgsMessageBar.INFO, 5)
+        if not self.read.running:
+            self.dock.gpsInformation.setText(info)
+
 
     def createSHAPEfile(self,fileName, fileFields, fileType, crs):
         '''
@@ -558,88 +1068,42 @@ class trackGps:
         return SHAPEfile,status
         
         
-    #Metodo per l'acquisizione tramite soglia di distanza
-    def tresholdAcquisition(self, aGPSPosition):
-    
-        #Costanti per il calcolo della distanza
-        R_Terra = 6372.795477598
-        acquisito = False
-        
+    def compileAcquisitionFilter(self):
         
-        #Acquisisco la soglia di distanza, da input e la converto in float
-        soglia = self.dock.lineTreshold.text()
-        if not soglia.isnumeric():
-            self.read.stop()
-            self.positionMarker.hide()
-            self.dock.btnStart.setText("Start")
-            self.dock.gpsInformation.setText("Gets GPS Receiver Information")
-            QMessageBox.warning(self.iface.mainWindow(),"ATENZIONE","Inserire solo valori numerici nella soglia di distanza.")
+        if self.readInProcess:
+            # the worker filters the fixes: the GUI's filter only starts the tracks
+            self.acquisitionFilter = compileFilter()
+            self.read.setThresholds((self.minDistance, self.minInterval, self.maxHDOP, self.minFixQuality,
+                                     self.minSpeed, self.maxSpeed))
         else:
-            soglia = float(soglia)
-            soglia = soglia / 1000
-    
-        #Conversione dei gradi in radianti
-        lat_alfa = math.radians(aGPSPosition.latitude)
-        lat_beta = math.radians(self.GPSPositions[-1].latitude)
-        lon_alfa = math.radians(aGPSPosition.longitude)
-        lon_beta = math.radians(self.GPSPositions[-1].longitude)
-        
-        #Calcolo la differenza di lat e lon
-        dLat = lat_alfa - lat_beta
-        dLon = lon_alfa - lon_beta
-            
-         
-        a = math.sin(dLat/2)*math.sin(dLat/2)+math.sin(dLon/2)*math.sin(dLon/2)* math.cos(lat_alfa) * math.cos(lat_beta)
-            
-        #Calcolo il terzo lato del triangolo sferico
-        c = 2*math.atan2(math.sqrt(a),math.sqrt(1-a))
-           
-        distanza = c * R_Terra
-           
-        #Controllo con la soglia di distanza e eventualmente acquisisco
-        if distanza > soglia:
-            acquisito = True    
-                    
-        return acquisito
+            self.acquisitionFilter = self.newAcquisitionFilter()
+        for receiver in getattr(self, 'receivers', []):
+            lastPosition = receiver.acquisitionFilter.lastPosition
+            receiver.acquisitionFilter = self.newAcquisitionFilter()
+            receiver.acquisitionFilter.lastPosition = lastPosition
+
+
+    def newAcquisitionFilter(self):
+
+        return compileFilter(self.minDistance, self.minInterval, self.maxHDOP, self.minFixQuality,
+                             self.minSpeed, self.maxSpeed)
         
     
-    #Metodo timeIntervals() per il controllo della soglia temporale
-    def timeIntervals(self, aGPSPosition):
-    
-        #Variabile booleana di ritorno
-        acquisito = False
-        
-        #Stringa per il formato della data 
-        formato = '%Y-%m-%d %H:%M:%S'
-        
-        #Metto le due date, quella dell'ultima acquisizione e quella da valutare in due stringhe
-        dataA = aGPSPosition.theDateTime
-        dataB = self.GPSPositions[-1].theDateTime
+    def thresholdsEdited(self):
         
-        #Tramite il metodo time.strptime() realizziamo due strutte tempo per le due date
-        struct_A = time.strptime(dataA,formato)
-        struct_B = time.strptime(dataB,formato)
-        
-        #Otteniamo i valori di confronto
-        confrontoA = datetime.datetime.fromtimestamp(time.mktime(struct_A))
-        confrontoB = datetime.datetime.fromtimestamp(time.mktime(struct_B))
-        
-        #Otteniamo la differenza
-        differenza = (confrontoA - confrontoB).seconds
-        
-        #Acquisisco la soglia di distanza temporale e gestisco eventualmente l'inserimento di valori non numerici
-        intervalli = self.dock.lineTimeIntervals.text()
-        if not intervalli.isnumeric():
-            self.read.stop()
-            self.positionMarker.hide()
-            self.dock.btnStart.setText("Start")
-            self.dock.gpsInformation.setText("Gets GPS Receiver Information")
-            QMessageBox.warning(self.iface.mainWindow(),"ATENZIONE","Inserire solo valori numerici nella soglia temporale.")
-        else:
-            intervalli = float(intervalli)
-        
-        #Controllo se la differenza e maggiore della soglia
-        if differenza > intervalli:
-          acquisito = True
-          
-        return acquisito 
+        #Le soglie vengono lette e controllate solo quando l'utente le modifica; un valore non numerico
+        #viene segnalato e sostituito con il valore precedente, l'acquisizione continua
+        try:
+            minDistance = parseThreshold(self.dock.lineTreshold.text(), "distance threshold")
+            minInterval = parseThreshold(self.dock.lineTimeIntervals.text(), "time threshold")
+        except ValueError, e:
+            self.dock.lineTreshold.setText(str(self.minDistance))
+            self.dock.lineTimeIntervals.setText(str(self.minInterval))
+            QMessageBox.warning(self.iface.mainWindow(),"ATENZIONE","Inserire solo valori numerici nelle soglie.\n" + str(e))
+            return
+        if (minDistance, minInterval) != (self.minDistance, self.minInterval):
+            self.minDistance = minDistance
+            self.minInterval = minInterval
+            lastPosition = self.acquisitionFilter.lastPosition
+            self.compileAcquisitionFilter()
+            self.acquisitionFilter.lastPosition = lastPosition # same track, new thresholds
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+""" GeoPackage store of the GPS sessions, written with the standard sqlite3 module
+    see class documentation below.
+"""
+
+
+import os
+import time
+import struct
+import sqlite3
+
+from trackstore import TrackStore, TrackColumns
+
+
+# GeoPackage 1.2: application_id 'GPKG' and user_version 10200
+GPKG_APPLICATION_ID = 0x47504B47
+GPKG_USER_VERSION = 10200
+
+SPATIAL_REF_SYS = {
+    4326: ('WGS 84 geodetic',
+           'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,AUTHORITY["EPSG","7030"]],'
+           'AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],'
+           'UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]'),
+    4269: ('NAD83',
+           'GEOGCS["NAD83",DATUM["North_American_Datum_1983",SPHEROID["GRS 1980",6378137,298.257222101,'
+           'AUTHORITY["EPSG","7019"]],AUTHORITY["EPSG","6269"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],'
+           'UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4269"]]')}
+
+# columns of gps_points after fid and geom, in the order of the rows written by addFix
+POINT_COLUMNS = ('session_id', 'track', 'utc_time', 'longitude', 'latitude', 'hdop', 'speed', 'bearing',
+                 'num_sats', 'fix_quality')
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (
+    srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, organization TEXT NOT NULL,
+    organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT);
+CREATE TABLE IF NOT EXISTS gpkg_contents (
+    table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+    description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER);
+CREATE TABLE IF NOT EXISTS gpkg_geometry_columns (
+    table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+    srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+    CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name));
+CREATE TABLE IF NOT EXISTS gpkg_extensions (
+    table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, definition TEXT NOT NULL,
+    scope TEXT NOT NULL, CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name));
+
+CREATE TABLE IF NOT EXISTS gps_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, started REAL NOT NULL, device TEXT, datum_epsg INTEGER);
+CREATE TABLE IF NOT EXISTS gps_points (
+    fid INTEGER PRIMARY KEY AUTOINCREMENT, geom BLOB, session_id INTEGER NOT NULL, track INTEGER NOT NULL,
+    utc_time REAL NOT NULL, longitude REAL, latitude REAL, hdop REAL, speed REAL, bearing REAL,
+    num_sats INTEGER, fix_quality INTEGER);
+CREATE INDEX IF NOT EXISTS gps_points_session_track_time ON gps_points (session_id, track, utc_time);
+CREATE INDEX IF NOT EXISTS gps_points_time ON gps_points (utc_time);
+CREATE TABLE IF NOT EXISTS gps_lines (
+    fid INTEGER PRIMARY KEY AUTOINCREMENT, geom BLOB, session_id INTEGER NOT NULL, track INTEGER NOT NULL,
+    start_time REAL, end_time REAL, num_points INTEGER);
+CREATE INDEX IF NOT EXISTS gps_lines_session_track ON gps_lines (session_id, track);
+CREATE VIRTUAL TABLE IF NOT EXISTS rtree_gps_points_geom USING rtree(id, minx, maxx, miny, maxy);
+CREATE VIRTUAL TABLE IF NOT EXISTS rtree_gps_lines_geom USING rtree(id, minx, maxx, miny, maxy);
+"""
+
+
+
+def pointBlob(srsId, longitude, latitude):
+    """GeoPackage geometry blob of a point: header (little endian, no envelope) + WKB"""
+
+    return buffer(struct.pack('<2sBBiBIdd', 'GP', 0, 1, srsId, 1, 1, longitude, latitude))
+
+
+def lineBlob(srsId, longitudes, latitudes):
+    """GeoPackage geometry blob of a linestring: header with its xy envelope + WKB"""
+
+    n = len(longitudes)
+    coordinates = [0.0] * (2 * n)
+    coordinates[0::2] = longitudes
+    coordinates[1::2] = latitudes
+    return buffer(struct.pack('<2sBBi4d', 'GP', 0, 3, srsId, min(longitudes), max(longitudes),
+                              min(latitudes), max(latitudes)) +
+                  struct.pack('<BII%dd' % (2 * n), 1, 2, n, *coordinates))
+
+
+
+class TrackDatabase(object):
+    """GeoPackage file holding the fixes and tracks of any number of sessions
+
+    The file is a GeoPackage (it opens in QGIS as two layers, gps_points and gps_lines, plus the
+    gps_sessions table) written with the sqlite3 module of the standard library, so it has no
+    dependency on OGR or SpatiaLite. The spatial indexes are GeoPackage R-trees filled by this
+    class (the standard triggers need SQL functions sqlite3 does not have). The journal is in WAL
+    mode: readers, e.g. QGIS showing the layers, do not block the writer.
+
+    The acquisition path only appends a tuple per fix (addFix); the fixes are inserted with
+    executemany in one transaction every batchSize fixes or once the oldest queued fix waited
+    flushInterval seconds. The age is checked by addFix and by flushIfDue, to be called from a
+    timer, since the next fix may be a long time coming.
+    (session_id, track, utc_time) and utc_time are indexed for queries and for loadSession.
+
+    CLASS VARIABLES:
+    fileName = name of the GeoPackage file
+    srsId = EPSG number of the coordinates, set when the file is created
+    sessionId = id of the session being recorded (startSession), None before
+    batchSize = number of fixes per transaction
+    flushInterval = longest time (s) a fix waits before being written
+
+    METHODS:
+    startSession = records a new session, the fixes that follow belong to it
+    setSessionDevice = records the device the session was received from
+    addFix = queues a fix of a track of the current session (or of another one, by id)
+    flushIfDue = writes the queued fixes if the oldest one waited flushInterval seconds
+    flush = writes the queued fixes in one transaction
+    finishTrack = writes the queued fixes and the line of a finished track
+    sessions = list of (id, started, device, datum EPSG, number of fixes)
+    loadSession = TrackStore of the tracks of a session
+    close = writes what is left and closes the file
+    """
+
+    def __init__(self, fileName, srsId=4326, batchSize=100, flushInterval=2.0):
+
+        self.fileName = fileName
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.sessionId = None
+        self._pending = []
+        self._firstPending = 0.0 # time the oldest queued fix was added
+
+        isNew = not os.path.exists(fileName) or os.path.getsize(fileName) == 0
+        self.connection = sqlite3.connect(fileName)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL") # WAL stays consistent after a crash
+        if isNew:
+            self.createTables(srsId)
+        row = self.connection.execute("SELECT srs_id FROM gpkg_geometry_columns WHERE table_name='gps_points'").fetchone()
+        if row is None:
+            self.connection.close()
+            raise IOError("%s is not a GPS track GeoPackage" % fileName)
+        self.srsId = row[0]
+
+
+    def createTables(self, srsId):
+
+        with self.connection:
+            self.connection.execute("PRAGMA application_id=%d" % GPKG_APPLICATION_ID)
+            self.connection.execute("PRAGMA user_version=%d" % GPKG_USER_VERSION)
+            self.connection.executescript(SCHEMA)
+            self.connection.executemany("INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?,?,?,?,?,?)",
+                [('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', None),
+                 ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', None)] +
+                [(name, epsg, 'EPSG', epsg, definition, None) for epsg, (name, definition) in SPATIAL_REF_SYS.items()])
+            for table, geometryType in (('gps_points', 'POINT'), ('gps_lines', 'LINESTRING')):
+                self.connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) "
+                                        "VALUES (?, 'features', ?, ?)", (table, table, srsId))
+                self.connection.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', ?, ?, 0, 0)",
+                                        (table, geometryType, srsId))
+                self.connection.execute("INSERT INTO gpkg_extensions VALUES (?, 'geom', 'gpkg_rtree_index', "
+                                        "'http://www.geopackage.org/spec120/#extension_rtree', 'write-only')",
+                                        (table,))
+            self.connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier) "
+                                    "VALUES ('gps_sessions', 'attributes', 'gps_sessions')")
+
+
+    def startSession(self, device='', datumEPSG=4326):
+
+        self.flush()
+        with self.connection:
+            cursor = self.connection.execute("INSERT INTO gps_sessions (started, device, datum_epsg) VALUES (?,?,?)",
+                                             (time.time(), device, datumEPSG))
+        self.sessionId = cursor.lastrowid
+        return self.sessionId
+
+
+    def setSessionDevice(self, device):
+
+        with self.connection:
+            self.connection.execute("UPDATE gps_sessions SET device=? WHERE id=?", (device, self.sessionId))
+
+
+    def addFix(self, aGPSPosition, trackNumber, sessionId=None):
+        """Queues a fix of the current session, or of sessionId when several receivers are recorded"""
+
+        if not self._pending:
+            self._firstPending = time.time()
+        self._pending.append((sessionId or self.sessionId, trackNumber, aGPSPosition.utcTime, aGPSPosition.longitude,
+                              aGPSPosition.latitude, aGPSPosition.hdop, aGPSPosition.speed, aGPSPosition.bearing,
+                              aGPSPosition.numSatellites, aGPSPosition.fixQuality))
+        if len(self._pending) >= self.batchSize:
+            self.flush()
+        else:
+            self.flushIfDue()
+
+
+    def flushIfDue(self):
+
+        if self._pending and time.time() - self._firstPending >= self.flushInterval:
+            self.flush()
+
+
+    def flush(self):
+
+        if not self._pending:
+            return
+        srsId = self.srsId
+        points = []
+        rtree = []
+        with self.connection: # one transaction per batch
+            # the write lock is taken before the fids are chosen, so that another writer of the
+            # file (ingest.py while the plugin records) cannot choose the same ones
+            self.connection.execute("BEGIN IMMEDIATE")
+            fid = (self.connection.execute("SELECT max(fid) FROM gps_points").fetchone()[0] or 0) + 1
+            for row in self._pending:
+                longitude = row[3]
+                latitude = row[4]
+                points.append((fid, pointBlob(srsId, longitude, latitude)) + row)
+                rtree.append((fid, longitude, longitude, latitude, latitude))
+                fid += 1
+            self.connection.executemany("INSERT INTO gps_points (fid, geom, %s) VALUES (?,?,%s)" %
+                                        (', '.join(POINT_COLUMNS), ','.join(['?'] * len(POINT_COLUMNS))), points)
+            self.connection.executemany("INSERT INTO rtree_gps_points_geom VALUES (?,?,?,?,?)", rtree)
+        self._pending = []
+
+
+    def finishTrack(self, track, trackNumber, sessionId=None):
+        """Writes the queued fixes and the line of track (a trackstore.TrackColumns)"""
+
+        self.flush()
+        if len(track) < 2:
+            return
+        longitudes = track.columns['longitude']
+        latitudes = track.columns['latitude']
+        utcTimes = track.columns['utcTime']
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO gps_lines (geom, session_id, track, start_time, end_time, num_points) "
+                "VALUES (?,?,?,?,?,?)", (lineBlob(self.srsId, longitudes, latitudes), sessionId or self.sessionId, trackNumber,
+                                         utcTimes[0], utcTimes[-1], len(track)))
+            self.connection.execute("INSERT INTO rtree_gps_lines_geom VALUES (?,?,?,?,?)",
+                                    (cursor.lastrowid, min(longitudes), max(longitudes), min(latitudes),
+                                     max(latitudes)))
+
+
+    def sessions(self):
+
+        return self.connection.execute(
+            "SELECT s.id, s.started, s.device, s.datum_epsg, "
+            "(SELECT count(*) FROM gps_points p WHERE p.session_id = s.id) FROM gps_sessions s ORDER BY s.id").fetchall()
+
+
+    def loadSession(self, sessionId):
+        """Returns a TrackStore holding the tracks of session sessionId, in recording order"""
+
+        self.flush()
+        trackStore = TrackStore()
+        row = self.connection.execute("SELECT datum_epsg FROM gps_sessions WHERE id=?", (sessionId,)).fetchone()
+        if row is not None and row[0]:
+            trackStore.datumEPSG = row[0]
+        fields = [name for name, typecode in TrackColumns.FIELDS]
+        columns = dict(zip(fields, ('longitude', 'latitude', 'utc_time', 'hdop', 'speed', 'bearing', 'num_sats',
+                                    'fix_quality')))
+        cursor = self.connection.execute("SELECT track, %s FROM gps_points WHERE session_id=? ORDER BY track, utc_time" %
+                                         ', '.join([columns[name] for name in fields]), (sessionId,))
+        track = None
+        trackNumber = None
+        for row in cursor:
+            if row[0] != trackNumber:
+                if track is not None:
+                    track.closed = True
+                trackNumber = row[0]
+                track = TrackColumns()
+                trackStore.tracks.append(track)
+                appends = [track.columns[name].append for name in fields]
+            for append, value in zip(appends, row[1:]):
+                append(value if value is not None else 0)
+        if track is not None:
+            track.closed = True
+        return trackStore
+
+
+    def close(self):
+
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
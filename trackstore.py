@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+""" Column oriented storage of the GPS tracks
+    see class documentation below.
+"""
+
+
+from array import array
+from itertools import izip
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # column views fall back to array copies
+
+
+
+class TrackColumns(object):
+    """The fixes of one track, one growable array.array per field.
+
+    Appending is amortized O(1) in C (array over-allocates like a list) and a fix
+    takes 38 bytes instead of a Python object per fix.
+
+    CLASS VARIABLES:
+    columns = field name -> array.array
+    closed = True once the track is finished, its arrays never change afterwards
+    """
+
+    # field name, array typecode
+    FIELDS = (('longitude', 'd'),
+              ('latitude', 'd'),
+              ('utcTime', 'd'),
+              ('hdop', 'f'),
+              ('speed', 'f'),
+              ('bearing', 'f'),
+              ('numSatellites', 'B'),
+              ('fixQuality', 'B'))
+
+    def __init__(self):
+
+        self.columns = dict([(name, array(typecode)) for name, typecode in self.FIELDS])
+        self.closed = False
+        # bound append methods, in FIELDS order, for the hot path
+        self._appends = [self.columns[name].append for name, typecode in self.FIELDS]
+
+
+    def __len__(self):
+
+        return len(self.columns['utcTime'])
+
+
+    def append(self, aGPSPosition):
+
+        appendLon, appendLat, appendTime, appendHdop, appendSpeed, appendBearing, appendSats, appendQuality = \
+            self._appends
+        appendLon(aGPSPosition.longitude)
+        appendLat(aGPSPosition.latitude)
+        appendTime(aGPSPosition.utcTime)
+        appendHdop(aGPSPosition.hdop)
+        appendSpeed(aGPSPosition.speed)
+        appendBearing(aGPSPosition.bearing)
+        appendSats(min(max(aGPSPosition.numSatellites, 0), 255))
+        appendQuality(min(max(aGPSPosition.fixQuality, 0), 255))
+
+
+    def copy(self):
+        """Returns a closed copy of the track"""
+
+        theCopy = TrackColumns()
+        for name, values in self.columns.items():
+            theCopy.columns[name].extend(values)
+        theCopy.closed = True
+        return theCopy
+
+
+    def column(self, name):
+        """
+        Returns the column as a NumPy array: a zero-copy view for a closed track, a copy for
+        the track being recorded (its array may be reallocated by the next append). Without
+        NumPy a copy of the array.array is returned.
+        """
+
+        values = self.columns[name]
+        if numpy is None:
+            return array(values.typecode, values)
+        if self.closed:
+            return numpy.frombuffer(values, dtype=values.typecode)
+        return numpy.array(values, dtype=values.typecode)
+
+
+    def rows(self, names=None):
+        """Iterates over the fixes as tuples of the named fields (all of FIELDS by default)"""
+
+        if names is None:
+            names = [name for name, typecode in self.FIELDS]
+        return izip(*[self.columns[name] for name in names])
+
+
+
+class TrackStore(object):
+    """All of the tracks of a session: a list of TrackColumns, the last one being the track
+    that is recorded. Replaces the lists of GPSPosition objects, which cost hundreds of bytes
+    per fix for the whole session.
+
+    CLASS VARIABLES:
+    tracks = list of TrackColumns, in recording order (track number = index + 1)
+    lastPosition = last GPSPosition appended, used by the acquisition filters
+    datumEPSG = EPSG number of the datum of the stored coordinates
+
+    METHODS:
+    append = stores an accepted fix in the current track
+    startTrack = closes the current track, the next fix starts a new one
+    snapshot = frozen view of the tracks (closed tracks shared, current one copied)
+    currentLength = number of fixes in the current track
+    column = one field of one track or of all of the tracks (NumPy array when available)
+    """
+
+    def __init__(self):
+
+        self.clear()
+
+
+    def clear(self):
+
+        self.tracks = []
+        self.lastPosition = None
+        self.datumEPSG = 4326
+
+
+    def __len__(self):
+
+        return sum([len(track) for track in self.tracks])
+
+
+    def currentLength(self):
+
+        if self.tracks and not self.tracks[-1].closed:
+            return len(self.tracks[-1])
+        return 0
+
+
+    def append(self, aGPSPosition):
+
+        if not self.tracks or self.tracks[-1].closed:
+            if not self.tracks:
+                self.datumEPSG = aGPSPosition.datumEPSG
+            self.tracks.append(TrackColumns())
+        self.tracks[-1].append(aGPSPosition)
+        self.lastPosition = aGPSPosition
+
+
+    def startTrack(self):
+        """Closes the current track (if it has fixes), the next fix starts a new track"""
+
+        if self.tracks and not self.tracks[-1].closed:
+            self.tracks[-1].closed = True
+        self.lastPosition = None
+
+
+    def snapshot(self):
+        """
+        Returns a TrackStore that does not change while this one is recorded or cleared, e.g. for
+        an export running in another thread: closed tracks are shared (they never change again),
+        the track being recorded is copied.
+        """
+
+        theSnapshot = TrackStore()
+        theSnapshot.datumEPSG = self.datumEPSG
+        theSnapshot.tracks = [track if track.closed else track.copy() for track in self.tracks]
+        return theSnapshot
+
+
+    def column(self, name, trackIndex=None):
+        """
+        Returns one field of the track trackIndex, or of all of the tracks concatenated when
+        trackIndex is None, as a NumPy array (see TrackColumns.column)
+        """
+
+        if trackIndex is not None:
+            return self.tracks[trackIndex].column(name)
+        if numpy is None:
+            values = array(dict(TrackColumns.FIELDS)[name])
+            for track in self.tracks:
+                values.extend(track.columns[name])
+            return values
+        return numpy.concatenate([track.column(name) for track in self.tracks] or
+                                 [numpy.zeros(0, dtype=dict(TrackColumns.FIELDS)[name])])
+
+
+    def trackNumbers(self):
+        """Returns the track number (1, 2, ...) of every fix, aligned with column(name)"""
+
+        if numpy is None:
+            numbers = array('H')
+            for i, track in enumerate(self.tracks):
+                numbers.extend(array('H', [i + 1]) * len(track))
+            return numbers
+        return numpy.repeat(numpy.arange(1, len(self.tracks) + 1, dtype='H'),
+                            [len(track) for track in self.tracks])